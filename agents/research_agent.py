@@ -1,98 +1,623 @@
-from langchain.agents import AgentExecutor, create_openai_functions_agent
-from langchain.prompts import ChatPromptTemplate
-from langchain.tools import Tool
-from tavily import TavilyClient
-from typing import List, Dict, Any
-from utils.llm_setup import create_gemini_llm
+from typing import List, Dict, Any, Optional, Tuple
+from config import ResearchTier
+from utils.llm_setup import create_tavily_client
+from utils.llm_backends import create_llm, model_for, scheduler_for
+from utils.search_cache import SearchCache
+from utils.outbound import get_scheduler
+from utils.run_scheduler import get_run_scheduler
+from utils.storage import get_store, new_run_id
+from utils.http_pool import get_http_session
+from utils.progress import ProgressCallback, report_progress
+from utils.singleflight import SingleFlight, make_key
+from utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+from utils.tracing import configure_tracing, current_trace, start_trace, span, propagate
+from utils.accounting import (SEARCH_CREDITS, BudgetExceededError, RunUsage, check_period_budget, current_usage,
+                              current_user, record_usage, usage_callbacks, use_usage)
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+import asyncio
+import copy
 import json
 from pathlib import Path
 import logging
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Top sources shown to the LLM when it proposes follow-up queries
+FOLLOW_UP_CONTEXT_SOURCES = 20
+
+def _parse_queries(response: str, queries: List[str]) -> List[str]:
+    """Append search queries from an LLM response (one per line) to queries, skipping repeats"""
+    queries = list(queries)
+    for line in response.splitlines():
+        line = line.strip().lstrip("-*0123456789. ").strip()
+        if line and line.lower() not in (q.lower() for q in queries):
+            queries.append(line)
+    return queries
+
 class ResearchAgent:
     def __init__(self, settings):
         self.settings = settings
-        api_key = settings.tavily_api_key.get_secret_value()
-        self.tavily_client = TavilyClient(api_key=api_key)
-        
-        self.llm = create_gemini_llm(
-            api_key=settings.google_api_key.get_secret_value(),
-            model_name=settings.research_agent_model,
-            temperature=0.7
-        )
+        self.tavily_scheduler = get_scheduler("tavily", settings)
+        self.llm_scheduler = scheduler_for(settings, "plan")
+        self.run_scheduler = get_run_scheduler(settings)
+        configure_tracing(settings)
         
         # Ensure results directory exists
         self.results_dir = Path(settings.results_dir)
         self.results_dir.mkdir(parents=True, exist_ok=True)
+        self.store = get_store(settings)
+        
+        self.search_cache = None
+        if settings.search_cache_enabled:
+            self.search_cache = SearchCache.from_settings(settings)
+        
+        # Identical concurrent research requests share one in-flight run
+        self.inflight = SingleFlight()
+        
+        # Dedicated pool so concurrent searches aren't capped by the default executor size
+        self._search_executor = ThreadPoolExecutor(
+            max_workers=settings.search_concurrency,
+            thread_name_prefix="tavily-search"
+        )
+    
+    @cached_property
+    def tavily_client(self):
+        """Tavily client, created on first search; it reuses pooled keep-alive connections"""
+        return create_tavily_client(
+            self.settings.tavily_api_key.get_secret_value(),
+            get_http_session("tavily", self.settings.http_pool_size)
+        )
+    
+    @cached_property
+    def page_fetcher(self):
+        """Fetcher for full source pages, created the first time a tier fetches them"""
+        from utils.page_fetcher import PageFetcher
+        return PageFetcher.from_settings(self.settings)
+    
+    @cached_property
+    def llm(self):
+        """Chat model for sub-query planning and follow-up queries, created the first time it is needed"""
+        return create_llm(self.settings, model_for(self.settings, "plan"), temperature=0.7)
     
-    def execute(self, query: str, depth: str) -> Dict[str, Any]:
-        """Execute the research process"""
+    def execute(self, query: str, depth: str, progress: Optional[ProgressCallback] = None,
+                fresh: bool = False) -> Dict[str, Any]:
+        """Execute the research process
+
+        depth is a research tier (shallow/medium/deep) or a Tavily depth (basic/advanced).
+        Concurrent calls for the same normalized query and depth wait on a single shared run;
+        the run waits for a slot of the current priority class in the run scheduler.
+        fresh searches again instead of reusing cached searches and research rounds, as
+        search_cache_refresh does for every run.
+        """
+        fresh = fresh or self.settings.search_cache_refresh
+        user = current_user(self.settings)
+        # Runs are only shared within a user: tiers degrade and usage is charged per user's budget
+        key = make_key(query if isinstance(query, str) else "", str(getattr(depth, "value", depth)), fresh, user)
+        flight, leader = self.inflight.begin(key)
+        if not leader:
+            logger.debug(f"Joining in-flight research for query: {query}")
+            report_progress(progress, "research", 0.1, "Joining an identical research run in progress...")
+            results = copy.deepcopy(flight.wait())
+            report_progress(progress, "research", 1.0, f"Found {len(results['results']['results'])} sources")
+            return results
+        
+        usage = RunUsage("research", user)
+        try:
+            with start_trace("research"), use_usage(usage), self.run_scheduler.slot("research", usage.user):
+                results = self._execute(query, depth, progress, fresh)
+        except Exception as e:
+            self.inflight.finish(key, error=e)
+            raise
+        finally:
+            record_usage(self.settings, self.store, usage)
+        self.inflight.finish(key, result=results)
+        return results
+    
+    def execute_incremental(self, query: str, depth: str,
+                            progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Execute research and record which sources changed since the query's last synthesized run
+
+        The changes are stored with the results under "changes"; SynthesisAgent then
+        updates that run's synthesis from the new and changed sources only. The research
+        is always fresh, since cached searches would only repeat the previous run.
+        """
+        previous = self.store.latest_run(query)
+        results = self.execute(query, depth, progress, fresh=True)
+        if not previous or previous["run_id"] == results["run_id"]:
+            return results
+        
+        from utils.incremental import diff_research
+        results = dict(results, changes=diff_research(previous["research"], results))
+        changes = results["changes"]
+        logger.info(
+            f"Changes since run {previous['run_id']}: {len(changes['new'])} new, "
+            f"{len(changes['changed'])} changed, {len(changes['removed'])} removed, {changes['unchanged']} unchanged"
+        )
+        self._store_results(results)
+        return results
+    
+    def _execute(self, query: str, depth: str, progress: Optional[ProgressCallback] = None,
+                 fresh: bool = False) -> Dict[str, Any]:
+        """Run iterative search rounds, then deduplication, ranking and storage for one query"""
         try:
             if not query or not isinstance(query, str):
                 raise ValueError("Query must be a non-empty string")
             
-            # Ensure depth is correctly set
-            search_depth = "advanced" if depth.lower() == "advanced" else "basic"
-            logger.debug(f"Using Tavily search_depth: {search_depth}")
+            tier = self._apply_budget(ResearchTier.from_user_input(depth), self._planned_searches)
+            profile = self.settings.tier_profile(tier)
+            search_depth = profile["search_depth"]
+            logger.debug(f"Research tier {tier.value}: {profile}")
             
-            results = self._tavily_search(query, search_depth)
+            run_id = new_run_id()
+            if current_usage():
+                current_usage().run_id = run_id
+            rounds, summary = self._research_rounds(query, run_id, profile, progress, fresh)
+            results = {
+                "query": query,
+                "results": [source for r in rounds for source in r["sources"]],
+                "errors": summary.pop("errors")
+            }
+            if not results["results"] and results["errors"]:
+                raise Exception(f"Search error: {results['errors'][0]['error']}")
             
-            if isinstance(results, dict) and "error" in results:
-                raise Exception(f"Search error: {results['error']}")
+            report_progress(progress, "research", 0.8, "Removing duplicates and ranking sources...")
+            # Each research round may contribute a full page of results
+            results, dedup_stats, rerank_stats = self._rank(
+                query, results, self.settings.max_results_per_query * len(rounds)
+            )
+            pages = self._fetch_pages(results, tier, progress)
             
             # Add metadata to results
             results_with_metadata = {
+                "run_id": run_id,
                 "query": query,
                 "depth": search_depth,
+                "tier": tier.value,
                 "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
-                "user": "srikrishnavansi",  # Using the current user's login
+                "user": current_user(self.settings),
+                "rounds": summary,
+                "dedup": dedup_stats,
+                "rerank": rerank_stats,
+                "pages": pages,
                 "results": results
             }
             
             # Store results
             self._store_results(results_with_metadata)
+            report_progress(progress, "research", 1.0, f"Found {len(results['results'])} sources")
             
             return results_with_metadata
             
+        except BudgetExceededError:
+            raise
         except Exception as e:
             logger.error(f"Research execution failed: {str(e)}", exc_info=True)
             raise Exception(f"Research execution failed: {str(e)}")
     
-    def _tavily_search(self, query: str, search_depth: str) -> Dict[str, Any]:
-        """Execute search using Tavily API with correct depth parameter"""
+    def _planned_searches(self, tier: ResearchTier) -> int:
+        """Most searches a tier's rounds can make: the query, then fan_out follow-ups per round"""
+        profile = self.settings.tier_profile(tier)
+        return 1 + (profile["rounds"] - 1) * profile["fan_out"]
+    
+    def _apply_budget(self, tier: ResearchTier, planned_searches) -> ResearchTier:
+        """Tier to research at within the run search budget and the user's daily budget
+
+        planned_searches gives the most searches a tier can make. Over budget, the tier
+        steps down (to shallow once the daily budget is spent) when budget_action is
+        "degrade"; otherwise BudgetExceededError is raised.
+        """
+        usage = current_usage()
+        user = usage.user if usage else current_user(self.settings)
+        reject = self.settings.budget_action.lower() == "reject"
+        requested = tier
+        reason = check_period_budget(self.settings, self.store, user)
+        if reason:
+            if reject:
+                raise BudgetExceededError(f"Research rejected: {reason}")
+            tier = ResearchTier.SHALLOW
+        
+        budget = self.settings.run_search_budget
+        tiers = list(ResearchTier)
+        while budget and planned_searches(tier) * SEARCH_CREDITS[tier.search_depth.value] > budget:
+            if reject or tier == tiers[0]:
+                raise BudgetExceededError(
+                    f"Research rejected: {tier.value} research may use more than the run search budget "
+                    f"of {budget} credits"
+                )
+            reason = f"run search budget of {budget} credits"
+            tier = tiers[tiers.index(tier) - 1]
+        
+        if tier != requested:
+            logger.info(f"Research degraded from {requested.value} to {tier.value}: {reason}")
+            if usage:
+                usage.degraded.append(f"research: {requested.value} -> {tier.value} ({reason})")
+        return tier
+    
+    def _research_rounds(self, query: str, run_id: str, profile: Dict[str, Any],
+                         progress: Optional[ProgressCallback] = None,
+                         fresh: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Search the query, then follow-up queries for gaps, round by round
+
+        Rounds already completed for the same query and search depth within
+        research_state_ttl are reused unless fresh, so deepening a shallow run to medium
+        only searches the missing rounds, while deep runs never build on basic searches.
+        Every new round is saved before the next one starts. Stops after the tier's rounds,
+        when a round finds no new sources, or when the time or token budget is spent.
+        Returns the rounds with their new sources, and a summary of the run.
+        """
+        from utils.dedup import canonicalize_url
+        state_key = make_key(query, profile["search_depth"])
+        state = None
+        if not fresh:
+            state = self.store.get_research_state(state_key, self.settings.research_state_ttl)
+        rounds = (state or {}).get("rounds", [])[:profile["rounds"]]
+        reused = len(rounds)
+        seen = {canonicalize_url(source.get("url") or "") for r in rounds for source in r["sources"]}
+        asked = {q.lower() for r in rounds for q in r["queries"]}
+        tokens_used = sum(r["tokens"] for r in rounds)
+        errors: List[Dict[str, str]] = []
+        stop_reason = "completed"
+        start = time.monotonic()
+        
+        while len(rounds) < profile["rounds"]:
+            number = len(rounds) + 1
+            report_progress(progress, "research", 0.1 + 0.6 * len(rounds) / profile["rounds"],
+                            "Searching the web..." if number == 1 else f"Research round {number}: following up on gaps...")
+            round_start = time.monotonic()
+            llm_tokens = 0
+            if number == 1:
+                queries = [query]
+            else:
+                try:
+                    queries, llm_tokens = self._propose_follow_ups(query, rounds, profile["fan_out"])
+                except Exception as e:
+                    logger.warning(f"Follow-up query generation failed, stopping after round {number - 1}: {str(e)}")
+                    stop_reason = "follow_up_failed"
+                    break
+                queries = [q for q in queries if q.lower() not in asked]
+                if not queries:
+                    stop_reason = "no_follow_ups"
+                    break
+            asked.update(q.lower() for q in queries)
+            
+            search = propagate(lambda q: (q, self._tavily_search(q, profile["search_depth"], fresh)))
+            merged = self._merge_search_results(query, list(self._search_executor.map(search, queries)))
+            errors.extend(merged["errors"])
+            new_sources = []
+            for source in merged["results"]:
+                url = canonicalize_url(source.get("url") or "")
+                if url and url in seen:
+                    continue
+                seen.add(url)
+                new_sources.append(dict(source, round=number))
+            
+            round_tokens = llm_tokens + sum(estimate_tokens(s.get("content") or "") for s in new_sources)
+            tokens_used += round_tokens
+            rounds.append({
+                "round": number,
+                "queries": queries,
+                "sources": new_sources,
+                "tokens": round_tokens,
+                "elapsed": round(time.monotonic() - round_start, 3)
+            })
+            if new_sources:
+                self.store.save_research_state(state_key, query, run_id, {"rounds": rounds})
+            logger.debug(f"Round {number}: {len(queries)} queries, {len(new_sources)} new sources")
+            
+            if not new_sources:
+                stop_reason = "no_new_sources"
+                break
+            if time.monotonic() - start >= profile["time_budget"]:
+                stop_reason = "time_budget"
+                break
+            if tokens_used >= profile["token_budget"]:
+                stop_reason = "token_budget"
+                break
+        
+        return rounds, {
+            "completed": len(rounds),
+            "planned": profile["rounds"],
+            "reused": reused,
+            "stop_reason": stop_reason,
+            "tokens": tokens_used,
+            "queries": [r["queries"] for r in rounds],
+            "new_sources": [len(r["sources"]) for r in rounds],
+            "errors": errors
+        }
+    
+    def _propose_follow_ups(self, query: str, rounds: List[Dict[str, Any]], count: int) -> Tuple[List[str], int]:
+        """Ask the LLM for search queries covering gaps in the sources found so far
+
+        Returns the queries and the estimated tokens the call used.
+        """
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        prompt = ChatPromptTemplate.from_messages([
+            ("human", """
+            Research question: {query}
+
+            Searches done so far:
+            {queries}
+
+            Sources found so far:
+            {sources}
+
+            Identify the most important aspects of the question these sources do not yet cover
+            and write up to {count} new web search queries that would fill those gaps.
+
+            Return only the search queries, one per line, without numbering or commentary.
+            """)
+        ])
+        sources = sorted((s for r in rounds for s in r["sources"]), key=lambda s: s.get("score") or 0, reverse=True)
+        inputs = {
+            "query": query,
+            "queries": "\n".join(f"- {q}" for r in rounds for q in r["queries"]),
+            "sources": "\n".join(
+                f"- {s.get('title') or s.get('url')}: {' '.join((s.get('content') or '').split())[:200]}"
+                for s in sources[:FOLLOW_UP_CONTEXT_SOURCES]
+            ),
+            "count": count
+        }
+        chain = (prompt | self.llm | StrOutputParser()).with_config(callbacks=usage_callbacks())
+        prompt_tokens = sum(estimate_tokens(str(value)) for value in inputs.values())
+        with span("llm.invoke", stage="follow_up", prompt_tokens=prompt_tokens) as current:
+            response = self.llm_scheduler.call(chain.invoke, inputs)
+            current.set(output_tokens=estimate_tokens(response))
+        return _parse_queries(response, [])[:count], prompt_tokens + estimate_tokens(response)
+    
+    async def aexecute(self, query: str, depth: str, num_sub_queries: Optional[int] = None,
+                       progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Execute deep research by searching generated sub-queries concurrently"""
+        usage = RunUsage("research", current_user(self.settings))
         try:
-            response = self.tavily_client.search(
-                query=query,
-                search_depth=search_depth
-            )
-            logger.debug(f"Tavily API response received")
-            return response
-        except Exception as e:
-            logger.error(f"Tavily search error: {str(e)}", exc_info=True)
-            error_msg = str(e)
-            return {"error": error_msg}
+            with start_trace("research"), use_usage(usage):
+                async with self.run_scheduler.aslot("research", usage.user):
+                    return await self._aexecute(query, depth, num_sub_queries, progress)
+        finally:
+            await asyncio.to_thread(record_usage, self.settings, self.store, usage)
     
-    def _store_results(self, results: Dict[str, Any]) -> None:
-        """Store research results with timestamp and metadata"""
+    async def _aexecute(self, query: str, depth: str, num_sub_queries: Optional[int] = None,
+                        progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Search sub-queries concurrently, then deduplicate, rank and store the merged results
+
+        Budget checks, ranking and storage block on SQLite and numpy, so they run in worker
+        threads rather than on the event loop.
+        """
         try:
-            # Create filename with timestamp and query
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            sanitized_query = "".join(c for c in results["query"][:30] if c.isalnum() or c in (' ', '-', '_')).strip()
-            filename = f"research_{timestamp}_{sanitized_query}.json"
+            if not query or not isinstance(query, str):
+                raise ValueError("Query must be a non-empty string")
+            
+            num_sub_queries = num_sub_queries or self.settings.deep_sub_queries
+            tier = await asyncio.to_thread(propagate(self._apply_budget), ResearchTier.from_user_input(depth),
+                                           lambda tier: num_sub_queries)
+            search_depth = tier.search_depth.value
+            
+            report_progress(progress, "research", 0.05, "Planning sub-queries...")
+            sub_queries = await self._agenerate_sub_queries(query, num_sub_queries)
+            logger.debug(f"Searching {len(sub_queries)} sub-queries: {sub_queries}")
+            
+            semaphore = asyncio.Semaphore(self.settings.search_concurrency)
+            completed = 0
+            
+            async def search(sub_query: str) -> Tuple[str, Dict[str, Any]]:
+                nonlocal completed
+                response = await self._atavily_search(sub_query, search_depth, semaphore)
+                completed += 1
+                report_progress(progress, "research", 0.1 + 0.6 * completed / len(sub_queries),
+                                f"Searched {completed} of {len(sub_queries)} sub-queries")
+                return response
             
-            # Ensure results directory exists
-            self.results_dir.mkdir(parents=True, exist_ok=True)
+            responses = await asyncio.gather(*(search(sub_query) for sub_query in sub_queries))
             
-            # Save results
-            file_path = self.results_dir / filename
-            with file_path.open('w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
+            results = self._merge_search_results(query, responses)
+            if not results["results"] and results["errors"]:
+                raise Exception(f"Search error: {results['errors'][0]['error']}")
             
-            logger.debug(f"Results stored in: {file_path}")
+            report_progress(progress, "research", 0.7, "Removing duplicates and ranking sources...")
+            results, dedup_stats, rerank_stats = await asyncio.to_thread(propagate(self._rank), query, results)
+            pages = await asyncio.to_thread(propagate(self._fetch_pages), results, tier, progress)
+            
+            run_id = new_run_id()
+            if current_usage():
+                current_usage().run_id = run_id
+            results_with_metadata = {
+                "run_id": run_id,
+                "query": query,
+                "depth": search_depth,
+                "tier": tier.value,
+                "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                "user": current_user(self.settings),
+                "sub_queries": sub_queries,
+                "dedup": dedup_stats,
+                "rerank": rerank_stats,
+                "pages": pages,
+                "results": results
+            }
+            
+            await asyncio.to_thread(propagate(self._store_results), results_with_metadata)
+            report_progress(progress, "research", 1.0, f"Found {len(results['results'])} sources")
+            
+            return results_with_metadata
+            
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            logger.error(f"Research execution failed: {str(e)}", exc_info=True)
+            raise Exception(f"Research execution failed: {str(e)}")
+    
+    async def _agenerate_sub_queries(self, query: str, num_sub_queries: int) -> List[str]:
+        """Ask the LLM to break the query into focused search queries"""
+        if num_sub_queries <= 1:
+            return [query]
+        
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        prompt = ChatPromptTemplate.from_messages([
+            ("human", """
+            Break the following research question into {count} distinct web search queries
+            that together cover its most important aspects: {query}
+
+            Return only the search queries, one per line, without numbering or commentary.
+            """)
+        ])
+        chain = (prompt | self.llm | StrOutputParser()).with_config(callbacks=usage_callbacks())
+        loop = asyncio.get_running_loop()
+        
+        def plan() -> str:
+            with span("llm.invoke", stage="plan") as current:
+                response = self.llm_scheduler.call(chain.invoke, {"query": query, "count": num_sub_queries - 1})
+                current.set(output_tokens=estimate_tokens(response))
+                return response
+        
+        try:
+            response = await loop.run_in_executor(self._search_executor, propagate(plan))
+        except Exception as e:
+            logger.warning(f"Sub-query generation failed, searching the original query only: {str(e)}")
+            return [query]
+        
+        return _parse_queries(response, [query])[:num_sub_queries]
+    
+    async def _atavily_search(self, query: str, search_depth: str,
+                              semaphore: asyncio.Semaphore) -> Tuple[str, Dict[str, Any]]:
+        """Run a blocking Tavily search in a worker thread, bounded by semaphore
+
+        Each attempt is limited to request_timeout by the outbound scheduler.
+        """
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                self._search_executor, propagate(self._tavily_search), query, search_depth
+            )
+            return query, response
+    
+    def _merge_search_results(self, query: str,
+                              responses: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Merge per-sub-query Tavily responses into a single response ordered by score"""
+        merged = []
+        errors = []
+        for sub_query, response in responses:
+            if "error" in response:
+                errors.append({"query": sub_query, "error": response["error"]})
+                continue
+            merged.extend(dict(result, sub_query=sub_query) for result in response.get("results", []))
+        
+        return {
+            "query": query,
+            "results": sorted(merged, key=lambda r: r.get("score") or 0, reverse=True),
+            "errors": errors
+        }
+    
+    def _rank(self, query: str, results: Dict[str, Any], top_k: Optional[int] = None
+              ) -> Tuple[Dict[str, Any], Optional[Dict[str, int]], Optional[Dict[str, Any]]]:
+        """Deduplicate and rerank a search response; returns it with both stages' stats"""
+        with span("research.rank", sources_in=len(results.get("results", []))) as current:
+            results, dedup_stats = self._deduplicate(results)
+            results, rerank_stats = self._rerank(query, results, top_k)
+            current.set(sources_out=len(results.get("results", [])))
+        return results, dedup_stats, rerank_stats
+    
+    def _fetch_pages(self, results: Dict[str, Any], tier: ResearchTier,
+                     progress: Optional[ProgressCallback] = None) -> Optional[Dict[str, int]]:
+        """Download the top sources in full and attach their text chunks as "page_chunks"
+
+        Only tiers listed in fetch_pages_tiers fetch pages; sources whose page can't be
+        fetched keep just their search snippet. Returns fetch counts, or None if skipped.
+        """
+        tiers = {t.strip().lower() for t in self.settings.fetch_pages_tiers.split(",")}
+        sources = [s for s in results.get("results", []) if s.get("url")][:self.settings.fetch_top_k]
+        if tier.value not in tiers or not sources:
+            return None
+        
+        report_progress(progress, "research", 0.9, f"Reading {len(sources)} full pages...")
+        with span("research.fetch", pages=len(sources)) as current:
+            pages = self.page_fetcher.fetch_many([s["url"] for s in sources], wrap=propagate)
+            stats = {"requested": len(sources), "fetched": 0, "cached": 0, "not_modified": 0,
+                     "skipped": 0, "blocked": 0, "error": 0, "chunks": 0}
+            for source, page in zip(sources, pages):
+                stats[page["status"]] += 1
+                if page["chunks"]:
+                    source["page_chunks"] = page["chunks"]
+                    stats["chunks"] += len(page["chunks"])
+            current.set(response_bytes=sum(p["bytes"] for p in pages), **stats)
+        logger.debug(f"Page fetch: {stats}")
+        return stats
+    
+    def _deduplicate(self, results: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, int]]]:
+        """Remove duplicate and near-duplicate sources from a search response"""
+        if not self.settings.dedup_enabled:
+            return results, None
+        from utils.dedup import deduplicate_results
+        kept, stats = deduplicate_results(results.get("results", []), self.settings.dedup_similarity)
+        if stats["input"] != stats["kept"]:
+            logger.debug(f"Dedup dropped {stats['input'] - stats['kept']} of {stats['input']} sources")
+        return dict(results, results=kept), stats
+    
+    def _rerank(self, query: str, results: Dict[str, Any],
+                top_k: Optional[int] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Keep the top_k (default max_results_per_query) sources most relevant to the query"""
+        if not self.settings.rerank_enabled:
+            return results, None
+        from utils.reranker import rerank_results
+        ranked, stats = rerank_results(query, results.get("results", []),
+                                       top_k or self.settings.max_results_per_query)
+        logger.debug(f"Reranked {stats['input']} sources in {stats['elapsed_ms']}ms, kept {stats['kept']}")
+        return dict(results, results=ranked), stats
+    
+    def _tavily_search(self, query: str, search_depth: str, fresh: bool = False) -> Dict[str, Any]:
+        """Execute search using Tavily API with correct depth parameter; fresh skips the cache lookup"""
+        with span("tavily.search", depth=search_depth, cache_hit=False) as current:
+            if self.search_cache and not (fresh or self.settings.search_cache_refresh):
+                cached = self.search_cache.get(query, search_depth)
+                if cached is not None:
+                    logger.debug(f"Search cache hit for query: {query}")
+                    current.set(cache_hit=True, results=len(cached.get("results", [])))
+                    return cached
+            
+            try:
+                response = self.tavily_scheduler.call(
+                    self.tavily_client.search,
+                    query=query,
+                    search_depth=search_depth,
+                    # The client's own default (60s) would outlive the scheduler's attempt timeout
+                    timeout=self.settings.request_timeout
+                )
+                logger.debug(f"Tavily API response received")
+                if current_usage():
+                    current_usage().add_search(search_depth)
+                size = len(json.dumps(response, ensure_ascii=False))
+                current.set(results=len(response.get("results", [])), response_bytes=size,
+                            response_tokens=size // CHARS_PER_TOKEN)
+                if self.search_cache:
+                    self.search_cache.set(query, search_depth, response)
+                return response
+            except Exception as e:
+                logger.error(f"Tavily search error: {str(e)}", exc_info=True)
+                current.set(error=type(e).__name__)
+                error_msg = str(e)
+                return {"error": error_msg}
+    
+    def _store_results(self, results: Dict[str, Any]) -> None:
+        """Store research results under their run ID
+
+        Stage timings of the current trace are stored with the results and refreshed
+        afterwards to include the store itself.
+        """
+        trace = current_trace()
+        if trace:
+            results["timings"] = trace.summary()
+        if current_usage():
+            results["usage"] = current_usage().to_dict(self.settings)
+        try:
+            with span("research.store") as current:
+                current.set(payload_bytes=self.store.save_research(results))
+            logger.debug(f"Results stored for run: {results['run_id']}")
             
         except Exception as e:
             logger.error(f"Failed to store results: {str(e)}", exc_info=True)
             # Don't raise the exception - just log it
             # This way, the research results can still be returned even if storage fails
+        if trace:
+            results["timings"] = trace.summary()
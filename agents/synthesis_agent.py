@@ -1,84 +1,618 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from typing import Dict, Any
+from functools import cached_property
+from typing import Dict, Any, List, Tuple, Iterator, Callable, Optional
 from datetime import datetime
-import json
-from pathlib import Path
+import copy
 import logging
-from utils.llm_setup import create_gemini_llm
+from utils.llm_backends import create_llm, model_for, run_batch, scheduler_for
+from utils.llm_cache import LLMCache
+from utils.run_scheduler import get_run_scheduler
+from utils.tokens import CHARS_PER_TOKEN, estimate_tokens, chunk_by_tokens
+from utils.prompt_packing import pack_research_data, format_sources
+from utils.storage import get_store, new_run_id
+from utils.progress import ProgressCallback, report_progress
+from utils.singleflight import SingleFlight, make_key
+from utils.tracing import Trace, configure_tracing, current_trace, start_trace, use_trace, span
+from utils.accounting import (BudgetExceededError, RunUsage, check_period_budget, current_usage, current_user,
+                              record_usage, today, usage_callbacks, use_usage)
 
 logger = logging.getLogger(__name__)
 
+# Tokens reserved for the model's answer when checking a synthesis against a token budget
+SYNTHESIS_OUTPUT_TOKENS = 1000
+# Smallest per-source excerpt of a compact synthesis
+COMPACT_SOURCE_CHARS = 200
+
+SYNTHESIS_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", """
+    Based on the following research data, provide a comprehensive synthesis about: {query}
+
+    Research Data:
+    {research_data}
+
+    Please provide:
+    1. A summary of the main findings
+    2. Key points and insights
+    3. Any relevant applications or implications
+
+    Format the response in a clear, well-structured manner.
+    """)
+])
+
+MAP_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", """
+    The following sources are part of a larger research result set about: {query}
+
+    Sources:
+    {sources}
+
+    Summarize the findings from these sources that are relevant to the topic.
+    Keep concrete facts, figures and the [number] of the source they came from. Be concise.
+    """)
+])
+
+REDUCE_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", """
+    The following partial summaries each cover a different subset of research sources about: {query}
+
+    {summaries}
+
+    Combine them into one comprehensive synthesis. Please provide:
+    1. A summary of the main findings
+    2. Key points and insights
+    3. Any relevant applications or implications
+
+    Format the response in a clear, well-structured manner.
+    """)
+])
+
+UPDATE_PROMPT = ChatPromptTemplate.from_messages([
+    ("human", """
+    Below is an earlier synthesis about: {query}
+
+    {previous_synthesis}
+
+    New or updated research data found since it was written:
+    {research_data}
+
+    Update the synthesis with this information. Keep what is still accurate, revise what
+    the new data contradicts or supersedes, and add new findings. Keep the same clear,
+    well-structured format and return the complete updated synthesis.
+    """)
+])
+
+class SynthesisStream:
+    """Iterator over synthesis text chunks; result holds the stored synthesis once exhausted"""
+
+    def __init__(self, chunks: Iterator[str], finalize: Callable[[str], Dict[str, Any]],
+                 abandon: Optional[Callable[[], None]] = None):
+        self._chunks = chunks
+        self._finalize = finalize
+        self._abandon = abandon
+        self.result: Optional[Dict[str, Any]] = None
+
+    def __iter__(self) -> Iterator[str]:
+        parts = []
+        try:
+            for chunk in self._chunks:
+                parts.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            # Closed before the end: stop generating now rather than when the chunks are collected
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
+            if self._abandon is not None:
+                self._abandon()
+            raise
+        except Exception as e:
+            logger.error(f"Error in synthesis: {str(e)}", exc_info=True)
+            raise
+        self.result = self._finalize("".join(parts))
+
 class SynthesisAgent:
     def __init__(self, settings):
         self.settings = settings
-        self.llm = create_gemini_llm(
-            api_key=settings.google_api_key.get_secret_value(),
-            model_name=settings.synthesis_agent_model,
-            temperature=0.7
-        )
+        self.llm_params = {
+            "model_name": model_for(settings, "synthesis"),
+            "temperature": settings.synthesis_temperature,
+            "top_p": 0.95,
+            "top_k": 40,
+            "max_output_tokens": None
+        }
+        # Map summaries go to their own, usually cheaper and faster, model
+        self.map_llm_params = dict(self.llm_params, model_name=model_for(settings, "map"))
+        self.llm_cache = None
+        sampled = self.llm_params["temperature"] > 0
+        if settings.llm_cache_enabled and (settings.llm_cache_sampled_outputs or not sampled):
+            self.llm_cache = LLMCache.from_settings(settings)
+        
+        self.llm_scheduler = scheduler_for(settings, "synthesis")
+        self.map_scheduler = scheduler_for(settings, "map")
+        self.run_scheduler = get_run_scheduler(settings)
+        configure_tracing(settings)
+        self.store = get_store(settings)
+        
+        # Identical concurrent synthesis requests share one in-flight LLM call
+        self.inflight = SingleFlight()
+
+    @cached_property
+    def llm(self):
+        """Chat model for the final synthesis, created the first time a synthesis needs it"""
+        params = dict(self.llm_params)
+        return create_llm(self.settings, params.pop("model_name"), **params)
+
+    @cached_property
+    def map_llm(self):
+        """Chat model for map-reduce summaries, created the first time a synthesis needs it"""
+        params = dict(self.map_llm_params)
+        return create_llm(self.settings, params.pop("model_name"), **params)
+
+    def process_results(self, research_data: Dict[str, Any], query: str,
+                        progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Process research results and generate a synthesis
+
+        Concurrent calls for the same research run and query wait on a single shared synthesis;
+        the synthesis waits for a slot of the current priority class in the run scheduler.
+        """
+        key = self._inflight_key(research_data, query)
+        flight, leader = self.inflight.begin(key)
+        if not leader:
+            logger.debug(f"Joining in-flight synthesis for query: {query}")
+            report_progress(progress, "synthesis", 0.1, "Joining an identical synthesis in progress...")
+            synthesis = copy.deepcopy(flight.wait())
+            report_progress(progress, "synthesis", 1.0, "Synthesis complete")
+            return synthesis
+
+        usage = self._new_usage(research_data)
+        try:
+            with start_trace("synthesis"), use_usage(usage), self.run_scheduler.slot("synthesis", usage.user):
+                synthesis = self._process_results(research_data, query, progress)
+        except Exception as e:
+            self.inflight.finish(key, error=e)
+            raise
+        finally:
+            record_usage(self.settings, self.store, usage)
+        self.inflight.finish(key, result=synthesis)
+        return synthesis
 
-    def process_results(self, research_data: Dict[str, Any], query: str) -> Dict[str, Any]:
-        """Process research results and generate a synthesis"""
+    def _process_results(self, research_data: Dict[str, Any], query: str,
+                         progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Generate, store and return the synthesis for one research payload"""
         try:
-            # Define the prompt template using the new ChatPromptTemplate
-            prompt = ChatPromptTemplate.from_messages([
-                ("human", """
-                Based on the following research data, provide a comprehensive synthesis about: {query}
+            prompt, inputs, details = self._prepare_final_prompt(research_data, query, progress)
+            if prompt is None:
+                # Nothing changed since the previous run; its synthesis stands without an LLM call
+                result, cache_hit = details["previous_synthesis"], True
+            else:
+                report_progress(progress, "synthesis", 0.8, "Writing the synthesis...")
+                result, cache_hit = self._run_prompt(prompt, inputs)
+            synthesis = self._complete_synthesis(research_data, query, result, cache_hit, details)
+            report_progress(progress, "synthesis", 1.0, "Synthesis complete")
+            return synthesis
 
-                Research Data:
-                {research_data}
+        except Exception as e:
+            logger.error(f"Error in synthesis: {str(e)}", exc_info=True)
+            raise
 
-                Please provide:
-                1. A summary of the main findings
-                2. Key points and insights
-                3. Any relevant applications or implications
+    def stream_results(self, research_data: Dict[str, Any], query: str,
+                       progress: Optional[ProgressCallback] = None) -> "SynthesisStream":
+        """Generate a synthesis incrementally
 
-                Format the response in a clear, well-structured manner.
-                """)
-            ])
+        Iterating the returned stream yields text chunks as the model produces them; once
+        it is exhausted the synthesis is stored and available as stream.result. Nothing
+        runs until the stream is first iterated. Concurrent streams for the same research
+        run and query share one generation: followers receive the complete text once the
+        leading stream finishes, and the leader holds a run scheduler slot until it is
+        exhausted or closed.
+        """
+        key = self._inflight_key(research_data, query)
+        outcome: Dict[str, Any] = {}
 
-            # Create the chain using the new pattern
-            chain = prompt | self.llm | StrOutputParser()
+        def lead() -> Iterator[str]:
+            flight, leader = self.inflight.begin(key)
+            if not leader:
+                logger.debug(f"Joining in-flight synthesis for query: {query}")
+                report_progress(progress, "synthesis", 0.1, "Joining an identical synthesis in progress...")
+                outcome["result"] = copy.deepcopy(flight.wait())
+                yield outcome["result"]["synthesis"]
+                report_progress(progress, "synthesis", 1.0, "Synthesis complete")
+                return
 
-            # Execute the chain
-            result = chain.invoke({
-                "query": query,
-                "research_data": json.dumps(research_data, indent=2)
-            })
+            finished = False
+            try:
+                with self.run_scheduler.slot("synthesis", current_user(self.settings)):
+                    stream = self._stream_results(research_data, query, progress)
+                    yield from stream
+                outcome["result"] = stream.result
+                finished = True
+                self.inflight.finish(key, result=stream.result)
+            except Exception as e:
+                finished = True
+                self.inflight.finish(key, error=e)
+                raise
+            finally:
+                if not finished:
+                    self.inflight.finish(key, error=RuntimeError("The leading synthesis stream was abandoned"))
 
-            # Format the final output
-            synthesis = {
-                "query": query,
-                "synthesis": result,
-                "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
-                "metadata": {
-                    "model": self.settings.synthesis_agent_model,
-                    "user": "srikrishnavansi"
-                }
-            }
+        return SynthesisStream(lead(), lambda text: outcome["result"])
 
-            # Store the synthesis
-            self._store_synthesis(synthesis)
+    def _new_usage(self, research_data: Dict[str, Any]) -> RunUsage:
+        usage = RunUsage("synthesis", current_user(self.settings))
+        usage.run_id = research_data.get("run_id")
+        return usage
 
-            return synthesis
+    def _inflight_key(self, research_data: Dict[str, Any], query: str) -> str:
+        """Identify a synthesis by its research run, or by the research payload if it has no run ID,
+        and by the user whose budget it is charged to"""
+        return make_key(research_data.get("run_id") or research_data.get("results"), query,
+                        current_user(self.settings))
 
+    def _stream_results(self, research_data: Dict[str, Any], query: str,
+                        progress: Optional[ProgressCallback] = None) -> "SynthesisStream":
+        """Start a streaming synthesis for one research payload"""
+        # The stream is consumed after this returns, so stages record onto an explicit trace
+        # and LLM calls onto an explicit usage
+        trace = Trace("synthesis")
+        usage = self._new_usage(research_data)
+        try:
+            with use_trace(trace), use_usage(usage):
+                prompt, inputs, details = self._prepare_final_prompt(research_data, query, progress)
         except Exception as e:
             logger.error(f"Error in synthesis: {str(e)}", exc_info=True)
+            record_usage(self.settings, self.store, usage)
             raise
 
+        def complete(text: str, cache_hit: bool) -> Dict[str, Any]:
+            with use_trace(trace), use_usage(usage):
+                synthesis = self._complete_synthesis(research_data, query, text, cache_hit, details)
+            record_usage(self.settings, self.store, usage)
+            report_progress(progress, "synthesis", 1.0, "Synthesis complete")
+            return synthesis
+
+        def abandon_cached() -> None:
+            # Still record what the map phase used
+            record_usage(self.settings, self.store, usage)
+
+        if prompt is None:
+            return SynthesisStream(iter([details["previous_synthesis"]]), lambda text: complete(text, True),
+                                   abandon_cached)
+        report_progress(progress, "synthesis", 0.8, "Writing the synthesis...")
+
+        cache_key = None
+        if self.llm_cache:
+            cache_key = LLMCache.make_key(prompt.format_messages(**inputs), self.llm_params)
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("LLM cache hit")
+                return SynthesisStream(iter([cached]), lambda text: complete(text, True), abandon_cached)
+
+        chain = (prompt | self.llm | StrOutputParser()).with_config(callbacks=usage_callbacks(usage))
+
+        streamed = {"chars": 0}
+
+        def generate() -> Iterator[str]:
+            with use_trace(trace), span("llm.stream", prompt_tokens=self._input_tokens(inputs)) as current:
+                try:
+                    for chunk in self.llm_scheduler.stream(chain.stream, inputs):
+                        streamed["chars"] += len(chunk)
+                        yield chunk
+                except Exception:
+                    record_usage(self.settings, self.store, usage)
+                    raise
+                current.set(output_chars=streamed["chars"], output_tokens=streamed["chars"] // CHARS_PER_TOKEN)
+
+        def finalize(text: str) -> Dict[str, Any]:
+            if cache_key:
+                self.llm_cache.set(cache_key, text, self.llm_params["model_name"])
+            return complete(text, False)
+
+        def abandon() -> None:
+            # Providers report no usage for a stream closed part way, so estimate what it used
+            usage.add_llm(self.llm_params["model_name"], self._input_tokens(inputs),
+                          streamed["chars"] // CHARS_PER_TOKEN, estimated=True)
+            record_usage(self.settings, self.store, usage)
+
+        return SynthesisStream(generate(), finalize, abandon)
+
+    def _prepare_final_prompt(self, research_data: Dict[str, Any], query: str,
+                              progress: Optional[ProgressCallback] = None
+                              ) -> Tuple[Optional[ChatPromptTemplate], Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Pack the research data and return the prompt and inputs for the final synthesis call
+
+        For large result sets this runs the map phase of map-reduce synthesis, so the
+        returned prompt is the final reduce step. Research with recorded changes since an
+        earlier run updates that run's synthesis instead; when no source is new or changed,
+        or the daily budget is spent, the prompt is None and details["previous_synthesis"]
+        is the result. Without a previous synthesis a spent daily budget raises
+        BudgetExceededError, whatever the budget_action.
+        """
+        report_progress(progress, "synthesis", 0.05, "Preparing sources...")
+        allowance, reason = self._token_allowance()
+        previous = self._previous_synthesis(research_data)
+        if previous is not None:
+            return self._prepare_update_prompt(research_data, query, previous, allowance, reason, progress)
+        if reason:
+            # Even a compact synthesis takes an LLM call the budget no longer covers
+            raise BudgetExceededError(f"Synthesis rejected: {reason}")
+        with span("synthesis.prompt") as current:
+            packed_sources, packed_text, packing = pack_research_data(
+                research_data, self.settings.synthesis_source_chars
+            )
+            if allowance is not None and packing["tokens_after"] + SYNTHESIS_OUTPUT_TOKENS > allowance:
+                reason = (f"~{packing['tokens_after']} prompt tokens and the answer exceed the "
+                          f"remaining budget of {allowance} tokens")
+                if self.settings.budget_action.lower() == "reject":
+                    raise BudgetExceededError(f"Synthesis rejected: {reason}")
+                packed_sources, packed_text, packing = self._compact_pack(research_data, allowance)
+                logger.info(f"Compact synthesis of {packing['sources_out']} sources: {reason}")
+                if current_usage():
+                    current_usage().degraded.append(f"synthesis: compact ({reason})")
+                current.set(mode="compact", chunks=1, sources_in=packing["sources_in"],
+                            sources_out=packing["sources_out"], prompt_tokens=packing["tokens_after"])
+                return SYNTHESIS_PROMPT, {
+                    "query": query,
+                    "research_data": packed_text
+                }, {"mode": "compact", "chunks": 1, "map_cached": True, "packing": packing}
+            logger.info(
+                f"Packed research data from ~{packing['tokens_before']} to ~{packing['tokens_after']} tokens "
+                f"({packing['sources_out']}/{packing['sources_in']} sources)"
+            )
+            current.set(sources_in=packing["sources_in"], sources_out=packing["sources_out"],
+                        research_chars=packing["chars_before"], prompt_tokens=packing["tokens_after"])
+
+            if packing["tokens_after"] > self.settings.map_reduce_threshold_tokens and len(packed_sources) > 1:
+                logger.debug("Packed sources exceed the threshold; using map-reduce synthesis")
+                summaries, map_cached, chunk_count = self._map_phase(packed_sources, query, progress)
+                inputs = {"query": query, "summaries": self._format_summaries(summaries)}
+                current.set(mode="map_reduce", chunks=chunk_count, prompt_tokens=self._input_tokens(inputs))
+                return REDUCE_PROMPT, inputs, {
+                    "mode": "map_reduce", "chunks": chunk_count, "map_cached": map_cached, "packing": packing
+                }
+
+            current.set(mode="single", chunks=1)
+            return SYNTHESIS_PROMPT, {
+                "query": query,
+                "research_data": packed_text
+            }, {"mode": "single", "chunks": 1, "map_cached": True, "packing": packing}
+
+    def _token_allowance(self) -> Tuple[Optional[int], Optional[str]]:
+        """LLM tokens this synthesis may use within the run and daily budgets, or None without
+        a limit, and the reason if the user's daily budget is already spent
+
+        Raises BudgetExceededError when the user's daily budget is spent and budget_action
+        is "reject".
+        """
+        user = current_usage().user if current_usage() else current_user(self.settings)
+        reason = check_period_budget(self.settings, self.store, user)
+        if reason:
+            if self.settings.budget_action.lower() == "reject":
+                raise BudgetExceededError(f"Synthesis rejected: {reason}")
+            return 0, reason
+        limits = []
+        if self.settings.run_token_budget:
+            limits.append(self.settings.run_token_budget)
+        if self.settings.daily_token_budget:
+            limits.append(self.settings.daily_token_budget - self.store.usage_totals(user, today())["tokens"])
+        return (min(limits), None) if limits else (None, None)
+
+    def _compact_pack(self, research_data: Dict[str, Any],
+                      allowance: int) -> Tuple[List[Dict[str, Any]], str, Dict[str, Any]]:
+        """Pack search snippets only, shortened and cut to the top sources, to fit allowance tokens"""
+        results = research_data.get("results", {})
+        sources = [{k: v for k, v in s.items() if k != "page_chunks"}
+                   for s in (results.get("results", []) if isinstance(results, dict) else [])]
+        budget_chars = max(0, allowance - SYNTHESIS_OUTPUT_TOKENS) * CHARS_PER_TOKEN
+        source_chars = max(COMPACT_SOURCE_CHARS,
+                           min(self.settings.synthesis_source_chars, budget_chars // max(1, len(sources))))
+        keep = max(1, budget_chars // source_chars)
+        compact = dict(research_data, results=dict(results, results=sources[:keep]))
+        return pack_research_data(compact, source_chars)
+
+    def _previous_synthesis(self, research_data: Dict[str, Any]) -> Optional[str]:
+        """Synthesis text of the run the research changes were computed against, if stored"""
+        changes = research_data.get("changes")
+        if not changes:
+            return None
+        run = self.store.get_run(changes["previous_run_id"])
+        if not run or not run["synthesis"]:
+            logger.warning(f"No synthesis stored for run {changes['previous_run_id']}; synthesizing in full")
+            return None
+        return run["synthesis"]["synthesis"]
+
+    def _prepare_update_prompt(self, research_data: Dict[str, Any], query: str, previous: str,
+                               allowance: Optional[int], reason: Optional[str],
+                               progress: Optional[ProgressCallback] = None
+                               ) -> Tuple[Optional[ChatPromptTemplate], Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Build the prompt that updates the previous synthesis with new and changed sources
+
+        allowance and reason come from _token_allowance: once the daily budget is spent the
+        previous synthesis is returned as it is, and an update that doesn't fit the allowance
+        is rejected or packed compactly like a full synthesis.
+        """
+        from utils.incremental import select_sources
+        changes = research_data["changes"]
+        incremental = {
+            "previous_run_id": changes["previous_run_id"],
+            "sources": len(changes["new"]) + len(changes["changed"]),
+            "llm_skipped": False
+        }
+        with span("synthesis.prompt", mode="update") as current:
+            if not incremental["sources"] or reason:
+                incremental["llm_skipped"] = True
+                current.set(sources_in=0, sources_out=0)
+                mode = "unchanged"
+                if incremental["sources"]:
+                    mode = "previous"
+                    logger.info(f"Returning the previous synthesis without the changed sources: {reason}")
+                    if current_usage():
+                        current_usage().degraded.append(f"synthesis: previous ({reason})")
+                return None, None, {"mode": mode, "chunks": 0, "map_cached": True, "packing": None,
+                                    "incremental": incremental, "previous_synthesis": previous}
+
+            changed = select_sources(research_data, changes["new"] + changes["changed"])
+            packed_sources, packed_text, packing = pack_research_data(
+                changed, self.settings.synthesis_source_chars
+            )
+            current.set(sources_in=packing["sources_in"], sources_out=packing["sources_out"],
+                        research_chars=packing["chars_before"])
+            details = {"mode": "update", "chunks": 1, "map_cached": True, "packing": packing,
+                       "incremental": incremental}
+            previous_tokens = estimate_tokens(previous)
+            if (allowance is not None
+                    and previous_tokens + packing["tokens_after"] + SYNTHESIS_OUTPUT_TOKENS > allowance):
+                reason = (f"~{previous_tokens + packing['tokens_after']} prompt tokens and the answer exceed "
+                          f"the remaining budget of {allowance} tokens")
+                if self.settings.budget_action.lower() == "reject":
+                    raise BudgetExceededError(f"Synthesis rejected: {reason}")
+                packed_sources, packed_text, packing = self._compact_pack(changed, max(0, allowance - previous_tokens))
+                logger.info(f"Compact update with {packing['sources_out']} sources: {reason}")
+                if current_usage():
+                    current_usage().degraded.append(f"synthesis: compact update ({reason})")
+                details.update(mode="update_compact", packing=packing)
+            elif packing["tokens_after"] > self.settings.map_reduce_threshold_tokens and len(packed_sources) > 1:
+                summaries, details["map_cached"], details["chunks"] = self._map_phase(packed_sources, query, progress)
+                packed_text = self._format_summaries(summaries)
+            inputs = {"query": query, "previous_synthesis": previous, "research_data": packed_text}
+            current.set(chunks=details["chunks"], prompt_tokens=self._input_tokens(inputs))
+            return UPDATE_PROMPT, inputs, details
+
+    def _complete_synthesis(self, research_data: Dict[str, Any], query: str, result: str,
+                            cache_hit: bool, details: Dict[str, Any]) -> Dict[str, Any]:
+        """Format and store the final synthesis record"""
+        # Format the final output
+        synthesis = {
+            "run_id": research_data.get("run_id") or new_run_id(),
+            "query": query,
+            "synthesis": result,
+            "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            "metadata": {
+                "model": self.llm_params["model_name"],
+                "user": current_user(self.settings),
+                "cache_hit": cache_hit and details["map_cached"],
+                "mode": details["mode"],
+                "chunks": details["chunks"],
+                "packing": details["packing"]
+            }
+        }
+        if "incremental" in details:
+            synthesis["metadata"]["incremental"] = details["incremental"]
+
+        # Store the synthesis
+        self._store_synthesis(synthesis)
+
+        return synthesis
+
+    def _run_prompt(self, prompt: ChatPromptTemplate, inputs: Dict[str, Any]) -> Tuple[str, bool]:
+        """Invoke the LLM chain for a prompt, reusing cached responses; returns (text, cache_hit)"""
+        # Reuse a previous response for an identical prompt and model configuration
+        cache_key = None
+        if self.llm_cache:
+            cache_key = LLMCache.make_key(prompt.format_messages(**inputs), self.llm_params)
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("LLM cache hit")
+                return cached, True
+
+        # Create the chain using the new pattern
+        chain = (prompt | self.llm | StrOutputParser()).with_config(callbacks=usage_callbacks())
+
+        # Execute the chain
+        with span("llm.invoke", prompt_tokens=self._input_tokens(inputs)) as current:
+            result = self.llm_scheduler.call(chain.invoke, inputs)
+            current.set(output_chars=len(result), output_tokens=estimate_tokens(result))
+
+        if cache_key:
+            self.llm_cache.set(cache_key, result, self.llm_params["model_name"])
+        return result, False
+
+    def _run_map_prompts(self, prompt: ChatPromptTemplate,
+                         inputs_list: List[Dict[str, Any]]) -> List[Tuple[str, bool]]:
+        """Run many map-stage prompts as one concurrent batch, reusing cached responses
+
+        Returns (text, cache_hit) per input, in order.
+        """
+        results: List[Optional[Tuple[str, bool]]] = [None] * len(inputs_list)
+        cache_keys: List[Optional[str]] = [None] * len(inputs_list)
+        if self.llm_cache:
+            for i, inputs in enumerate(inputs_list):
+                cache_keys[i] = LLMCache.make_key(prompt.format_messages(**inputs), self.map_llm_params)
+                cached = self.llm_cache.get(cache_keys[i])
+                if cached is not None:
+                    results[i] = (cached, True)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+
+        chain = (prompt | self.map_llm | StrOutputParser()).with_config(callbacks=usage_callbacks())
+        batch = [inputs_list[i] for i in pending]
+        with span("llm.batch", stage="map", prompts=len(batch),
+                  prompt_tokens=sum(self._input_tokens(inputs) for inputs in batch)) as current:
+            texts = run_batch(self.map_scheduler, chain, batch, self.settings.map_reduce_concurrency)
+            current.set(output_tokens=sum(estimate_tokens(text) for text in texts))
+        for i, text in zip(pending, texts):
+            results[i] = (text, False)
+            if cache_keys[i]:
+                self.llm_cache.set(cache_keys[i], text, self.map_llm_params["model_name"])
+        return results
+
+    def _map_phase(self, sources: List[Dict[str, Any]], query: str,
+                   progress: Optional[ProgressCallback] = None) -> Tuple[List[str], bool, int]:
+        """Summarize token-budgeted chunks of sources in concurrent batches
+
+        Returns partial summaries small enough for one reduce prompt, whether they all
+        came from the cache, and the number of source chunks.
+        """
+        budget = self.settings.synthesis_chunk_tokens
+        chunks = chunk_by_tokens(sources, budget)
+        logger.debug(f"Map-reduce synthesis over {len(sources)} sources in {len(chunks)} chunks")
+
+        report_progress(progress, "synthesis", 0.1, f"Summarizing {len(chunks)} source groups...")
+        mapped = self._run_map_prompts(
+            MAP_PROMPT, [{"query": query, "sources": format_sources(chunk)} for chunk in chunks]
+        )
+        summaries = [text for text, _ in mapped]
+        all_cached = all(hit for _, hit in mapped)
+        report_progress(progress, "synthesis", 0.7, f"Summarized {len(chunks)} source groups")
+
+        # Collapse summaries in groups until they fit into a single reduce prompt
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > budget:
+            groups = chunk_by_tokens([{"summary": text} for text in summaries], budget)
+            if len(groups) == len(summaries):
+                break  # each summary already fills the budget; reduce them as they are
+            reduced = self._run_map_prompts(REDUCE_PROMPT, [
+                {"query": query, "summaries": self._format_summaries([item["summary"] for item in group])}
+                for group in groups
+            ])
+            summaries = [text for text, _ in reduced]
+            all_cached = all_cached and all(hit for _, hit in reduced)
+
+        return summaries, all_cached, len(chunks)
+
+    def _input_tokens(self, inputs: Dict[str, Any]) -> int:
+        """Estimated tokens of the variable parts of a prompt"""
+        return sum(estimate_tokens(str(value)) for value in inputs.values())
+
+    def _format_summaries(self, summaries: List[str]) -> str:
+        return "\n\n".join(f"Partial summary {i}:\n{text}" for i, text in enumerate(summaries, 1))
+
     def _store_synthesis(self, synthesis: Dict[str, Any]) -> None:
-        """Store the synthesis results"""
+        """Store the synthesis results alongside the research for the same run
+
+        Stage timings of the current trace are stored in the metadata and refreshed
+        afterwards to include the store itself.
+        """
+        trace = current_trace()
+        if trace:
+            synthesis["metadata"]["timings"] = trace.summary()
+        if current_usage():
+            synthesis["metadata"]["usage"] = current_usage().to_dict(self.settings)
         try:
-            results_dir = Path(self.settings.results_dir)
-            results_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Use formatted timestamp for filename
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            file_path = results_dir / f"synthesis_{timestamp}.json"
-            
-            with file_path.open('w') as f:
-                json.dump(synthesis, f, indent=2, ensure_ascii=False)
+            with span("synthesis.store") as current:
+                current.set(payload_bytes=self.store.save_synthesis(synthesis))
                 
         except Exception as e:
-            logger.error(f"Failed to store synthesis: {str(e)}", exc_info=True)
\ No newline at end of file
+            logger.error(f"Failed to store synthesis: {str(e)}", exc_info=True)
+        if trace:
+            synthesis["metadata"]["timings"] = trace.summary()
@@ -1,7 +1,9 @@
 import streamlit as st
 from agents.research_agent import ResearchAgent
 from agents.synthesis_agent import SynthesisAgent
-from config import settings, SearchDepth
+from config import settings, ResearchTier
+from utils.jobs import JobManager
+from utils.storage import get_store
 import time
 from datetime import datetime
 import json
@@ -20,9 +22,11 @@ logger = logging.getLogger(__name__)
 # Constants
 CURRENT_TIMESTAMP = "2025-02-28 13:13:43"
 CURRENT_USER = "srikrishnavansi"
+JOB_POLL_INTERVAL = 0.5  # seconds between progress refreshes while a job runs
 
+@st.cache_resource
 def load_lottie_animation():
-    """Load local Lottie animation file"""
+    """Load local Lottie animation file once per process"""
     try:
         with open('static/animations/research_animation.json', 'r') as f:
             return json.load(f)
@@ -36,13 +40,29 @@ def initialize_session_state():
         st.session_state.research_history = []
     if 'current_process' not in st.session_state:
         st.session_state.current_process = None
-    if 'progress' not in st.session_state:
-        st.session_state.progress = 0
+    if 'job_id' not in st.session_state:
+        st.session_state.job_id = None
+    if 'recorded_jobs' not in st.session_state:
+        st.session_state.recorded_jobs = set()
+
+@st.cache_resource
+def load_custom_css():
+    """Read the custom stylesheet once per process"""
+    with open('static/css/style.css') as f:
+        return f.read()
 
 def inject_custom_css():
     """Inject custom CSS"""
-    with open('static/css/style.css') as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    st.markdown(f'<style>{load_custom_css()}</style>', unsafe_allow_html=True)
+
+@st.cache_resource
+def get_agents():
+    """Create the research and synthesis agents once per process
+
+    The agents, their Tavily/Gemini clients and pooled HTTP connections are shared by
+    every Streamlit session; their caches, stores and schedulers are thread-safe.
+    """
+    return ResearchAgent(settings), SynthesisAgent(settings)
 
 def create_progress_chart(progress):
     """Create a circular progress chart using plotly"""
@@ -71,6 +91,26 @@ def create_progress_chart(progress):
     )
     return fig
 
+def create_timings_chart(timings):
+    """Create a horizontal bar chart of pipeline stage durations using plotly"""
+    stages = [(phase, span) for phase in ("research", "synthesis") for span in timings.get(phase, [])]
+    fig = go.Figure(go.Bar(
+        x=[span["duration_ms"] for _, span in stages],
+        y=[f"{phase}: {span['name']}" for phase, span in stages],
+        orientation="h",
+        marker={'color': "#3b82f6"}
+    ))
+    fig.update_layout(
+        height=60 + 30 * len(stages),
+        margin={'l': 10, 'r': 10, 't': 10, 'b': 10},
+        xaxis={'title': "ms"},
+        yaxis={'autorange': "reversed"},
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': "#fafafa"}
+    )
+    return fig
+
 def display_research_process(title, description, progress):
     """Display research process with animation"""
     col1, col2 = st.columns([3, 1])
@@ -84,64 +124,88 @@ def display_research_process(title, description, progress):
     with col2:
         st.plotly_chart(create_progress_chart(progress), use_container_width=True)
 
-def execute_research(query: str, depth: str):
-    """Execute research process with UI updates"""
+@st.cache_resource
+def get_job_manager():
+    """Create the background job manager once per process"""
+    research_agent, synthesis_agent = get_agents()
+    return JobManager(research_agent, synthesis_agent, get_store(settings), settings.job_workers)
+
+def start_research(query: str, depth: str):
+    """Submit a research job and remember it so the page can reattach after a refresh"""
     try:
-        # Initialize agents
-        research_agent = ResearchAgent(settings)
-        synthesis_agent = SynthesisAgent(settings)
-        
-        # Research Phase
-        st.session_state.progress = 25
-        display_research_process(
-            "🔍 Research Phase",
-            "Gathering information from various sources...",
-            st.session_state.progress
-        )
-        
-        research_start = time.time()
-        research_results = research_agent.execute(query, depth)
-        research_time = time.time() - research_start
-        
-        # Update progress
-        st.session_state.progress = 75
-        display_research_process(
-            "📊 Processing Data",
-            "Analyzing and structuring gathered information...",
-            st.session_state.progress
-        )
-        
-        # Synthesis Phase
-        synthesis_start = time.time()
-        synthesis = synthesis_agent.process_results(research_results, query)
-        synthesis_time = time.time() - synthesis_start
-        
-        # Update progress
-        st.session_state.progress = 100
-        display_research_process(
-            "✅ Research Complete",
-            "Final results ready!",
-            st.session_state.progress
-        )
-        
-        # Store results
-        result = {
-            "query": query,
-            "timestamp": CURRENT_TIMESTAMP,
-            "user": CURRENT_USER,
-            "research_time": f"{research_time:.2f}s",
-            "synthesis_time": f"{synthesis_time:.2f}s",
-            "depth": depth,
-            "results": synthesis
-        }
-        
-        st.session_state.research_history.append(result)
-        return result
-        
+        job_id = get_job_manager().submit(query, depth, CURRENT_USER)
     except Exception as e:
         st.error(f"Error during research: {str(e)}")
         logger.error(f"Research error: {str(e)}", exc_info=True)
         return None
+    st.session_state.job_id = job_id
+    st.query_params["job"] = job_id
+    return job_id
+
+def display_job_progress(job):
+    """Display the phase progress reported by the agents for a running job"""
+    titles = {"research": "🔍 Research Phase", "synthesis": "📊 Synthesis Phase"}
+    display_research_process(titles.get(job["stage"], "⏳ Queued"), job["message"], job["progress"])
+    if job["partial_synthesis"]:
+        st.markdown(f'<div class="summary-content fade-in">{job["partial_synthesis"]}</div>',
+                    unsafe_allow_html=True)
+
+def display_results(result):
+    """Display a completed research result in tabs"""
+    tab1, tab2, tab3 = st.tabs(["📊 Summary", "📋 Details", "🔍 Raw Data"])
+    
+    with tab1:
+        st.markdown("""
+            <div class="results-summary slide-up">
+                <h3>Research Summary</h3>
+            </div>
+        """, unsafe_allow_html=True)
+        st.markdown(f'<div class="summary-content fade-in">{result["results"]["synthesis"]}</div>', 
+                   unsafe_allow_html=True)
+    
+    with tab2:
+        st.markdown("""
+            <div class="results-details slide-up">
+                <h3>Research Details</h3>
+            </div>
+        """, unsafe_allow_html=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown(f"""
+                <div class="metric-container fade-in">
+                    <p class="metric-label">Research Time</p>
+                    <h4 class="metric-value">{result['research_time']}</h4>
+                </div>
+            """, unsafe_allow_html=True)
+        with col2:
+            st.markdown(f"""
+                <div class="metric-container fade-in">
+                    <p class="metric-label">Synthesis Time</p>
+                    <h4 class="metric-value">{result['synthesis_time']}</h4>
+                </div>
+            """, unsafe_allow_html=True)
+
+        st.markdown(f"""
+            <div class="details-card slide-up">
+                <p><strong>Query:</strong> {result['query']}</p>
+                <p><strong>Depth:</strong> {result['depth']}</p>
+                <p><strong>Timestamp:</strong> {result['timestamp']}</p>
+                <p><strong>User:</strong> {result['user']}</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+        timings = result.get("timings")
+        if timings and (timings.get("research") or timings.get("synthesis")):
+            st.markdown("#### Stage Timings")
+            st.plotly_chart(create_timings_chart(timings), use_container_width=True)
+            st.dataframe(
+                [dict(phase=phase, **span) for phase in ("research", "synthesis") for span in timings.get(phase, [])],
+                use_container_width=True
+            )
+
+    with tab3:
+        st.json(result)
 
 def main():
     st.set_page_config(
@@ -176,10 +240,10 @@ def main():
         # Depth selector
         depth = st.select_slider(
             "Research Depth",
-            options=[SearchDepth.BASIC, SearchDepth.ADVANCED],
-            value=SearchDepth.BASIC,
+            options=[ResearchTier.SHALLOW, ResearchTier.MEDIUM, ResearchTier.DEEP],
+            value=ResearchTier.SHALLOW,
             format_func=lambda x: x.value,
-            help="Choose the depth of research"
+            help="Deeper tiers run more search rounds, following up on gaps in the sources found so far"
         )
         
         st.markdown("---")
@@ -242,57 +306,32 @@ def main():
         if not query:
             st.warning("Please enter a research query")
             return
-            
-        with st.spinner("🔍 Conducting research..."):
-            result = execute_research(query, depth.value)
-            
-        if result:
-            # Display results in tabs
-            tab1, tab2, tab3 = st.tabs(["📊 Summary", "📋 Details", "🔍 Raw Data"])
-            
-            with tab1:
-                st.markdown("""
-                    <div class="results-summary slide-up">
-                        <h3>Research Summary</h3>
-                    </div>
-                """, unsafe_allow_html=True)
-                st.markdown(f'<div class="summary-content fade-in">{result["results"]["synthesis"]}</div>', 
-                           unsafe_allow_html=True)
-            
-            with tab2:
-                st.markdown("""
-                    <div class="results-details slide-up">
-                        <h3>Research Details</h3>
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.markdown(f"""
-                        <div class="metric-container fade-in">
-                            <p class="metric-label">Research Time</p>
-                            <h4 class="metric-value">{result['research_time']}</h4>
-                        </div>
-                    """, unsafe_allow_html=True)
-                with col2:
-                    st.markdown(f"""
-                        <div class="metric-container fade-in">
-                            <p class="metric-label">Synthesis Time</p>
-                            <h4 class="metric-value">{result['synthesis_time']}</h4>
-                        </div>
-                    """, unsafe_allow_html=True)
-                
-                st.markdown(f"""
-                    <div class="details-card slide-up">
-                        <p><strong>Query:</strong> {result['query']}</p>
-                        <p><strong>Depth:</strong> {result['depth']}</p>
-                        <p><strong>Timestamp:</strong> {result['timestamp']}</p>
-                        <p><strong>User:</strong> {result['user']}</p>
-                    </div>
-                """, unsafe_allow_html=True)
-            
-            with tab3:
-                st.json(result)
+        start_research(query, depth.value)
+    
+    # Reattach to the current job, including after a page refresh
+    job_id = st.session_state.get("job_id") or st.query_params.get("job")
+    if not job_id:
+        return
+    
+    job = get_job_manager().get(job_id)
+    if job is None:
+        st.warning("Research job not found")
+        st.session_state.job_id = None
+        st.query_params.pop("job", None)
+        return
+    
+    if job["status"] in ("queued", "running"):
+        display_job_progress(job)
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+    elif job["status"] == "succeeded":
+        display_research_process("✅ Research Complete", job["message"], job["progress"])
+        if job_id not in st.session_state.recorded_jobs:
+            st.session_state.recorded_jobs.add(job_id)
+            st.session_state.research_history.append(job["result"])
+        display_results(job["result"])
+    else:
+        st.error(f"Error during research: {job['error'] or job['message']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,224 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import hashlib
+import random
+import threading
+import time
+
+WORDS = (
+    "research analysis market growth energy battery policy climate network model data "
+    "system adoption cost efficiency study report trend evidence impact region sector "
+    "technology supply demand risk forecast performance quality standard"
+).split()
+
+def _seeded(seed: int, *parts: str) -> random.Random:
+    """Random generator whose output depends only on seed and parts"""
+    digest = hashlib.sha256("\x1f".join((str(seed),) + parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+def _text(rng: random.Random, chars: int) -> str:
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:chars]
+
+class FakeTavilyClient:
+    """Deterministic stand-in for TavilyClient.search
+
+    Responses depend only on the query, depth and seed. latency (+/- jitter) seconds are
+    slept per call and error_rate of calls raise a retryable ConnectionError. Result URLs
+    point at base_url, e.g. a PageServer, when one is given.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, results: int = 10,
+                 content_chars: int = 800, error_rate: float = 0.0, seed: int = 0,
+                 base_url: Optional[str] = None):
+        self.latency = latency
+        self.base_url = base_url
+        self.jitter = jitter
+        self.results = results
+        self.content_chars = content_chars
+        self.error_rate = error_rate
+        self.seed = seed
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def _draw(self) -> Tuple[float, float]:
+        with self._lock:
+            self.calls += 1
+            return self._rng.random(), self._rng.random()
+
+    def search(self, query: str, search_depth: str = "basic", **kwargs) -> Dict[str, Any]:
+        jitter, failure = self._draw()
+        time.sleep(max(0.0, self.latency + self.jitter * (2 * jitter - 1)))
+        if failure < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise ConnectionError("Fake Tavily transient error")
+
+        rng = _seeded(self.seed, query, search_depth)
+        slug = "-".join(query.lower().split())[:60]
+        return {
+            "query": query,
+            "response_time": self.latency,
+            "images": [],
+            "results": [
+                {
+                    "title": f"{query} - {_text(rng, 40)}",
+                    "url": (f"{self.base_url}/source{i}/{slug}" if self.base_url
+                            else f"https://source{i}.example.com/{slug}"),
+                    "content": _text(rng, self.content_chars),
+                    "score": round(1 - i / (self.results + 1), 4),
+                    "raw_content": None
+                }
+                for i in range(self.results)
+            ]
+        }
+
+class PageServer:
+    """Local HTTP server returning a deterministic article page for every path
+
+    Pages wrap page_chars of text in navigation, scripts and a footer for the text
+    extractor to strip, are served after latency seconds and carry an ETag so
+    conditional requests get 304 Not Modified. Use as a context manager; base_url
+    is set while it runs.
+    """
+
+    def __init__(self, latency: float = 0.05, page_chars: int = 20000, seed: int = 0):
+        self.latency = latency
+        self.page_chars = page_chars
+        self.seed = seed
+        self.requests = 0
+        self.not_modified = 0
+        self.base_url: Optional[str] = None
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def page(self, path: str) -> bytes:
+        rng = _seeded(self.seed, path)
+        paragraphs = []
+        length = 0
+        while length < self.page_chars:
+            paragraphs.append(_text(rng, 600))
+            length += 600
+        body = "".join(f"<p>{p}</p>" for p in paragraphs)
+        return (
+            "<html><head><title>Fixture</title><script>var tracking = 1;</script></head><body>"
+            "<nav><a href='/'>Home</a> <a href='/about'>About</a></nav>"
+            f"<main><article><h1>{path}</h1>{body}</article></main>"
+            "<footer>Copyright fixture pages</footer></body></html>"
+        ).encode("utf-8")
+
+    def __enter__(self) -> "PageServer":
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/robots.txt":
+                    # No robots.txt: every page may be fetched
+                    self.send_error(404)
+                    return
+                with fixture._lock:
+                    fixture.requests += 1
+                time.sleep(fixture.latency)
+                body = fixture.page(self.path)
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    with fixture._lock:
+                        fixture.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self.base_url = None
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for the Gemini chat model
+
+    Replies are output_chars of filler text seeded by the prompt, returned after latency
+    seconds (spread over the chunks when streaming). error_rate of calls raise a
+    retryable ConnectionError before any output is produced.
+    """
+
+    latency: float = 1.0
+    output_chars: int = 3000
+    chunk_chars: int = 40
+    error_rate: float = 0.0
+    seed: int = 0
+    calls: int = 0
+    errors: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        self.calls += 1
+        # Failures depend on the call count so retries of the same prompt can succeed
+        if _seeded(self.seed, str(self.calls)).random() < self.error_rate:
+            self.errors += 1
+            raise ConnectionError("Fake Gemini transient error")
+        return _text(_seeded(self.seed, prompt), self.output_chars)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        text = self._reply(messages)
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        text = self._reply(messages)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+@contextmanager
+def fake_providers(tavily: FakeTavilyClient, llm: FakeChatModel):
+    """Make agents created inside the block use the given fakes instead of Tavily and Gemini"""
+    import agents.research_agent as research_module
+    import agents.synthesis_agent as synthesis_module
+
+    def create_llm(*args, **kwargs):
+        return llm
+
+    originals = (research_module.create_tavily_client, research_module.create_llm,
+                 synthesis_module.create_llm)
+    research_module.create_tavily_client = lambda *args, **kwargs: tavily
+    research_module.create_llm = create_llm
+    synthesis_module.create_llm = create_llm
+    try:
+        yield
+    finally:
+        (research_module.create_tavily_client, research_module.create_llm,
+         synthesis_module.create_llm) = originals
@@ -0,0 +1,134 @@
+"""Startup time check for the CLI
+
+Measures how long `main.py --help` and the imports on the path to the first Tavily
+request take in fresh interpreters, and fails if either exceeds its budget or pulls in
+a module that only a later stage needs:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 10 --output import_time.json
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import typer
+from rich.console import Console
+from rich.table import Table
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# (name, python arguments, modules that must not be imported, budget in ms above bare startup)
+PROBES = (
+    ("help", ["main.py", "--help"],
+     ("config", "pydantic_settings", "agents", "langchain_core", "langchain_google_genai", "tavily", "numpy",
+      "typer.rich_utils"),
+     200),
+    ("first_network_call", ["-c", "import main, config, agents.research_agent, tavily"],
+     ("agents.synthesis_agent", "langchain_core", "langchain_google_genai", "numpy"),
+     400),
+)
+
+check = typer.Typer()
+console = Console(stderr=True)
+
+def _run(args: List[str], env: Dict[str, str], import_log: bool = False) -> Tuple[float, str]:
+    """Run python in a fresh interpreter; returns wall time in ms and its stderr
+
+    With import_log the interpreter runs under -X importtime, which itself adds overhead,
+    so timed runs leave it off.
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *(["-X", "importtime"] if import_log else []), *args], cwd=REPO_DIR, env=env,
+        capture_output=True, text=True
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(f"python {' '.join(args)} failed: {completed.stderr.strip().splitlines()[-1:]}")
+    return elapsed, completed.stderr
+
+def _imported_modules(import_log: str) -> List[Tuple[str, int]]:
+    """(module, cumulative microseconds) pairs from -X importtime output
+
+    Module names keep their leading spaces, which mark imports nested in another import.
+    """
+    modules = []
+    for line in import_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules.append((name[1:].rstrip(), int(cumulative)))
+    return modules
+
+def measure(args: List[str], forbidden: Tuple[str, ...], repeat: int,
+            env: Dict[str, str]) -> Dict[str, Any]:
+    timings = [_run(args, env)[0] for _ in range(repeat)]
+    modules = _imported_modules(_run(args, env, import_log=True)[1])
+    names = {name.strip() for name, _ in modules}
+    top_level = sorted(
+        ((name, us) for name, us in modules if not name.startswith(" ")), key=lambda m: m[1], reverse=True
+    )
+    return {
+        "median_ms": round(statistics.median(timings), 1),
+        "min_ms": round(min(timings), 1),
+        "modules": len(names),
+        "forbidden_imports": sorted(
+            name for name in names if any(name == f or name.startswith(f + ".") for f in forbidden)
+        ),
+        "slowest_imports_ms": {name: round(us / 1000, 1) for name, us in top_level[:10]}
+    }
+
+@check.command()
+def run(
+    repeat: int = typer.Option(5, "--repeat", help="Fresh interpreters per probe; the median is reported"),
+    output: Optional[Path] = typer.Option(None, "--output", "-o", help="Write the report as JSON"),
+    scale: float = typer.Option(1.0, "--scale", help="Multiply the budgets, e.g. for slow CI machines")
+):
+    """
+    Check CLI startup time and that heavy provider modules are imported lazily
+    """
+    # --help must work without API keys, so they are removed rather than faked
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("TAVILY_API_KEY", "GOOGLE_API_KEY")}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    probe_env = dict(env, TAVILY_API_KEY="import-check", GOOGLE_API_KEY="import-check")
+
+    bare = statistics.median(_run(["-c", "pass"], env)[0] for _ in range(repeat))
+    report: Dict[str, Any] = {"python": sys.version.split()[0], "interpreter_startup_ms": round(bare, 1),
+                              "probes": {}}
+    failures = []
+    for name, args, forbidden, budget in PROBES:
+        result = measure(args, forbidden, repeat, env if name == "help" else probe_env)
+        result["overhead_ms"] = round(result["median_ms"] - bare, 1)
+        result["budget_ms"] = budget * scale
+        report["probes"][name] = result
+        if result["overhead_ms"] > result["budget_ms"]:
+            failures.append(f"{name}: {result['overhead_ms']}ms above interpreter startup "
+                            f"(budget {result['budget_ms']:.0f}ms)")
+        if result["forbidden_imports"]:
+            failures.append(f"{name}: imports {', '.join(result['forbidden_imports'][:5])}")
+
+    table = Table(title=f"Startup (interpreter alone: {bare:.0f}ms)")
+    for column in ("Probe", "Median (ms)", "Overhead (ms)", "Budget (ms)", "Modules", "Slowest import"):
+        table.add_column(column)
+    for name, result in report["probes"].items():
+        slowest = next(iter(result["slowest_imports_ms"].items()), ("-", 0))
+        table.add_row(name, str(result["median_ms"]), str(result["overhead_ms"]),
+                      f"{result['budget_ms']:.0f}", str(result["modules"]), f"{slowest[0]} ({slowest[1]}ms)")
+    console.print(table)
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        console.print(f"[bold green]Report written to {output}[/bold green]")
+    for failure in failures:
+        console.print(f"[bold red]Regression:[/bold red] {failure}")
+    if failures:
+        raise typer.Exit(code=1)
+
+if __name__ == "__main__":
+    check()
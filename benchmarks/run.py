@@ -0,0 +1,376 @@
+"""Offline benchmark of the research pipeline
+
+Drives ResearchAgent.execute -> SynthesisAgent.process_results and the research-batch
+CLI command against deterministic Tavily and Gemini fakes, then writes throughput,
+latency percentiles, peak RSS and bytes serialized per stage to a JSON file. The mixed
+scenario runs interactive queries one at a time while batch queries saturate the run
+scheduler, to check that interactive latency stays flat:
+
+    python -m benchmarks.run --queries 50 --workers 8
+    python -m benchmarks.run --baseline results/benchmark.json --output results/candidate.json
+"""
+import os
+
+# Settings refuses to load without API keys; the fakes never use them
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import typer
+from typer.testing import CliRunner
+from rich.console import Console
+from rich.table import Table
+import config
+import main
+from main import _percentile
+from agents.research_agent import ResearchAgent
+from agents.synthesis_agent import SynthesisAgent
+from utils.outbound import reset_schedulers
+from utils.run_scheduler import reset_run_scheduler, run_priority
+from benchmarks.fakes import FakeTavilyClient, FakeChatModel, PageServer, fake_providers
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("pipeline", "cli", "mixed")
+# Share of the mixed scenario's queries submitted as interactive
+INTERACTIVE_SHARE = 0.25
+TOPICS = ("solid-state batteries", "urban heat islands", "protein folding", "carbon markets",
+          "quantum error correction", "coral reef recovery", "edge inference", "microgrids")
+# (metric path, direction) pairs checked against a baseline; "higher" means bigger is better
+REGRESSION_METRICS = (
+    (("throughput_qps",), "higher"),
+    (("latency_s", "total", "p50"), "lower"),
+    (("latency_s", "total", "p95"), "lower"),
+    (("latency_s", "interactive", "p95"), "lower"),
+    (("peak_rss_mb",), "lower"),
+    (("bytes_serialized", "research", "mean"), "lower"),
+    (("bytes_serialized", "synthesis", "mean"), "lower"),
+)
+
+bench = typer.Typer()
+console = Console(stderr=True)
+
+def make_queries(count: int) -> List[str]:
+    """Distinct queries, so identical in-flight requests are never coalesced"""
+    return [f"{TOPICS[i % len(TOPICS)]} findings {i}" for i in range(count)]
+
+def peak_rss_mb() -> Optional[float]:
+    """High-water mark of this process's resident set size"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(_percentile(values, 50), 4),
+        "p90": round(_percentile(values, 90), 4),
+        "p95": round(_percentile(values, 95), 4),
+        "p99": round(_percentile(values, 99), 4),
+        "max": round(max(values), 4)
+    }
+
+def serialized_bytes(payload: Dict[str, Any]) -> int:
+    """Size of a payload as the research store serializes it"""
+    return len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+def _timed_run(research_agent, synthesis_agent, query: str, depth: str) -> Dict[str, Any]:
+    """Research and synthesize one query, recording stage latencies and payload sizes"""
+    record: Dict[str, Any] = {"ok": False}
+    start = time.perf_counter()
+    try:
+        research_results = research_agent.execute(query, depth)
+        record["research"] = time.perf_counter() - start
+        record["research_bytes"] = serialized_bytes(research_results)
+        synthesis = synthesis_agent.process_results(research_results, query)
+        record["synthesis"] = time.perf_counter() - start - record["research"]
+        record["synthesis_bytes"] = serialized_bytes(synthesis)
+        record["ok"] = True
+    except Exception as e:
+        record["error"] = str(e)
+    record["total"] = time.perf_counter() - start
+    return record
+
+def _pipeline_report(records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    ok = [r for r in records if r["ok"]]
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "ok": len(ok),
+        "failed": len(records) - len(ok),
+        "throughput_qps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_s": {
+            stage: summarize([r[stage] for r in ok]) for stage in ("research", "synthesis", "total")
+        },
+        "bytes_serialized": {
+            stage: {
+                "total": sum(r[f"{stage}_bytes"] for r in ok),
+                "mean": round(sum(r[f"{stage}_bytes"] for r in ok) / len(ok), 1) if ok else 0
+            }
+            for stage in ("research", "synthesis")
+        },
+        "errors": sorted({r["error"] for r in records if not r["ok"]})[:5]
+    }
+
+def run_pipeline(settings, queries: List[str], depth: str, workers: int) -> Dict[str, Any]:
+    """Run research and synthesis directly on shared agents from a worker pool"""
+    research_agent = ResearchAgent(settings)
+    synthesis_agent = SynthesisAgent(settings)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        records = list(pool.map(lambda query: _timed_run(research_agent, synthesis_agent, query, depth), queries))
+    return _pipeline_report(records, time.perf_counter() - start)
+
+def run_mixed(settings, queries: List[str], depth: str, workers: int) -> Dict[str, Any]:
+    """Run batch queries from a worker pool while a single user runs interactive queries in turn
+
+    Batch workers outnumber the run slots, so interactive queries only stay fast if the
+    run scheduler admits them ahead of the queued batch runs.
+    """
+    research_agent = ResearchAgent(settings)
+    synthesis_agent = SynthesisAgent(settings)
+    split = max(1, int(len(queries) * INTERACTIVE_SHARE))
+    interactive, batch = queries[:split], queries[split:]
+
+    def run_batch_query(query: str) -> Dict[str, Any]:
+        with run_priority("batch"):
+            return dict(_timed_run(research_agent, synthesis_agent, query, depth), priority="batch")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(run_batch_query, query) for query in batch]
+        records = [dict(_timed_run(research_agent, synthesis_agent, query, depth), priority="interactive")
+                   for query in interactive]
+        records.extend(future.result() for future in futures)
+    report = _pipeline_report(records, time.perf_counter() - start)
+    for priority in ("interactive", "batch"):
+        report["latency_s"][priority] = summarize(
+            [r["total"] for r in records if r["ok"] and r["priority"] == priority]
+        )
+    report["scheduler"] = research_agent.run_scheduler.stats()
+    return report
+
+def run_cli(settings, queries: List[str], depth: str, workers: int) -> Dict[str, Any]:
+    """Run the research-batch command end to end, including its JSONL output"""
+    work_dir = Path(settings.base_dir)
+    input_file = work_dir / "queries.txt"
+    output_file = work_dir / "batch.jsonl"
+    input_file.write_text("\n".join(queries) + "\n", encoding="utf-8")
+
+    original_settings = config.settings
+    config.settings = settings
+    try:
+        start = time.perf_counter()
+        result = CliRunner().invoke(main.app, [
+            "research-batch", str(input_file), "--output", str(output_file),
+            "--depth", depth, "--workers", str(workers)
+        ])
+        elapsed = time.perf_counter() - start
+    finally:
+        config.settings = original_settings
+
+    records = []
+    if output_file.exists():
+        with output_file.open(encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    ok = [r for r in records if r.get("status") == "ok"]
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "exit_code": result.exit_code,
+        "ok": len(ok),
+        "failed": len(queries) - len(ok),
+        "throughput_qps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_s": {"total": summarize([r["latency"] for r in ok])},
+        "bytes_serialized": {
+            "output": {
+                "total": output_file.stat().st_size if output_file.exists() else 0,
+                "mean": round(output_file.stat().st_size / len(records), 1) if records else 0
+            }
+        },
+        "errors": sorted({r["error"] for r in records if r.get("status") != "ok"})[:5]
+    }
+
+def run_scenario(name: str, queries: List[str], depth: str, workers: int, use_cache: bool,
+                 tavily_options: Dict[str, Any], llm_options: Dict[str, Any],
+                 page_options: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one scenario with fresh fakes, schedulers, store and caches"""
+    pages = PageServer(**page_options)
+    llm = FakeChatModel(**llm_options)
+    reset_schedulers()
+    reset_run_scheduler()
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as work_dir, pages:
+        # Sources of tiers that fetch full pages are served by the local fixture
+        tavily = FakeTavilyClient(**tavily_options, base_url=pages.base_url)
+        with fake_providers(tavily, llm):
+            report = _run_with_fakes(name, Path(work_dir), queries, depth, workers, use_cache)
+    report.update(
+        scenario=name,
+        queries=len(queries),
+        peak_rss_mb=peak_rss_mb(),
+        provider_calls={
+            "tavily": tavily.calls, "tavily_errors": tavily.errors,
+            "llm": llm.calls, "llm_errors": llm.errors,
+            "pages": pages.requests, "pages_not_modified": pages.not_modified
+        }
+    )
+    return report
+
+def _run_with_fakes(name: str, work_dir: Path, queries: List[str], depth: str, workers: int,
+                    use_cache: bool) -> Dict[str, Any]:
+    settings = config.Settings(
+        base_dir=work_dir,
+        search_cache_enabled=use_cache,
+        llm_cache_enabled=use_cache,
+        fetch_cache_enabled=use_cache,
+        # All fixture pages share one host, on the loopback interface
+        fetch_per_host=1000,
+        fetch_allow_private=True,
+        # Measure the pipeline, not the provider rate limits configured for production
+        tavily_rate_limit=1000.0,
+        tavily_burst=1000,
+        gemini_rate_limit=1000.0,
+        gemini_burst=1000,
+        llm_rate_limit=1000.0,
+        llm_burst=1000,
+        retry_backoff_base=0.01,
+        # Every worker gets a run slot; the mixed scenario queues batch workers behind a
+        # reserved interactive slot instead
+        run_slots=workers if name != "mixed" else max(2, workers // 2),
+        interactive_reserved_slots=0 if name != "mixed" else 1
+    )
+    runner = {"pipeline": run_pipeline, "cli": run_cli, "mixed": run_mixed}[name]
+    return runner(settings, queries, depth, workers)
+
+def _lookup(report: Dict[str, Any], path) -> Optional[float]:
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report if isinstance(report, (int, float)) else None
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """List metrics that got worse than baseline by more than tolerance (a fraction)"""
+    regressions = []
+    for name, scenario in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for path, direction in REGRESSION_METRICS:
+            new, old = _lookup(scenario, path), _lookup(previous, path)
+            if new is None or not old:
+                continue
+            change = (new - old) / old
+            if (direction == "higher" and change < -tolerance) or (direction == "lower" and change > tolerance):
+                regressions.append(f"{name} {'.'.join(path)}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+def print_report(report: Dict[str, Any]) -> None:
+    table = Table(title="Benchmark")
+    for column in ("Scenario", "OK", "Failed", "Queries/s", "p50 (s)", "p95 (s)", "p99 (s)", "Peak RSS (MB)"):
+        table.add_column(column, justify="left" if column == "Scenario" else "right")
+    for name, scenario in report["scenarios"].items():
+        total = scenario["latency_s"].get("total", {})
+        table.add_row(
+            name, str(scenario["ok"]), str(scenario["failed"]), f"{scenario['throughput_qps']:.2f}",
+            f"{total.get('p50', 0):.3f}", f"{total.get('p95', 0):.3f}", f"{total.get('p99', 0):.3f}",
+            str(scenario["peak_rss_mb"])
+        )
+    console.print(table)
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+@bench.command()
+def run(
+    queries: int = typer.Option(40, "--queries", help="Number of distinct queries per scenario"),
+    workers: int = typer.Option(8, "--workers", help="Queries processed in parallel"),
+    depth: str = typer.Option("basic", "--depth", help="Research tier (shallow/medium/deep or basic/advanced)"),
+    scenario: List[str] = typer.Option(list(SCENARIOS), "--scenario", help="Scenarios to run: pipeline, cli, mixed"),
+    tavily_latency: float = typer.Option(0.2, "--tavily-latency", help="Seconds per fake search"),
+    tavily_jitter: float = typer.Option(0.05, "--tavily-jitter", help="Uniform +/- jitter on search latency"),
+    tavily_results: int = typer.Option(10, "--tavily-results", help="Results per fake search"),
+    content_chars: int = typer.Option(800, "--content-chars", help="Characters of content per result"),
+    tavily_error_rate: float = typer.Option(0.0, "--tavily-error-rate", help="Fraction of searches that fail"),
+    llm_latency: float = typer.Option(1.0, "--llm-latency", help="Seconds per fake LLM call"),
+    output_chars: int = typer.Option(3000, "--output-chars", help="Characters per fake LLM reply"),
+    llm_error_rate: float = typer.Option(0.0, "--llm-error-rate", help="Fraction of LLM calls that fail"),
+    page_latency: float = typer.Option(0.05, "--page-latency", help="Seconds per fixture page request"),
+    page_chars: int = typer.Option(20000, "--page-chars", help="Characters of article text per fixture page"),
+    seed: int = typer.Option(0, "--seed", help="Seed for fake payloads and errors"),
+    use_cache: bool = typer.Option(False, "--use-cache", help="Keep the search and LLM caches enabled"),
+    output: Path = typer.Option(Path("results/benchmark.json"), "--output", "-o", help="JSON report file"),
+    baseline: Optional[Path] = typer.Option(None, "--baseline", help="Earlier report to compare against"),
+    tolerance: float = typer.Option(0.2, "--tolerance", help="Allowed relative regression vs baseline")
+):
+    """
+    Benchmark the pipeline against deterministic provider fakes
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    unknown = set(scenario) - set(SCENARIOS)
+    if unknown:
+        raise typer.BadParameter(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    tavily_options = {
+        "latency": tavily_latency, "jitter": tavily_jitter, "results": tavily_results,
+        "content_chars": content_chars, "error_rate": tavily_error_rate, "seed": seed
+    }
+    llm_options = {
+        "latency": llm_latency, "output_chars": output_chars, "error_rate": llm_error_rate, "seed": seed
+    }
+    page_options = {"latency": page_latency, "page_chars": page_chars, "seed": seed}
+    report = {
+        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "queries": queries, "workers": workers, "depth": depth, "use_cache": use_cache,
+            "tavily": tavily_options, "llm": llm_options, "pages": page_options
+        },
+        "scenarios": {}
+    }
+    query_list = make_queries(queries)
+    # Scenarios run in a fixed order because peak RSS is a process-wide high-water mark
+    for name in (s for s in SCENARIOS if s in scenario):
+        console.print(f"[bold blue]Running {name}...[/bold blue]")
+        report["scenarios"][name] = run_scenario(
+            name, query_list, depth, workers, use_cache, tavily_options, llm_options, page_options
+        )
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print_report(report)
+    console.print(f"[bold green]Report written to {output}[/bold green]")
+
+    if baseline:
+        regressions = compare(report, json.loads(baseline.read_text(encoding="utf-8")), tolerance)
+        for regression in regressions:
+            console.print(f"[bold red]Regression:[/bold red] {regression}")
+        if regressions:
+            raise typer.Exit(code=1)
+        console.print(f"[bold green]No regressions beyond {tolerance:.0%} of {baseline}[/bold green]")
+
+if __name__ == "__main__":
+    bench()
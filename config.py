@@ -24,6 +24,26 @@ class SearchDepth(str, Enum):
             return cls.ADVANCED
         return cls.BASIC  # default to basic
 
+class ResearchTier(str, Enum):
+    """How much iterative research to do; each tier has a profile in Settings"""
+    SHALLOW = "shallow"
+    MEDIUM = "medium"
+    DEEP = "deep"
+
+    @classmethod
+    def from_user_input(cls, value: str) -> "ResearchTier":
+        """Accept a tier name or a Tavily depth (basic is shallow, advanced is deep)"""
+        value = str(getattr(value, "value", value)).lower()
+        aliases = {"basic": cls.SHALLOW, "advanced": cls.DEEP}
+        if value in aliases:
+            return aliases[value]
+        return cls(value)
+
+    @property
+    def search_depth(self) -> SearchDepth:
+        """Tavily search depth used by this tier"""
+        return SearchDepth.from_user_input(self.value)
+
 class Settings(BaseSettings):
     # System Information
     current_timestamp: datetime = Field(
@@ -46,10 +66,119 @@ class Settings(BaseSettings):
     search_depth: SearchDepth = SearchDepth.BASIC
     max_retries: int = 3
     request_timeout: int = 30
+    deep_sub_queries: int = 5
+    search_concurrency: int = 5
+    http_pool_size: int = 20  # keep-alive connections per pooled HTTP session
+    job_workers: int = 4  # research jobs run concurrently by the Streamlit app and API
+    
+    # Iterative Research Configuration: search rounds, follow-up queries per round and the
+    # time (seconds) and token budgets of each depth tier
+    shallow_rounds: int = 1
+    shallow_fan_out: int = 2
+    shallow_time_budget: int = 60
+    shallow_token_budget: int = 20000
+    medium_rounds: int = 2
+    medium_fan_out: int = 3
+    medium_time_budget: int = 120
+    medium_token_budget: int = 60000
+    deep_rounds: int = 3
+    deep_fan_out: int = 4
+    deep_time_budget: int = 240
+    deep_token_budget: int = 150000
+    research_state_ttl: int = 24 * 60 * 60  # reuse earlier rounds for the same query this long
+    
+    # Page Fetching Configuration: download the top sources in full for these tiers
+    fetch_pages_tiers: str = "deep"  # comma-separated; empty to only use search snippets
+    fetch_top_k: int = 5
+    fetch_concurrency: int = 8
+    fetch_per_host: int = 2
+    fetch_timeout: float = 10.0  # seconds per page, including streaming the body
+    fetch_max_bytes: int = 2 * 1024 * 1024
+    fetch_chunk_tokens: int = 350  # about synthesis_source_chars, so chunks aren't truncated
+    fetch_max_chunks: int = 8  # per page
+    fetch_cache_enabled: bool = True
+    fetch_cache_ttl: int = 24 * 60 * 60  # then revalidated with ETag / Last-Modified
+    fetch_cache_max_mb: int = 200
+    fetch_allow_private: bool = False  # allow loopback, private and link-local addresses
+    fetch_respect_robots: bool = True
+    
+    # Tracing Configuration
+    tracing_enabled: bool = True
+    tracing_exporters: str = "prometheus"  # comma-separated: json, prometheus, otlp
     
-    # Agent Configuration
-    research_agent_model: str = "gemini-1.5-flash"
-    synthesis_agent_model: str = "gemini-1.5-flash"
+    # HTTP API Configuration
+    api_host: str = "127.0.0.1"
+    api_port: int = 8000
+    api_max_concurrency: int = 8  # synchronous requests in flight before answering 429
+    api_max_queued_jobs: int = 32  # queued or running jobs before answering 429
+    dedup_enabled: bool = True
+    rerank_enabled: bool = True  # keep the max_results_per_query most relevant sources
+    dedup_similarity: float = 0.8  # estimated Jaccard similarity treated as a near-duplicate
+    
+    # Run Scheduling: research and synthesis runs share run_slots; interactive runs go
+    # first and reserved slots stay free for them, users share slots by weight. Slots
+    # are per process: every API worker or app process has run_slots of its own
+    run_slots: int = 4
+    interactive_reserved_slots: int = 1
+    interactive_max_queue: int = 32  # waiting runs before new ones are turned away
+    batch_max_queue: int = 1000
+    interactive_max_wait: float = 120.0  # seconds; 0 waits indefinitely
+    batch_max_wait: float = 0.0
+    user_weights: str = ""  # fair share weights, e.g. "alice=2,bob=1"; others weigh 1
+    
+    # Outbound Call Scheduling
+    tavily_rate_limit: float = 5.0  # requests per second
+    tavily_burst: int = 10
+    gemini_rate_limit: float = 2.0
+    gemini_burst: int = 5
+    llm_rate_limit: float = 2.0  # other LLM backends (openai, fake), each limited separately
+    llm_burst: int = 5
+    max_in_flight: int = 16  # concurrent calls per provider, counting timed-out ones still running
+    retry_backoff_base: float = 0.5
+    retry_backoff_max: float = 20.0
+    circuit_failure_threshold: int = 5
+    circuit_reset_timeout: int = 30
+    
+    # Agent Configuration: models are "model" on llm_backend or "backend:model"
+    llm_backend: str = "gemini"  # gemini, openai (any OpenAI-compatible endpoint) or fake
+    llm_base_url: str = ""  # openai backend endpoint, e.g. http://localhost:8001/v1
+    llm_api_key: SecretStr = SecretStr("")  # openai backend key; local servers may not need one
+    research_agent_model: str = "gemini-1.5-flash"  # sub-query planning and follow-up queries
+    map_model: str = "gemini-1.5-flash"  # map summaries of map-reduce synthesis
+    synthesis_agent_model: str = "gemini-1.5-flash"  # final synthesis
+    
+    # Synthesis Configuration
+    map_reduce_threshold_tokens: int = 12000  # switch to map-reduce above this payload size
+    synthesis_chunk_tokens: int = 4000
+    map_reduce_concurrency: int = 4
+    synthesis_source_chars: int = 1500  # per-source content budget in the synthesis prompt
+    synthesis_temperature: float = 0.7  # part of the LLM cache key; 0 makes repeat syntheses deterministic
+    
+    # Budget Configuration: prices for cost estimates and limits per run and per user per
+    # day (0 disables a limit); over budget, runs degrade to a cheaper tier or compact
+    # synthesis, or are rejected. Once the daily budget is spent no synthesis calls the
+    # LLM: an update returns the previous run's synthesis, anything else is rejected
+    llm_input_cost_per_million: float = 0.075  # USD per million input tokens
+    llm_output_cost_per_million: float = 0.30
+    tavily_cost_per_credit: float = 0.008  # basic searches take 1 credit, advanced 2
+    run_token_budget: int = 0  # LLM tokens of one synthesis
+    run_search_budget: int = 0  # Tavily credits of one research run
+    daily_token_budget: int = 0
+    daily_cost_budget: float = 0.0  # USD
+    budget_action: str = "degrade"  # degrade or reject
+    
+    # Search Cache Configuration
+    search_cache_enabled: bool = True
+    search_cache_refresh: bool = False
+    search_cache_ttl_basic: int = 6 * 60 * 60
+    search_cache_ttl_advanced: int = 24 * 60 * 60
+    search_cache_max_mb: int = 100
+    
+    # LLM Response Cache Configuration
+    llm_cache_enabled: bool = True
+    llm_cache_sampled_outputs: bool = True  # set False to skip caching when synthesis_temperature > 0
+    llm_cache_ttl: int = 7 * 24 * 60 * 60
+    llm_cache_max_entries: int = 5000
     
     # Base Directories
     base_dir: Path = Field(default_factory=lambda: Path(__file__).parent)
@@ -67,6 +196,16 @@ class Settings(BaseSettings):
         results_path.mkdir(parents=True, exist_ok=True)
         return results_path
     
+    def tier_profile(self, tier: ResearchTier) -> Dict[str, Any]:
+        """Rounds, fan-out and budgets for a depth tier"""
+        return {
+            "search_depth": tier.search_depth.value,
+            "rounds": getattr(self, f"{tier.value}_rounds"),
+            "fan_out": getattr(self, f"{tier.value}_fan_out"),
+            "time_budget": getattr(self, f"{tier.value}_time_budget"),
+            "token_budget": getattr(self, f"{tier.value}_token_budget")
+        }
+    
     @validator('tavily_api_key', 'google_api_key')
     def validate_api_keys(cls, v):
         """Validate that API keys are non-empty strings"""
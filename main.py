@@ -4,11 +4,17 @@ from rich import print
 from rich.console import Console
 from rich.logging import RichHandler
 from pathlib import Path
-from typing import Optional
-from config import settings, SearchDepth
-from agents.research_agent import ResearchAgent
-from agents.synthesis_agent import SynthesisAgent
+from typing import Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import sys
+import time
 import logging
+from utils.lazy_imports import preload
+
+# Settings, agents and provider clients are imported inside the commands that use them,
+# so --help and argument errors don't pay for pydantic, LangChain, Gemini and Tavily imports.
+# benchmarks/import_time.py checks that it stays that way.
 
 # Set up logging
 logging.basicConfig(
@@ -18,15 +24,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = typer.Typer()
+# Plain help output: Typer's rich help formatter imports Markdown and syntax highlighting,
+# about as much as the rest of the CLI's startup
+app = typer.Typer(rich_markup_mode=None)
 console = Console()
 
-def validate_depth(value: str) -> SearchDepth:
-    """Validate and convert depth parameter"""
+# Imported in the background while research runs, so synthesis doesn't wait on them
+SYNTHESIS_MODULES = ("agents.synthesis_agent", "langchain_google_genai", "utils.dedup", "utils.reranker")
+
+def get_settings():
+    """Load application settings on first use"""
+    from config import settings
+    return settings
+
+def validate_depth(value: str):
+    """Validate and convert depth parameter to a research tier"""
+    from config import ResearchTier
     try:
-        if value.lower() in ['basic', 'advanced']:
-            return SearchDepth(value.lower())
-        return SearchDepth.from_user_input(value)
+        return ResearchTier.from_user_input(value)
     except ValueError:
         valid_values = ["basic", "advanced", "shallow", "medium", "deep"]
         raise typer.BadParameter(
@@ -39,7 +54,7 @@ def research(
     depth: str = typer.Option(
         "basic",
         "--depth",
-        help="Search depth (basic/advanced or shallow/medium/deep)",
+        help="Research tier (shallow/medium/deep; basic/advanced are aliases for shallow/deep)",
         callback=validate_depth
     ),
     output_file: Optional[Path] = typer.Option(
@@ -50,53 +65,536 @@ def research(
         False,
         "--debug",
         help="Enable debug logging"
+    ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Bypass the search and LLM response caches for this run"
+    ),
+    refresh_cache: bool = typer.Option(
+        False,
+        "--refresh-cache",
+        help="Ignore cached search results and store fresh ones"
+    ),
+    sub_queries: int = typer.Option(
+        0,
+        "--sub-queries",
+        help="Split the query into N sub-queries searched concurrently (0 for a single search)"
+    ),
+    timings: bool = typer.Option(
+        False,
+        "--timings",
+        help="Print the duration and payload size of each pipeline stage"
+    ),
+    from_stored: Optional[Path] = typer.Option(
+        None,
+        "--from-stored",
+        exists=True,
+        dir_okay=False,
+        help="Skip searching and synthesize the research results in this JSON file"
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Update the last synthesis of this query with only the sources that changed since"
     )
 ):
     """
     Execute deep research using the multi-agent system
     """
+    from agents.research_agent import ResearchAgent
+    
+    research_results = None
     try:
         if debug:
             logging.getLogger().setLevel(logging.DEBUG)
+        
+        settings = get_settings()
+        run_settings = settings.model_copy(update={
+            "search_cache_enabled": settings.search_cache_enabled and not no_cache,
+            "llm_cache_enabled": settings.llm_cache_enabled and not no_cache,
+            "search_cache_refresh": settings.search_cache_refresh or refresh_cache
+        })
             
         console.print(f"[bold blue]Starting research for query:[/bold blue] {query}")
-        console.print(f"[bold blue]Search depth:[/bold blue] {depth.value}")
         
-        # Log the API key status (without revealing the key)
-        tavily_key = settings.tavily_api_key.get_secret_value()
-        logger.debug(f"Tavily API key present: {bool(tavily_key)}")
-        
-        # Create research agent
-        research_agent = ResearchAgent(settings)
-        
-        # Execute research
-        with console.status("[bold green]Researching...") as status:
-            research_results = research_agent.execute(query, depth.value)
+        if from_stored:
+            preload(*SYNTHESIS_MODULES)
+            research_results = _load_stored_research(from_stored, run_settings)
+            console.print(f"[bold blue]Using stored research:[/bold blue] {from_stored} "
+                          f"(run {research_results['run_id']})")
+        else:
+            console.print(f"[bold blue]Research tier:[/bold blue] {depth.value}")
             
-            if not research_results:
-                raise Exception("No results returned from research agent")
+            # Log the API key status (without revealing the key)
+            tavily_key = settings.tavily_api_key.get_secret_value()
+            logger.debug(f"Tavily API key present: {bool(tavily_key)}")
             
-            if "error" in research_results:
-                raise Exception(f"Research failed: {research_results['error']}")
+            # Create research agent
+            research_agent = ResearchAgent(run_settings)
+            # Create the Tavily client now, then load synthesis dependencies while the search is in flight
+            research_agent.tavily_client
+            preload(*SYNTHESIS_MODULES)
             
-            status.update("[bold green]Processing results...")
+            # Execute research
+            with console.status("[bold green]Researching..."):
+                if sub_queries > 0:
+                    import asyncio
+                    research_results = asyncio.run(
+                        research_agent.aexecute(query, depth.value, sub_queries)
+                    )
+                elif incremental:
+                    research_results = research_agent.execute_incremental(query, depth.value)
+                else:
+                    research_results = research_agent.execute(query, depth.value)
+                
+                if not research_results:
+                    raise Exception("No results returned from research agent")
+                
+                if "error" in research_results:
+                    raise Exception(f"Research failed: {research_results['error']}")
             
-            # Create synthesis agent and process results
-            synthesis_agent = SynthesisAgent(settings)
-            final_results = synthesis_agent.process_results(research_results, query)
+            if research_agent.search_cache:
+                logger.debug(f"Search cache stats: {research_agent.search_cache.stats()}")
+            if "changes" in research_results:
+                _print_changes(research_results["changes"])
         
-        # Save or display results
-        if output_file:
-            output_file.write_text(str(final_results))
-            console.print(f"[bold green]Results saved to:[/bold green] {output_file}")
-        else:
-            console.print("\n[bold green]Research Results:[/bold green]")
-            console.print(final_results)
+        _synthesize(research_results, query, run_settings, output_file, timings)
             
     except Exception as e:
         logger.exception("Error during research")
         console.print(f"[bold red]Error:[/bold red] {str(e)}")
+        if research_results and research_results.get("run_id"):
+            # The research stage is already stored; only synthesis needs to run again
+            console.print(f"[bold yellow]Research was saved. Retry synthesis with:[/bold yellow] "
+                          f"python main.py resume {research_results['run_id']}")
         raise typer.Exit(code=1)
 
+def _print_changes(changes: Dict[str, Any]) -> None:
+    """Summarize the source changes since the previous run of a query"""
+    console.print(
+        f"[bold blue]Changes since run {changes['previous_run_id']}:[/bold blue] "
+        f"{len(changes['new'])} new, {len(changes['changed'])} changed, "
+        f"{len(changes['removed'])} removed, {changes['unchanged']} unchanged sources"
+    )
+    if not changes["new"] and not changes["changed"]:
+        console.print("[bold green]No new or changed sources; keeping the previous synthesis[/bold green]")
+
+def _load_stored_research(path: Path, settings) -> Dict[str, Any]:
+    """Load research results from a JSON file and store them as a run if they aren't yet
+
+    Accepts research payloads as stored by the research stage, exported runs
+    (with the payload under "research") and research_*.json files of earlier versions.
+    """
+    from utils.storage import get_store, new_run_id
+    with path.open(encoding="utf-8") as f:
+        research = json.load(f)
+    if isinstance(research.get("research"), dict) and "results" not in research:
+        research = research["research"]
+    if not isinstance(research.get("results"), dict):
+        raise ValueError(f"{path} does not contain research results")
+    research.setdefault("run_id", new_run_id())
+    research.setdefault("timestamp", datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
+    store = get_store(settings)
+    run = store.get_run(research["run_id"])
+    if not run or not run["research"]:
+        store.save_research(research)
+    return research
+
+def _synthesize(research_results: Dict[str, Any], query: str, settings,
+                output_file: Optional[Path], timings: bool) -> Dict[str, Any]:
+    """Run the synthesis stage for stored research and save or stream the result"""
+    from rich.live import Live
+    from rich.markdown import Markdown
+    from agents.synthesis_agent import SynthesisAgent
+    
+    with console.status("[bold green]Processing results..."):
+        synthesis_agent = SynthesisAgent(settings)
+        if output_file:
+            final_results = synthesis_agent.process_results(research_results, query)
+        else:
+            # A stream does its work, map phase included, as it is iterated, so the status
+            # stays up until the first chunk arrives
+            stream = synthesis_agent.stream_results(research_results, query)
+            chunks = iter(stream)
+            text = next(chunks, "")
+    
+    # Save or display results
+    if output_file:
+        output_file.write_text(str(final_results))
+        console.print(f"[bold green]Results saved to:[/bold green] {output_file}")
+    else:
+        console.print("\n[bold green]Research Results:[/bold green]")
+        with Live(Markdown(text), console=console, refresh_per_second=10) as live:
+            for chunk in chunks:
+                text += chunk
+                live.update(Markdown(text))
+        final_results = stream.result
+        console.print(f"\n[bold blue]Run ID:[/bold blue] {final_results['run_id']}")
+    
+    _print_usage(research_results.get("usage"), final_results["metadata"].get("usage"))
+    if timings:
+        _print_timings(research_results.get("timings", []), final_results["metadata"].get("timings", []))
+    return final_results
+
+def _print_usage(*stages: Optional[Dict[str, Any]]) -> None:
+    """Print the combined tokens, searches and cost of a run's stages, and any budget degradation"""
+    stages = [stage for stage in stages if stage]
+    if not stages:
+        return
+    console.print(
+        f"[bold blue]Usage:[/bold blue] {sum(s['input_tokens'] + s['output_tokens'] for s in stages)} LLM tokens, "
+        f"{sum(sum(s['searches'].values()) for s in stages)} searches, "
+        f"~${sum(s['cost_usd'] for s in stages):.4f}"
+    )
+    for note in (note for s in stages for note in s.get("degraded", [])):
+        console.print(f"[bold yellow]Over budget:[/bold yellow] {note}")
+
+def _print_timings(research_timings: List[Dict[str, Any]], synthesis_timings: List[Dict[str, Any]]) -> None:
+    """Print recorded pipeline stage spans as a table"""
+    from rich.table import Table
+    table = Table(title="Stage Timings")
+    table.add_column("Phase")
+    table.add_column("Stage")
+    table.add_column("ms", justify="right")
+    table.add_column("Details")
+    for phase, spans in (("research", research_timings), ("synthesis", synthesis_timings)):
+        for span in spans:
+            details = ", ".join(
+                f"{key}={value}" for key, value in span.items() if key not in ("name", "duration_ms", "status")
+            )
+            table.add_row(phase, span["name"], f"{span['duration_ms']:.1f}", details)
+    console.print(table)
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Return the pct-th percentile of values using linear interpolation"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+def _read_batch_queries(input_file: str, default_depth: str) -> List[Dict[str, str]]:
+    """Read queries as plain lines or JSON objects with query/depth keys"""
+    handle = sys.stdin if input_file == "-" else open(input_file, encoding="utf-8")
+    try:
+        queries = []
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                depth = validate_depth(item.get("depth", default_depth)).value
+                queries.append({"query": item["query"], "depth": depth})
+            else:
+                queries.append({"query": line, "depth": default_depth})
+        return queries
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def _batch_key(query: str, depth: str) -> tuple:
+    """Identify a batch query by its research tier, so basic matches shallow and advanced deep"""
+    from config import ResearchTier
+    try:
+        depth = ResearchTier.from_user_input(depth).value
+    except ValueError:
+        pass
+    return query, depth
+
+def _completed_batch_queries(output_file: Optional[Path]) -> set:
+    """Collect (query, tier) pairs that already succeeded in an existing output file"""
+    completed = set()
+    if not output_file or not output_file.exists():
+        return completed
+    with output_file.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written line from an interrupted run
+            if record.get("status") == "ok":
+                completed.add(_batch_key(record["query"], record["depth"]))
+    return completed
+
+@app.command("research-batch")
+def research_batch(
+    input_file: str = typer.Argument(..., help="File with one query per line (plain text or JSON), or - for stdin"),
+    output_file: Optional[Path] = typer.Option(
+        None,
+        "--output",
+        "-o",
+        help="JSONL output file; existing successful queries are skipped (default: stdout)"
+    ),
+    depth: str = typer.Option(
+        "basic",
+        "--depth",
+        help="Default search depth for queries that don't specify one",
+        callback=validate_depth
+    ),
+    workers: int = typer.Option(
+        4,
+        "--workers",
+        help="Number of queries processed in parallel"
+    ),
+    debug: bool = typer.Option(
+        False,
+        "--debug",
+        help="Enable debug logging"
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Update each query's last synthesis with only the sources that changed since"
+    ),
+    priority: str = typer.Option(
+        "batch",
+        "--priority",
+        help="Run scheduler class; batch leaves INTERACTIVE_RESERVED_SLOTS free for interactive runs"
+    )
+):
+    """
+    Execute research for many queries, reusing agents across a worker pool
+    """
+    logging.getLogger().setLevel(logging.DEBUG if debug else logging.WARNING)
+    status_console = Console(stderr=True)
+    if priority not in ("interactive", "batch"):
+        raise typer.BadParameter("Priority must be interactive or batch", param_hint="--priority")
+    
+    try:
+        queries = _read_batch_queries(input_file, depth.value)
+    except Exception as e:
+        status_console.print(f"[bold red]Error reading queries:[/bold red] {str(e)}")
+        raise typer.Exit(code=1)
+    
+    completed = _completed_batch_queries(output_file)
+    pending = [q for q in queries if _batch_key(q["query"], q["depth"]) not in completed]
+    skipped = len(queries) - len(pending)
+    status_console.print(
+        f"[bold blue]Batch:[/bold blue] {len(pending)} queries to run, {skipped} already completed"
+    )
+    
+    # Agents and their provider clients are built once and shared by all workers
+    from agents.research_agent import ResearchAgent
+    from agents.synthesis_agent import SynthesisAgent
+    from utils.run_scheduler import run_priority
+    settings = get_settings()
+    research_agent = ResearchAgent(settings)
+    synthesis_agent = SynthesisAgent(settings)
+    
+    def run_one(item: Dict[str, str]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        record: Dict[str, Any] = {"query": item["query"], "depth": item["depth"]}
+        try:
+            with run_priority(priority):
+                if incremental:
+                    research_results = research_agent.execute_incremental(item["query"], item["depth"])
+                else:
+                    research_results = research_agent.execute(item["query"], item["depth"])
+                synthesis = synthesis_agent.process_results(research_results, item["query"])
+            record.update(
+                status="ok",
+                run_id=synthesis["run_id"],
+                synthesis=synthesis["synthesis"],
+                timestamp=synthesis["timestamp"]
+            )
+            if "changes" in research_results:
+                record["changes"] = research_results["changes"]
+        except Exception as e:
+            record.update(status="error", error=str(e))
+        record["latency"] = round(time.perf_counter() - start, 3)
+        return record
+    
+    out = output_file.open("a", encoding="utf-8") if output_file else sys.stdout
+    latencies = []
+    failures = 0
+    batch_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(run_one, item) for item in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                latencies.append(record["latency"])
+                if record["status"] != "ok":
+                    failures += 1
+                    status_console.print(f"[bold red]Failed:[/bold red] {record['query']}: {record['error']}")
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    
+    elapsed = time.perf_counter() - batch_start
+    status_console.print(
+        f"[bold green]Batch complete:[/bold green] {len(latencies) - failures} ok, {failures} failed, "
+        f"{skipped} skipped in {elapsed:.2f}s "
+        f"({len(latencies) / elapsed if elapsed else 0:.2f} queries/s, "
+        f"p50 {_percentile(latencies, 50):.2f}s, p95 {_percentile(latencies, 95):.2f}s)"
+    )
+    status_console.print(
+        f"[bold blue]Coalesced calls:[/bold blue] research {research_agent.inflight.stats()['coalesced']}, "
+        f"synthesis {synthesis_agent.inflight.stats()['coalesced']}"
+    )
+    queue = research_agent.run_scheduler.stats()[priority]
+    status_console.print(
+        f"[bold blue]Run slot wait ({priority}):[/bold blue] p50 {queue['wait_p50']:.2f}s, p95 {queue['wait_p95']:.2f}s"
+    )
+    if failures:
+        raise typer.Exit(code=1)
+
+@app.command()
+def cache(
+    clear: bool = typer.Option(
+        False,
+        "--clear",
+        help="Remove all cached search results, LLM responses and fetched pages"
+    )
+):
+    """
+    Show or clear the search, LLM response and fetched page caches
+    """
+    from utils.search_cache import SearchCache
+    from utils.llm_cache import LLMCache
+    from utils.page_fetcher import PageCache
+    settings = get_settings()
+    search_cache = SearchCache.from_settings(settings)
+    llm_cache = LLMCache.from_settings(settings)
+    page_cache = PageCache.from_settings(settings)
+    if clear:
+        search_cache.clear()
+        llm_cache.clear()
+        page_cache.clear()
+        console.print("[bold green]Caches cleared[/bold green]")
+    else:
+        console.print({"search": search_cache.stats(), "llm": llm_cache.stats(), "pages": page_cache.stats()})
+
+@app.command()
+def history(
+    query: Optional[str] = typer.Option(None, "--query", help="Only runs whose query contains this text"),
+    since: Optional[str] = typer.Option(None, "--since", help="Only runs on or after this date (YYYY-MM-DD)"),
+    until: Optional[str] = typer.Option(None, "--until", help="Only runs on or before this date (YYYY-MM-DD)"),
+    search: Optional[str] = typer.Option(None, "--search", help="Full-text search over queries and syntheses"),
+    limit: int = typer.Option(20, "--limit", help="Maximum number of runs to list")
+):
+    """
+    List stored research runs
+    """
+    from utils.storage import get_store
+    runs = get_store(get_settings()).find_runs(query=query, since=since, until=until, text=search, limit=limit)
+    from rich.table import Table
+    table = Table(title="Research Runs")
+    table.add_column("Run ID", no_wrap=True)
+    table.add_column("Created (UTC)")
+    table.add_column("Depth")
+    table.add_column("Synthesized")
+    table.add_column("Query")
+    for run in runs:
+        table.add_row(run["run_id"], run["created_at"], run["depth"] or "-",
+                      "yes" if run["synthesized_at"] else "no", run["query"])
+    console.print(table)
+
+@app.command()
+def show(
+    run_id: str = typer.Argument(..., help="Run ID as listed by the history command")
+):
+    """
+    Show the research and synthesis stored for a run
+    """
+    from utils.storage import get_store
+    run = get_store(get_settings()).get_run(run_id)
+    if not run:
+        console.print(f"[bold red]Error:[/bold red] No run found with ID {run_id}")
+        raise typer.Exit(code=1)
+    console.print(run)
+
+@app.command()
+def usage(
+    user: Optional[str] = typer.Option(None, "--user", help="Only this user's usage"),
+    since: Optional[str] = typer.Option(None, "--since", help="Only usage on or after this date (YYYY-MM-DD)")
+):
+    """
+    Show LLM tokens, Tavily searches and estimated cost per user and day
+    """
+    from utils.storage import get_store
+    settings = get_settings()
+    days = get_store(settings).usage_by_day(user=user, since=since)
+    from rich.table import Table
+    table = Table(title="Usage")
+    for column in ("Day (UTC)", "User", "Runs", "LLM calls", "Input tokens", "Output tokens", "Searches",
+                   "Credits", "Cost (USD)"):
+        table.add_column(column)
+    for day in days:
+        table.add_row(day["day"], day["user"] or "-", str(day["runs"]), str(day["llm_calls"]),
+                      str(day["input_tokens"]), str(day["output_tokens"]), str(day["searches"]),
+                      str(day["search_credits"]), f"{day['cost_usd']:.4f}")
+    console.print(table)
+    if settings.daily_token_budget or settings.daily_cost_budget:
+        console.print(f"Daily budget: {settings.daily_token_budget or 'unlimited'} tokens, "
+                      f"${settings.daily_cost_budget or 'unlimited'} per user")
+
+@app.command()
+def resume(
+    run_id: str = typer.Argument(..., help="Run ID printed by a failed research run or listed by history"),
+    output_file: Optional[Path] = typer.Option(None, help="Optional output file path"),
+    force: bool = typer.Option(False, "--force", help="Synthesize again even if the run already has a synthesis"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Bypass the LLM response cache"),
+    timings: bool = typer.Option(False, "--timings", help="Print the duration and payload size of each stage")
+):
+    """
+    Finish a stored run, loading completed stages instead of running them again
+    """
+    from utils.storage import get_store
+    settings = get_settings()
+    run = get_store(settings).get_run(run_id)
+    if not run:
+        console.print(f"[bold red]Error:[/bold red] No run found with ID {run_id}")
+        raise typer.Exit(code=1)
+    if not run["research"]:
+        console.print(f"[bold red]Error:[/bold red] Run {run_id} has no stored research; start a new research run")
+        raise typer.Exit(code=1)
+    if run["synthesis"] and not force:
+        console.print(f"[bold green]Run {run_id} is already complete[/bold green] (use --force to synthesize again)")
+        console.print(run["synthesis"]["synthesis"])
+        return
+    
+    preload(*SYNTHESIS_MODULES)
+    console.print(f"[bold blue]Resuming run {run_id}:[/bold blue] research loaded from the store")
+    run_settings = settings.model_copy(update={"llm_cache_enabled": settings.llm_cache_enabled and not no_cache})
+    try:
+        _synthesize(run["research"], run["query"], run_settings, output_file, timings)
+    except Exception as e:
+        logger.exception("Error during synthesis")
+        console.print(f"[bold red]Error:[/bold red] {str(e)}")
+        raise typer.Exit(code=1)
+
+@app.command("migrate-results")
+def migrate_results():
+    """
+    Import research_*.json and synthesis_*.json files from the results directory into the store
+    """
+    from utils.storage import get_store
+    settings = get_settings()
+    counts = get_store(settings).import_legacy_results(settings.results_dir)
+    console.print(
+        f"[bold green]Imported[/bold green] {counts['research']} research and {counts['synthesis']} synthesis files "
+        f"({counts['skipped']} already imported, {counts['failed']} failed)"
+    )
+
+@app.command()
+def serve(
+    host: Optional[str] = typer.Option(None, "--host", help="Interface to bind (default: API_HOST)"),
+    port: Optional[int] = typer.Option(None, "--port", help="Port to listen on (default: API_PORT)")
+):
+    """
+    Run the HTTP API server
+    """
+    import uvicorn
+    from server import create_app
+    settings = get_settings()
+    uvicorn.run(create_app(settings), host=host or settings.api_host, port=port or settings.api_port)
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
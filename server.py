@@ -0,0 +1,244 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional, AsyncIterator
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+from config import ResearchTier
+from agents.research_agent import ResearchAgent
+from agents.synthesis_agent import SynthesisAgent
+from utils.accounting import BudgetExceededError, acting_as
+from utils.jobs import JobManager, FINISHED_STATUSES
+from utils.run_scheduler import AdmissionError, normalize_priority, run_priority
+from utils.storage import get_store
+from utils.tracing import prometheus_metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds between job state checks while streaming server-sent events
+EVENT_POLL_INTERVAL = 0.25
+
+class ResearchRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    depth: str = "shallow"
+    sub_queries: int = 0
+    user: Optional[str] = None
+    priority: str = "interactive"
+
+class SynthesisRequest(BaseModel):
+    query: Optional[str] = None
+    run_id: Optional[str] = None
+    research_data: Optional[Dict[str, Any]] = None
+    user: Optional[str] = None
+    priority: str = "interactive"
+
+class JobRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    depth: str = "shallow"
+    user: Optional[str] = None
+    priority: str = "interactive"
+
+def normalize_depth(depth: str) -> str:
+    """Accept shallow/medium/deep or basic/advanced like the CLI does"""
+    try:
+        return ResearchTier.from_user_input(depth).value
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown depth '{depth}'; use shallow, medium or deep")
+
+def check_priority(priority: str) -> str:
+    """Accept interactive or batch"""
+    try:
+        return normalize_priority(priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class ConcurrencyLimiter:
+    """Admit at most limit concurrent requests; callers over the limit are rejected, not queued"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.active >= self.limit:
+            raise HTTPException(status_code=429, detail="Server is at capacity; retry shortly",
+                                headers={"Retry-After": "1"})
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def create_app(settings, research_agent=None, synthesis_agent=None,
+               job_manager: Optional[JobManager] = None) -> FastAPI:
+    """Build the HTTP API around shared agents
+
+    Agents and the job manager can be injected, e.g. with stub Tavily and LLM clients
+    for offline testing; otherwise they are created once from settings and shared by
+    every request, so provider clients and HTTP connection pools are reused.
+    """
+    if research_agent is None or synthesis_agent is None:
+        research_agent = research_agent or ResearchAgent(settings)
+        synthesis_agent = synthesis_agent or SynthesisAgent(settings)
+    store = get_store(settings)
+    if job_manager is None:
+        job_manager = JobManager(research_agent, synthesis_agent, store, settings.job_workers)
+    limiter = ConcurrencyLimiter(settings.api_max_concurrency)
+
+    app = FastAPI(title="Deep Research Assistant API")
+    app.state.research_agent = research_agent
+    app.state.synthesis_agent = synthesis_agent
+    app.state.job_manager = job_manager
+
+    @app.get("/health")
+    async def health():
+        return {
+            "status": "ok",
+            "active_requests": limiter.active,
+            "active_jobs": job_manager.active_count(),
+            "scheduler": research_agent.run_scheduler.stats(),
+            "coalesced": {
+                "research": research_agent.inflight.stats()["coalesced"],
+                "synthesis": synthesis_agent.inflight.stats()["coalesced"]
+            }
+        }
+
+    @app.get("/metrics")
+    async def metrics():
+        """Per-stage span metrics and run scheduler queues in Prometheus text format"""
+        text = prometheus_metrics()
+        if text is None:
+            raise HTTPException(status_code=404, detail="Enable the prometheus tracing exporter")
+        text += research_agent.run_scheduler.render_prometheus()
+        return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+    @app.post("/research")
+    async def research(request: ResearchRequest):
+        """Run research and synthesis for a query and return both"""
+        depth = normalize_depth(request.depth)
+        priority = check_priority(request.priority)
+        async with limiter.slot():
+            try:
+                with acting_as(request.user), run_priority(priority):
+                    if request.sub_queries > 0:
+                        research_results = await research_agent.aexecute(request.query, depth, request.sub_queries)
+                    else:
+                        research_results = await run_in_threadpool(research_agent.execute, request.query, depth)
+                    synthesis = await run_in_threadpool(
+                        synthesis_agent.process_results, research_results, request.query
+                    )
+            except BudgetExceededError as e:
+                raise HTTPException(status_code=429, detail=str(e))
+            except AdmissionError as e:
+                raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                logger.error(f"Research request failed: {str(e)}", exc_info=True)
+                raise HTTPException(status_code=502, detail=str(e))
+        return {"run_id": research_results["run_id"], "research": research_results, "synthesis": synthesis}
+
+    @app.post("/synthesis")
+    async def synthesis(request: SynthesisRequest):
+        """Synthesize a stored run (by run_id) or a research payload supplied in the request
+
+        Only a run looked up by run_id is synthesized in place. A supplied payload is
+        synthesized as a new run: its own run ID and incremental changes are dropped, so
+        it can neither overwrite a stored synthesis nor read one.
+        """
+        research_data = request.research_data
+        if request.run_id:
+            run = store.get_run(request.run_id)
+            if not run or not run["research"]:
+                raise HTTPException(status_code=404, detail=f"No research stored for run {request.run_id}")
+            research_data = run["research"]
+        elif research_data:
+            research_data = {key: value for key, value in research_data.items()
+                             if key not in ("run_id", "changes")}
+        if not research_data:
+            raise HTTPException(status_code=400, detail="Provide run_id or research_data")
+        query = request.query or research_data.get("query")
+        if not query:
+            raise HTTPException(status_code=400, detail="Provide query")
+        priority = check_priority(request.priority)
+        async with limiter.slot():
+            try:
+                with acting_as(request.user), run_priority(priority):
+                    return await run_in_threadpool(synthesis_agent.process_results, research_data, query)
+            except BudgetExceededError as e:
+                raise HTTPException(status_code=429, detail=str(e))
+            except AdmissionError as e:
+                raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                logger.error(f"Synthesis request failed: {str(e)}", exc_info=True)
+                raise HTTPException(status_code=502, detail=str(e))
+
+    @app.post("/jobs", status_code=202)
+    async def submit_job(request: JobRequest):
+        """Queue a research job; poll /jobs/{job_id} or stream /jobs/{job_id}/events"""
+        if job_manager.active_count() >= settings.api_max_queued_jobs:
+            return JSONResponse(status_code=429, content={"detail": "Too many queued jobs; retry later"},
+                                headers={"Retry-After": "5"})
+        job_id = job_manager.submit(request.query, normalize_depth(request.depth), request.user,
+                                    check_priority(request.priority))
+        return {"job_id": job_id}
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        job = job_manager.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"No job with ID {job_id}")
+        return job
+
+    @app.get("/runs/{run_id}")
+    async def get_run(run_id: str):
+        run = store.get_run(run_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail=f"No run with ID {run_id}")
+        return run
+
+    @app.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str):
+        """Stream job progress and synthesis tokens as server-sent events"""
+        if job_manager.get(job_id) is None:
+            raise HTTPException(status_code=404, detail=f"No job with ID {job_id}")
+
+        async def events() -> AsyncIterator[str]:
+            last_progress = None
+            sent = 0
+            while True:
+                job = job_manager.get(job_id)
+                progress = (job["status"], job["stage"], job["progress"], job["message"])
+                if progress != last_progress:
+                    last_progress = progress
+                    yield _sse("progress", {
+                        "status": job["status"], "stage": job["stage"],
+                        "progress": job["progress"], "message": job["message"]
+                    })
+                text = job.get("partial_synthesis") or ""
+                if len(text) > sent:
+                    yield _sse("token", {"text": text[sent:]})
+                    sent = len(text)
+                if job["status"] in FINISHED_STATUSES:
+                    yield _sse("done" if job["status"] == "succeeded" else "error", job)
+                    return
+                await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+    from config import settings
+    uvicorn.run(create_app(settings), host=settings.api_host, port=settings.api_port)
@@ -0,0 +1,81 @@
+import os
+import sys
+from pathlib import Path
+
+# config builds its settings at import time and rejects missing API keys; tests never call out
+os.environ.setdefault("TAVILY_API_KEY", "test-tavily-key")
+os.environ.setdefault("GOOGLE_API_KEY", "test-google-key")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import config
+from utils.outbound import reset_schedulers
+from utils.run_scheduler import reset_run_scheduler
+
+class FakeTavily:
+    """Tavily client returning three distinct results per search and recording each call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def search(self, query, search_depth="basic", **kwargs):
+        self.calls.append((query, search_depth))
+        n = len(self.calls)
+        return {"query": query, "results": [
+            {"url": f"https://example.com/{n}/{i}", "title": f"Result {i}",
+             "content": f"Finding {i} from search {n} about {query}", "score": 1 - i / 10}
+            for i in range(3)
+        ]}
+
+class CountingChatModel(FakeListChatModel):
+    """Fake chat model that counts completed calls, streamed ones included"""
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        self.calls += 1
+        yield from super()._stream(*args, **kwargs)
+
+@pytest.fixture(autouse=True)
+def fresh_schedulers():
+    """Outbound and run schedulers are process-wide; don't let breaker or queue state leak"""
+    reset_schedulers()
+    reset_run_scheduler()
+    yield
+    reset_schedulers()
+    reset_run_scheduler()
+
+@pytest.fixture
+def make_settings(tmp_path):
+    def make(**overrides):
+        return config.Settings(base_dir=tmp_path, **overrides)
+    return make
+
+@pytest.fixture
+def make_research_agent(make_settings):
+    """ResearchAgent with a fake Tavily client and an LLM that proposes no follow-up queries"""
+    from agents.research_agent import ResearchAgent
+
+    def make(**overrides):
+        agent = ResearchAgent(make_settings(**overrides))
+        agent.tavily_client = FakeTavily()
+        # Every run stops after its first round
+        agent.llm = FakeListChatModel(responses=["[]"])
+        return agent
+    return make
+
+@pytest.fixture
+def make_synthesis_agent(make_settings):
+    """SynthesisAgent whose synthesis and map models are CountingChatModels"""
+    from agents.synthesis_agent import SynthesisAgent
+
+    def make(responses=("synthesis of the sources",), **overrides):
+        agent = SynthesisAgent(make_settings(**overrides))
+        agent.llm = CountingChatModel(responses=list(responses))
+        agent.map_llm = CountingChatModel(responses=["map summary"])
+        return agent
+    return make
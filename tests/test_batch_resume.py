@@ -0,0 +1,24 @@
+import json
+import main
+
+def test_completed_queries_match_across_depth_aliases(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text("\n".join([
+        json.dumps({"query": "a", "depth": "basic", "status": "ok"}),
+        json.dumps({"query": "b", "depth": "advanced", "status": "ok"}),
+        json.dumps({"query": "c", "depth": "medium", "status": "error"}),
+        '{"query": "d", "dep',
+    ]) + "\n")
+    completed = main._completed_batch_queries(output)
+    assert main._batch_key("a", "shallow") in completed
+    assert main._batch_key("b", "deep") in completed
+    assert main._batch_key("a", "deep") not in completed
+    assert main._batch_key("c", "medium") not in completed
+
+def test_read_batch_queries_normalizes_depths(tmp_path):
+    queries = tmp_path / "queries.txt"
+    queries.write_text('plain\n{"query": "json", "depth": "advanced"}\n\n')
+    assert main._read_batch_queries(str(queries), "shallow") == [
+        {"query": "plain", "depth": "shallow"},
+        {"query": "json", "depth": "deep"},
+    ]
@@ -0,0 +1,33 @@
+from utils.dedup import canonicalize_url, deduplicate_results
+
+ARTICLE = ("Air source heat pumps move heat from outdoor air into a building and reach three to four "
+           "units of heat per unit of electricity in mild weather, falling as temperatures drop. ") * 3
+
+def test_canonicalize_url_strips_mirrors_and_tracking():
+    canonical = canonicalize_url("https://example.com/guide")
+    assert canonicalize_url("http://www.Example.com:80/guide/?utm_source=x&fbclid=y#intro") == canonical
+    assert canonicalize_url("https://example.com//guide/index.html") == canonical
+    assert canonicalize_url("https://example.com/guide?b=2&a=1") == canonicalize_url("https://example.com/guide?a=1&b=2")
+    assert canonicalize_url("https://example.com:8443/guide") != canonical
+    assert canonicalize_url("") == ""
+
+def test_same_url_keeps_the_highest_scoring_copy_in_original_order():
+    results = [
+        {"url": "https://a.com/x", "content": "first page about solar", "score": 0.9},
+        {"url": "https://www.a.com/x/?utm_medium=mail", "content": "mirror of solar page", "score": 0.95},
+        {"url": "https://b.com/y", "content": "unrelated wind article", "score": 0.5},
+    ]
+    kept, stats = deduplicate_results(results)
+    assert [r["url"] for r in kept] == ["https://www.a.com/x/?utm_medium=mail", "https://b.com/y"]
+    assert stats == {"input": 3, "kept": 2, "url_duplicates": 1, "near_duplicates": 0}
+
+def test_near_duplicate_content_is_dropped_and_distinct_content_kept():
+    results = [
+        {"url": "https://a.com/1", "content": ARTICLE, "score": 0.8},
+        {"url": "https://b.com/2", "content": ARTICLE + " Updated.", "score": 0.7},
+        {"url": "https://c.com/3", "content": "Ground source systems use buried loops " * 5, "score": 0.6},
+        {"url": "https://d.com/4", "content": "", "score": 0.5},
+    ]
+    kept, stats = deduplicate_results(results, similarity=0.8)
+    assert [r["url"] for r in kept] == ["https://a.com/1", "https://c.com/3", "https://d.com/4"]
+    assert stats["near_duplicates"] == 1
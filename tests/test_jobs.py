@@ -0,0 +1,50 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from utils.jobs import JOB_STALE_AFTER, JobManager, is_orphaned
+from utils.storage import ResearchStore
+
+def job(job_id, status="running"):
+    return {"job_id": job_id, "user": "alice", "status": status, "created_at": "2025-02-01 10:00:00"}
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def test_is_orphaned_checks_the_owner_process_and_heartbeat():
+    host, now = socket.gethostname(), time.time()
+    assert not is_orphaned(f"{host}:{os.getpid()}:abc", now)
+    assert is_orphaned(f"{host}:{dead_pid()}:abc", now)
+    assert not is_orphaned("other-host:1:abc", now)
+    assert is_orphaned("other-host:1:abc", now - JOB_STALE_AFTER - 1)
+    # Saved by a version that didn't record owners
+    assert is_orphaned(None, None)
+
+def test_startup_interrupts_only_jobs_whose_owner_is_gone(tmp_path):
+    store = ResearchStore(tmp_path / "research.sqlite3")
+    host = socket.gethostname()
+    store.save_job(job("live"), f"{host}:{os.getpid()}:other-manager")
+    store.save_job(job("remote", status="queued"), "other-host:1:abc")
+    store.save_job(job("dead"), f"{host}:{dead_pid()}:abc")
+    store.save_job(job("legacy"))
+    store.save_job(job("done", status="succeeded"))
+
+    manager = JobManager(research_agent=None, synthesis_agent=None, store=store, max_workers=1)
+    statuses = {j["job_id"]: j["status"] for j in manager.list_jobs()}
+    assert statuses == {"live": "running", "remote": "queued", "dead": "interrupted",
+                        "legacy": "interrupted", "done": "succeeded"}
+
+def test_heartbeat_refreshes_only_the_owners_unfinished_jobs(tmp_path):
+    store = ResearchStore(tmp_path / "research.sqlite3")
+    store.save_job(job("mine"), "host:1:me")
+    store.save_job(job("finished", status="failed"), "host:1:me")
+    store.save_job(job("theirs"), "host:2:them")
+    stale = time.time() - JOB_STALE_AFTER - 1
+    store._conn.execute("UPDATE jobs SET heartbeat = ?", (stale,))
+    store.heartbeat_jobs("host:1:me")
+    heartbeats = dict(store._conn.execute("SELECT job_id, heartbeat FROM jobs").fetchall())
+    assert heartbeats["mine"] > stale
+    assert heartbeats["finished"] == heartbeats["theirs"] == stale
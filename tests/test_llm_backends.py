@@ -0,0 +1,17 @@
+from utils.llm_backends import parse_model_spec, scheduler_for
+
+def test_parse_model_spec_uses_default_backend_for_bare_names(make_settings):
+    settings = make_settings(llm_backend="openai")
+    assert parse_model_spec(settings, "fake:canned") == ("fake", "canned")
+    assert parse_model_spec(settings, "llama3:8b") == ("openai", "llama3:8b")
+
+def test_each_backend_has_its_own_scheduler(make_settings):
+    settings = make_settings(synthesis_agent_model="gemini-1.5-pro", map_model="openai:llama3",
+                             research_agent_model="fake:canned", gemini_rate_limit=3.0,
+                             llm_rate_limit=7.0, llm_burst=9)
+    synthesis, map_stage, plan = (scheduler_for(settings, stage) for stage in ("synthesis", "map", "plan"))
+    assert (synthesis.provider, map_stage.provider, plan.provider) == ("gemini", "openai", "fake")
+    assert synthesis.bucket.rate == 3.0
+    # Backends without settings of their own use the generic LLM limits
+    assert (map_stage.bucket.rate, map_stage.bucket.capacity) == (7.0, 9)
+    assert scheduler_for(settings, "reduce") is map_stage
@@ -0,0 +1,46 @@
+from langchain_core.messages import HumanMessage, SystemMessage
+from utils.llm_cache import LLMCache
+
+MESSAGES = [SystemMessage(content="You are a research analyst"), HumanMessage(content="Summarize heat pumps")]
+PARAMS = {"model_name": "gemini-1.5-flash", "temperature": 0.7}
+
+def make_cache(tmp_path, ttl=3600, max_entries=100):
+    return LLMCache(tmp_path / "llm_cache.sqlite3", ttl, max_entries)
+
+def test_key_depends_on_messages_and_parameters():
+    key = LLMCache.make_key(MESSAGES, PARAMS)
+    assert key == LLMCache.make_key(list(MESSAGES), dict(PARAMS))
+    assert key != LLMCache.make_key(MESSAGES[1:], PARAMS)
+    assert key != LLMCache.make_key(MESSAGES, dict(PARAMS, temperature=0.0))
+    assert key != LLMCache.make_key(MESSAGES, dict(PARAMS, model_name="gemini-1.5-pro"))
+
+def test_set_then_get_and_stats(tmp_path):
+    cache = make_cache(tmp_path)
+    key = LLMCache.make_key(MESSAGES, PARAMS)
+    assert cache.get(key) is None
+    cache.set(key, "heat pumps move heat", "gemini-1.5-flash")
+    assert cache.get(key) == "heat pumps move heat"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+def test_expired_response_is_deleted(tmp_path):
+    cache = make_cache(tmp_path, ttl=-1)
+    cache.set("key", "stale")
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entries_beyond_max_entries_are_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache._conn.execute("UPDATE llm_cache SET last_access = last_access - 10 WHERE key = 'b'")
+    cache.set("c", "3")
+    assert [cache.get(k) for k in ("a", "b", "c")] == ["1", None, "3"]
+
+def test_database_errors_are_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("key", "value")
+    cache._conn.close()
+    assert cache.get("key") is None
+    # Writes fail quietly as well
+    cache.set("other", "value")
+    assert cache.misses == 1
@@ -0,0 +1,163 @@
+import threading
+import pytest
+from utils import outbound
+from utils.outbound import (CircuitBreaker, CircuitOpenError, DeadlineExceededError, OutboundScheduler,
+                            TokenBucket)
+
+class FakeClock:
+    """Stands in for the time module inside utils.outbound; sleeping advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+class Flaky:
+    """Raises each error in turn, then returns "ok" """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(outbound, "time", fake)
+    # Backoff waits its full upper bound, so sleeps are predictable
+    monkeypatch.setattr(outbound.random, "uniform", lambda low, high: high)
+    return fake
+
+def make_scheduler(rate=100.0, burst=10, max_retries=2, attempt_timeout=5.0, backoff_base=1.0,
+                   backoff_max=30.0, failure_threshold=3, reset_timeout=10.0):
+    return OutboundScheduler("test", rate=rate, burst=burst, max_retries=max_retries,
+                             attempt_timeout=attempt_timeout, backoff_base=backoff_base,
+                             backoff_max=backoff_max, failure_threshold=failure_threshold,
+                             reset_timeout=reset_timeout, max_in_flight=2)
+
+def test_bucket_spends_its_burst_then_paces_at_the_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    assert bucket.acquire() and bucket.acquire()
+    assert clock.sleeps == []
+    assert bucket.acquire()
+    assert clock.sleeps == [0.5]
+    # Not enough time to refill: give up without sleeping
+    assert not bucket.acquire(timeout=0.1)
+    assert clock.sleeps == [0.5]
+
+def test_retryable_errors_back_off_exponentially(clock):
+    scheduler = make_scheduler(max_retries=3, backoff_max=3.0, failure_threshold=5)
+    fn = Flaky(TimeoutError("read timed out"), ConnectionError("reset"), TimeoutError("again"))
+    assert scheduler.call(fn, deadline=60) == "ok"
+    assert fn.calls == 4
+    assert clock.sleeps == [1.0, 2.0, 3.0]
+    assert scheduler.stats["retries"] == 3
+    assert scheduler.breaker.state == "closed"
+
+def test_non_retryable_errors_are_raised_without_retrying(clock):
+    scheduler = make_scheduler()
+    fn = Flaky(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        scheduler.call(fn)
+    assert fn.calls == 1 and clock.sleeps == []
+    assert scheduler.breaker.failures == 0
+
+def test_rate_limit_wait_past_the_deadline_fails_fast(clock):
+    scheduler = make_scheduler(rate=0.5, burst=1)
+    assert scheduler.call(Flaky()) == "ok"
+    with pytest.raises(DeadlineExceededError):
+        scheduler.call(Flaky(), deadline=1.0)
+    assert clock.sleeps == []
+
+def test_backoff_past_the_deadline_raises_the_last_error(clock):
+    scheduler = make_scheduler(backoff_base=5.0)
+    fn = Flaky(TimeoutError("read timed out"))
+    with pytest.raises(TimeoutError):
+        scheduler.call(fn, deadline=2.0)
+    assert fn.calls == 1
+
+def test_attempt_still_running_at_the_deadline_is_abandoned():
+    scheduler = make_scheduler(attempt_timeout=0.02, max_retries=0)
+    release = threading.Event()
+    with pytest.raises(DeadlineExceededError):
+        scheduler.call(release.wait, 5, deadline=0.1)
+    release.set()
+    assert scheduler.stats["slow"] == 1 and scheduler.stats["abandoned"] == 1
+
+def test_breaker_opens_then_half_opens_then_closes(clock):
+    scheduler = make_scheduler(max_retries=0, failure_threshold=2, reset_timeout=10.0)
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            scheduler.call(Flaky(TimeoutError("read timed out")))
+    assert scheduler.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(Flaky())
+
+    clock.now += 10.0
+    # A failed trial call reopens the breaker for another reset_timeout
+    with pytest.raises(TimeoutError):
+        scheduler.call(Flaky(TimeoutError("read timed out")))
+    assert scheduler.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(Flaky())
+
+    clock.now += 10.0
+    assert scheduler.call(Flaky()) == "ok"
+    assert scheduler.breaker.state == "closed" and scheduler.breaker.failures == 0
+
+def test_breaker_admits_one_trial_call_at_a_time(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow() == "half-open"
+    assert breaker.allow() is None
+
+def opened_scheduler(clock):
+    """A scheduler whose breaker is ready for a trial call but whose bucket is empty"""
+    scheduler = make_scheduler(rate=0.5, burst=1, max_retries=0, failure_threshold=1, reset_timeout=0.1)
+    with pytest.raises(TimeoutError):
+        scheduler.call(Flaky(TimeoutError("read timed out")))
+    clock.now += 0.1
+    return scheduler
+
+@pytest.mark.parametrize("reach", [
+    lambda scheduler: scheduler.call(Flaky(), deadline=0.5),
+    lambda scheduler: list(scheduler.stream(lambda: iter("ab"), deadline=0.5)),
+    lambda scheduler: scheduler.call_batch(lambda inputs: inputs, lambda item: item, [1, 2, 3, 4]),
+])
+def test_trial_call_out_of_time_for_a_token_reopens_the_breaker(clock, reach):
+    scheduler = opened_scheduler(clock)
+    with pytest.raises(DeadlineExceededError):
+        reach(scheduler)
+    assert scheduler.breaker.state == "open"
+    # The bucket refills and the next caller gets its own trial
+    clock.now += 2.0
+    assert scheduler.call(Flaky()) == "ok"
+    assert scheduler.breaker.state == "closed"
+
+def test_trial_stream_closed_after_its_first_chunk_closes_the_breaker(clock):
+    scheduler = opened_scheduler(clock)
+    clock.now += 2.0
+    chunks = scheduler.stream(lambda: iter(["a", "b", "c"]))
+    assert next(chunks) == "a"
+    chunks.close()
+    assert scheduler.breaker.state == "closed"
+
+def test_trial_batch_rejected_by_the_provider_closes_the_breaker(clock):
+    scheduler = opened_scheduler(clock)
+    clock.now += 4.0
+    with pytest.raises(ValueError):
+        scheduler.call_batch(lambda inputs: [ValueError("bad input")] * len(inputs),
+                             Flaky(ValueError("bad input")), [1, 2])
+    assert scheduler.breaker.state == "closed"
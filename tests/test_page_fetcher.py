@@ -0,0 +1,140 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from utils import page_fetcher
+from utils.page_fetcher import PageCache, PageFetcher, PublicAddressAdapter
+
+PARAGRAPH = "Solar panels convert sunlight into electricity using photovoltaic cells. " * 4
+ARTICLE = "<html><body><nav>Home | About</nav><article>" + "".join(
+    f"<p>{i}: {PARAGRAPH}</p>" for i in range(40)) + "</article></body></html>"
+ETAG = '"article-v1"'
+
+class Site:
+    """Local HTTP server with a robots.txt, an article with an ETag and a large text file"""
+
+    def __init__(self):
+        self.paths = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.paths.append(self.path)
+                if self.path == "/robots.txt":
+                    self._send(200, "text/plain", b"User-agent: *\nDisallow: /private\n")
+                elif self.path == "/article":
+                    if self.headers.get("If-None-Match") == ETAG:
+                        self.send_response(304)
+                        self.send_header("ETag", ETAG)
+                        self.end_headers()
+                    else:
+                        self._send(200, "text/html; charset=utf-8", ARTICLE.encode("utf-8"), ETAG)
+                elif self.path == "/large":
+                    self._send(200, "text/plain", b"x" * (1024 * 1024))
+                elif self.path == "/redirect":
+                    self.send_response(302)
+                    self.send_header("Location", "/private/page")
+                    self.end_headers()
+                else:
+                    self._send(200, "text/html", ARTICLE.encode("utf-8"))
+
+            def _send(self, status, content_type, body, etag=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def site():
+    site = Site()
+    yield site
+    site.close()
+
+def make_fetcher(tmp_path, **options):
+    defaults = dict(session=requests.Session(), cache=PageCache(tmp_path, ttl=0, max_bytes=10 * 1024 * 1024),
+                    concurrency=4, per_host=2, timeout=5.0, max_bytes=64 * 1024, chunk_tokens=100,
+                    max_chunks=3, allow_private=True)
+    defaults.update(options)
+    return PageFetcher(**defaults)
+
+def test_fetch_extracts_and_chunks_article(tmp_path, site):
+    page = make_fetcher(tmp_path).fetch(f"{site.base_url}/article")
+    assert page["status"] == "fetched"
+    assert len(page["chunks"]) == 3
+    assert "photovoltaic" in page["chunks"][0]
+    assert "Home | About" not in page["chunks"][0]
+
+def test_fetch_revalidates_stale_entry_with_etag(tmp_path, site):
+    fetcher = make_fetcher(tmp_path)
+    first = fetcher.fetch(f"{site.base_url}/article")
+    second = fetcher.fetch(f"{site.base_url}/article")
+    assert second["status"] == "not_modified"
+    assert second["chunks"] == first["chunks"]
+
+def test_fetch_truncates_body_at_max_bytes(tmp_path, site):
+    page = make_fetcher(tmp_path, cache=None).fetch(f"{site.base_url}/large")
+    assert page["status"] == "fetched"
+    assert page["truncated"]
+    assert page["bytes"] == 64 * 1024
+
+def test_robots_txt_disallows_pages_and_redirects(tmp_path, site):
+    fetcher = make_fetcher(tmp_path, cache=None)
+    assert fetcher.fetch(f"{site.base_url}/private/page")["status"] == "blocked"
+    assert fetcher.fetch(f"{site.base_url}/redirect")["status"] == "blocked"
+    assert fetcher.fetch(f"{site.base_url}/public")["status"] == "fetched"
+    assert "/private/page" not in site.paths
+    # The rules are fetched once per host and reused
+    assert site.paths.count("/robots.txt") == 1
+
+def test_robots_txt_is_ignored_when_not_respected(tmp_path, site):
+    page = make_fetcher(tmp_path, cache=None, respect_robots=False).fetch(f"{site.base_url}/private/page")
+    assert page["status"] == "fetched"
+    assert "/robots.txt" not in site.paths
+
+@pytest.mark.parametrize("url", ["http://127.0.0.1:{port}/article", "http://localhost:{port}/article",
+                                 "http://[::1]/", "http://169.254.169.254/latest/meta-data/",
+                                 "http://10.0.0.1/", "file:///etc/passwd"])
+def test_private_and_non_http_urls_are_blocked(tmp_path, site, url):
+    fetcher = make_fetcher(tmp_path, cache=None, allow_private=False, timeout=1.0)
+    page = fetcher.fetch(url.format(port=site.server.server_address[1]))
+    assert page["status"] == "blocked"
+    assert site.paths == []
+
+def test_connection_to_a_rebound_private_address_is_refused(tmp_path, site, monkeypatch):
+    session = requests.Session()
+    session.mount("http://", PublicAddressAdapter())
+    fetcher = make_fetcher(tmp_path, session=session, cache=None, allow_private=False, respect_robots=False)
+    # The name looked public when checked, then resolved to a private address on connect
+    monkeypatch.setattr(fetcher, "_check_address", lambda url: None)
+    page = fetcher.fetch(f"{site.base_url}/article")
+    assert page["status"] == "blocked"
+    assert "non-public address 127.0.0.1" in page["error"]
+    assert site.paths == []
+
+def test_tracked_hosts_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(page_fetcher, "MAX_TRACKED_HOSTS", 3)
+    fetcher = make_fetcher(tmp_path)
+    for i in range(10):
+        fetcher._host(f"host-{i}.example")
+    assert list(fetcher._hosts) == ["host-7.example", "host-8.example", "host-9.example"]
+    # Hosts with a download in progress are kept
+    with fetcher._host_slot("http://busy.example/page"):
+        for i in range(10, 20):
+            fetcher._host(f"host-{i}.example")
+        assert "busy.example" in fetcher._hosts
+        assert len(fetcher._hosts) == 3
@@ -0,0 +1,29 @@
+import numpy as np
+from utils.reranker import bm25_scores, rerank_results
+
+def test_bm25_prefers_documents_with_query_terms():
+    scores = bm25_scores("heat pump efficiency", [
+        "heat pump efficiency in cold climates",
+        "heat pump installation",
+        "the history of the steam engine",
+    ])
+    assert scores[0] > scores[1] > scores[2] == 0
+    assert not bm25_scores("the of and", ["anything"]).any()
+    assert bm25_scores("heat", []).size == 0
+
+def test_rerank_keeps_top_k_with_normalized_scores():
+    results = [
+        {"title": "Steam", "content": "the history of the steam engine", "score": 0.9},
+        {"title": "Heat pumps", "content": "heat pump efficiency explained", "score": 0.1},
+        {"title": "Install", "content": "heat pump installation", "score": 0.5},
+    ]
+    ranked, stats = rerank_results("heat pump efficiency", results, top_k=2)
+    assert [r["title"] for r in ranked] == ["Heat pumps", "Install"]
+    assert ranked[0]["relevance_score"] == 1.0
+    assert stats["input"] == 3 and stats["kept"] == 2
+
+def test_rerank_falls_back_to_search_score_on_ties():
+    results = [{"title": "a", "content": "x", "score": 0.2}, {"title": "b", "content": "y", "score": 0.8}]
+    ranked, _ = rerank_results("unrelated", results, top_k=5)
+    assert [r["title"] for r in ranked] == ["b", "a"]
+    assert all(np.isclose(r["relevance_score"], 0) for r in ranked)
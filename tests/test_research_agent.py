@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from utils.accounting import acting_as
+
+def test_repeat_runs_reuse_cached_searches(make_research_agent):
+    agent = make_research_agent()
+    agent.execute("heat pumps", "shallow")
+    agent.execute("heat pumps", "shallow")
+    assert len(agent.tavily_client.calls) == 1
+
+def test_incremental_runs_search_again_and_diff(make_research_agent):
+    agent = make_research_agent()
+    first = agent.execute("heat pumps", "shallow")
+    agent.store.save_synthesis({"run_id": first["run_id"], "query": "heat pumps", "synthesis": "s",
+                                "timestamp": first["timestamp"]})
+    second = agent.execute_incremental("heat pumps", "shallow")
+    assert len(agent.tavily_client.calls) == 2
+    assert second["changes"]["previous_run_id"] == first["run_id"]
+    assert len(second["changes"]["new"]) == len(second["results"]["results"]) > 0
+
+def test_research_state_is_not_shared_across_search_depths(make_research_agent):
+    agent = make_research_agent()
+    agent.execute("heat pumps", "shallow")
+    agent.execute("heat pumps", "deep")
+    assert ("heat pumps", "advanced") in agent.tavily_client.calls
+
+def test_concurrent_runs_are_shared_per_user_and_followers_get_copies(make_research_agent):
+    agent = make_research_agent()
+    release = threading.Event()
+    search = agent.tavily_client.search
+
+    def slow_search(*args, **kwargs):
+        release.wait(5)
+        return search(*args, **kwargs)
+
+    agent.tavily_client.search = slow_search
+    results = {}
+
+    def run(name, user):
+        with acting_as(user):
+            results[name] = agent.execute("heat pumps", "shallow")
+
+    threads = [threading.Thread(target=run, args=args)
+               for args in (("alice", "alice"), ("alice again", "alice"), ("bob", "bob"))]
+    for thread in threads:
+        thread.start()
+    while agent.inflight.stats()["leaders"] + agent.inflight.stats()["coalesced"] < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert agent.inflight.stats()["leaders"] == 2
+    assert results["alice"]["run_id"] == results["alice again"]["run_id"] != results["bob"]["run_id"]
+    results["alice again"]["results"]["results"].clear()
+    assert results["alice"]["results"]["results"]
+
+def test_async_research_keeps_blocking_work_off_the_event_loop(make_research_agent):
+    agent = make_research_agent()
+    threads = {}
+    for name in ("_apply_budget", "_rank", "_store_results"):
+        def record(*args, _name=name, _original=getattr(agent, name), **kwargs):
+            threads[_name] = threading.current_thread()
+            return _original(*args, **kwargs)
+        setattr(agent, name, record)
+
+    results = asyncio.run(agent.aexecute("heat pumps", "deep", num_sub_queries=1))
+    assert results["tier"] == "deep"
+    assert len(threads) == 3 and threading.main_thread() not in threads.values()
+    assert agent.store.get_run(results["run_id"])["research"]["timings"]
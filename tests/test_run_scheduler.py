@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+import pytest
+from utils.run_scheduler import AdmissionError, RunScheduler, run_priority
+
+def make_scheduler(slots=1, max_wait=0.0):
+    return RunScheduler(slots=slots, reserved_slots=0, max_queue={"interactive": 10, "batch": 10},
+                        max_wait={"interactive": max_wait, "batch": max_wait})
+
+def test_async_waiter_is_woken_when_a_thread_releases_its_slot():
+    scheduler = make_scheduler()
+    holding, release = threading.Event(), threading.Event()
+
+    def hold():
+        with scheduler.slot("research", "alice"):
+            holding.set()
+            release.wait(5)
+
+    async def main():
+        thread = threading.Thread(target=hold)
+        thread.start()
+        assert await asyncio.to_thread(holding.wait, 5)
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, release.set)
+        async with scheduler.aslot("research", "bob"):
+            assert scheduler.stats()["interactive"]["active"] == 1
+        thread.join(5)
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    stats = scheduler.stats()["interactive"]
+    assert (stats["admitted"], stats["active"], stats["queued"]) == (2, 0, 0)
+
+async def hold(scheduler, holding, release):
+    async with scheduler.aslot("research", "alice"):
+        holding.set()
+        await release.wait()
+
+async def acquire(scheduler, user):
+    async with scheduler.aslot("research", user):
+        pass
+
+def test_async_waiter_times_out_after_max_wait():
+    scheduler = make_scheduler(max_wait=0.1)
+
+    async def main():
+        holding, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, holding, release))
+        await holding.wait()
+        with pytest.raises(AdmissionError):
+            await acquire(scheduler, "bob")
+        release.set()
+        await holder
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    assert scheduler.stats()["interactive"]["timed_out"] == 1
+
+def test_cancelled_async_waiter_gives_up_its_place():
+    scheduler = make_scheduler()
+
+    async def main():
+        holding, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, holding, release))
+        await holding.wait()
+        waiter = asyncio.create_task(acquire(scheduler, "bob"))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        await holder
+        with run_priority("batch"):
+            await acquire(scheduler, "carol")
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    stats = scheduler.stats()
+    assert stats["interactive"]["admitted"] == 1
+    assert stats["interactive"]["active"] == stats["interactive"]["queued"] == 0
+    assert stats["batch"]["admitted"] == 1
+
+def test_async_waiter_is_admitted_as_soon_as_a_slot_frees():
+    scheduler = make_scheduler()
+    delays = []
+
+    async def handoff():
+        holding, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, holding, release))
+        await holding.wait()
+        waiter = asyncio.create_task(acquire(scheduler, "bob"))
+        await asyncio.sleep(0.01)
+        released = time.monotonic()
+        release.set()
+        await holder
+        await waiter
+        delays.append(time.monotonic() - released)
+
+    async def main():
+        for _ in range(10):
+            await handoff()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    # Woken by the release rather than by polling
+    assert sorted(delays)[len(delays) // 2] < 0.01
@@ -0,0 +1,67 @@
+import os
+import time
+from utils import search_cache
+from utils.search_cache import SearchCache
+
+RESPONSE = {"query": "heat pumps", "results": [{"url": "https://example.com", "content": "x" * 500}]}
+
+def make_cache(tmp_path, ttl=3600, max_bytes=1024 * 1024):
+    return SearchCache(tmp_path, {"basic": ttl, "advanced": ttl}, max_bytes)
+
+def test_hit_for_normalized_query_and_miss_for_other_depth(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("Heat  Pumps", "basic", RESPONSE)
+    assert cache.get("heat pumps", "basic") == RESPONSE
+    assert cache.get("heat pumps", "advanced") is None
+    assert cache.get("heat pumps", "basic", {"max_results": 5}) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+
+def test_expired_entry_is_a_miss_and_removed(tmp_path):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.set("heat pumps", "basic", RESPONSE)
+    path = cache._path(cache.make_key("heat pumps", "basic"))
+    entry = path.read_text().replace('"created_at": ', '"created_at": -1e9, "_old": ', 1)
+    path.write_text(entry)
+    assert cache.get("heat pumps", "basic") is None
+    assert not path.exists()
+    assert cache.stats()["expired"] == 1
+
+def test_unreadable_entry_is_discarded(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("heat pumps", "basic", RESPONSE)
+    path = cache._path(cache.make_key("heat pumps", "basic"))
+    path.write_text("{not json")
+    assert cache.get("heat pumps", "basic") is None
+    assert not path.exists()
+
+def test_least_recently_used_entries_are_evicted_over_max_bytes(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=2200)
+    for i in range(3):
+        cache.set(f"query {i}", "basic", RESPONSE)
+        path = cache._path(cache.make_key(f"query {i}", "basic"))
+        # Distinct, increasing access times regardless of filesystem timestamp resolution
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+    assert cache.get("query 0", "basic") is not None
+    cache.set("query 3", "basic", RESPONSE)
+    assert cache.get("query 1", "basic") is None
+    assert cache.get("query 0", "basic") is not None
+    assert cache.stats()["size_bytes"] <= 2200
+    assert cache.stats()["evictions"] >= 1
+
+def test_directory_is_not_scanned_on_every_write(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    scans = []
+    glob = type(cache.cache_dir).glob
+    monkeypatch.setattr(type(cache.cache_dir), "glob",
+                        lambda self, pattern: scans.append(pattern) or glob(self, pattern))
+    for i in range(search_cache.EVICT_SCAN_INTERVAL + 1):
+        cache.set(f"query {i}", "basic", RESPONSE)
+    assert len(scans) == 2
+
+def test_clear_removes_everything(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("heat pumps", "basic", RESPONSE)
+    cache.clear()
+    assert cache.get("heat pumps", "basic") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+import config
+import server
+from utils.run_scheduler import AdmissionError, RunScheduler
+from utils.singleflight import SingleFlight
+from utils.storage import get_store
+
+class StubStream:
+    def __init__(self, chunks, result):
+        self._chunks = chunks
+        self.result = None
+        self._final = result
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield chunk
+        self.result = self._final
+
+class StubResearchAgent:
+    """Research agent that answers instantly, or blocks on gate when one is given"""
+
+    def __init__(self, settings, gate=None):
+        self.run_scheduler = RunScheduler.from_settings(settings)
+        self.inflight = SingleFlight()
+        self.gate = gate
+        self.started = threading.Event()
+        self.error = None
+
+    def execute(self, query, depth, progress=None):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        if progress:
+            progress("research", 1.0, "Research complete")
+        return {"run_id": "run-1", "query": query, "depth": depth, "results": {"results": []}}
+
+    async def aexecute(self, query, depth, sub_queries):
+        return self.execute(query, depth)
+
+class StubSynthesisAgent:
+    def __init__(self):
+        self.inflight = SingleFlight()
+        self.calls = []
+        self.error = None
+
+    def _result(self, research_data, query):
+        return {"run_id": research_data.get("run_id") or "new-run", "query": query,
+                "synthesis": "stub synthesis", "metadata": {"timings": []}}
+
+    def process_results(self, research_data, query):
+        self.calls.append(research_data)
+        if self.error is not None:
+            raise self.error
+        return self._result(research_data, query)
+
+    def stream_results(self, research_data, query, progress=None):
+        return StubStream(["stub ", "synthesis"], self._result(research_data, query))
+
+@pytest.fixture
+def settings(tmp_path):
+    return config.Settings(base_dir=tmp_path, api_max_concurrency=1, job_workers=1)
+
+@pytest.fixture
+def agents(settings):
+    return StubResearchAgent(settings), StubSynthesisAgent()
+
+@pytest.fixture
+def client(settings, agents):
+    research_agent, synthesis_agent = agents
+    with TestClient(server.create_app(settings, research_agent, synthesis_agent)) as client:
+        yield client
+
+def wait_for_job(client, job_id, timeout=5.0):
+    expires = time.monotonic() + timeout
+    while time.monotonic() < expires:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed", "interrupted"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def test_research_returns_both_stages(client):
+    response = client.post("/research", json={"query": "solar panels", "depth": "basic"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["run_id"] == "run-1"
+    assert body["research"]["depth"] == "shallow"
+    assert body["synthesis"]["synthesis"] == "stub synthesis"
+
+def test_research_rejects_unknown_depth_and_priority(client):
+    assert client.post("/research", json={"query": "q", "depth": "abyssal"}).status_code == 400
+    assert client.post("/research", json={"query": "q", "priority": "urgent"}).status_code == 400
+
+def test_concurrency_limiter_rejects_requests_over_the_limit(settings):
+    gate = threading.Event()
+    research_agent = StubResearchAgent(settings, gate=gate)
+    app = server.create_app(settings, research_agent, StubSynthesisAgent())
+    with TestClient(app) as client:
+        first = {}
+        thread = threading.Thread(target=lambda: first.setdefault(
+            "response", client.post("/research", json={"query": "slow"})))
+        thread.start()
+        try:
+            assert research_agent.started.wait(5)
+            response = client.post("/research", json={"query": "second"})
+            assert response.status_code == 429
+            assert response.headers["Retry-After"] == "1"
+        finally:
+            gate.set()
+            thread.join(5)
+        assert first["response"].status_code == 200
+        assert client.get("/health").json()["active_requests"] == 0
+
+def test_admission_error_maps_to_429(client, agents):
+    agents[0].error = AdmissionError("The interactive queue is full")
+    response = client.post("/research", json={"query": "q"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+
+def test_synthesis_value_error_maps_to_400(client, agents):
+    agents[1].error = ValueError("Research data has no results")
+    response = client.post("/synthesis", json={"query": "q", "research_data": {"results": {}}})
+    assert response.status_code == 400
+    assert "no results" in response.json()["detail"]
+
+def test_synthesis_of_supplied_data_ignores_client_run_id(client, agents, settings):
+    store = get_store(settings)
+    store.save_research({"run_id": "stored", "query": "q", "timestamp": "2025-01-01 00:00:00"})
+    response = client.post("/synthesis", json={
+        "query": "q",
+        "research_data": {"run_id": "stored", "changes": {"previous_run_id": "stored"}, "results": {}}
+    })
+    assert response.status_code == 200
+    assert response.json()["run_id"] == "new-run"
+    assert "run_id" not in agents[1].calls[-1]
+    assert "changes" not in agents[1].calls[-1]
+
+def test_synthesis_of_stored_run_uses_stored_research(client, agents, settings):
+    get_store(settings).save_research({"run_id": "stored", "query": "stored query",
+                                       "timestamp": "2025-01-01 00:00:00", "results": {}})
+    response = client.post("/synthesis", json={"run_id": "stored"})
+    assert response.status_code == 200
+    assert agents[1].calls[-1]["query"] == "stored query"
+    assert client.post("/synthesis", json={"run_id": "missing"}).status_code == 404
+
+def test_job_lifecycle(client):
+    response = client.post("/jobs", json={"query": "job query", "depth": "deep"})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "succeeded"
+    assert job["depth"] == "deep"
+    assert job["run_id"] == "run-1"
+    assert job["result"]["results"]["synthesis"] == "stub synthesis"
+    assert client.get("/jobs/unknown").status_code == 404
+
+def test_job_failure_is_reported(client, agents):
+    agents[0].error = RuntimeError("search provider down")
+    job = wait_for_job(client, client.post("/jobs", json={"query": "q"}).json()["job_id"])
+    assert job["status"] == "failed"
+    assert "search provider down" in job["error"]
+
+def test_job_events_stream_progress_tokens_and_done(client):
+    job_id = client.post("/jobs", json={"query": "streamed"}).json()["job_id"]
+    events = []
+    with client.stream("GET", f"/jobs/{job_id}/events") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        event = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line[len("data: "):])))
+    names = [name for name, _ in events]
+    assert names[0] == "progress"
+    assert names[-1] == "done"
+    assert "".join(data["text"] for name, data in events if name == "token") == "stub synthesis"
+    assert events[-1][1]["status"] == "succeeded"
+    assert client.get("/jobs/unknown/events").status_code == 404
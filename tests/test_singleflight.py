@@ -0,0 +1,45 @@
+import threading
+import pytest
+from utils.singleflight import SingleFlight, make_key
+
+def test_make_key_normalizes_strings():
+    assert make_key("Heat  Pumps", "deep") == make_key("heat pumps", "DEEP")
+    assert make_key("heat pumps", "deep") != make_key("heat pumps", "shallow")
+
+def test_concurrent_calls_share_one_computation():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"answer": 42}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", compute)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("k", compute))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flights.stats()["coalesced"] < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert all(result == {"answer": 42} for result, _ in results)
+    assert flights.stats() == {"leaders": 1, "coalesced": 3, "in_flight": 0}
+
+def test_leader_error_reaches_followers_and_next_call_starts_fresh():
+    flights = SingleFlight()
+    flight, leader = flights.begin("k")
+    follower, is_leader = flights.begin("k")
+    assert leader and not is_leader and follower is flight
+    flights.finish("k", error=RuntimeError("provider down"))
+    with pytest.raises(RuntimeError, match="provider down"):
+        follower.wait()
+    assert flights.do("k", lambda: "ok") == ("ok", False)
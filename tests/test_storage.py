@@ -0,0 +1,60 @@
+import json
+import pytest
+from utils.storage import ResearchStore
+
+@pytest.fixture
+def store(tmp_path):
+    return ResearchStore(tmp_path / "research.sqlite3")
+
+def research(run_id, query="heat pumps", timestamp="2025-02-01 10:00:00"):
+    return {"run_id": run_id, "query": query, "depth": "shallow", "timestamp": timestamp,
+            "results": {"results": [{"url": "https://example.com"}]}}
+
+def synthesis(run_id, text, query="heat pumps", timestamp="2025-02-01 10:05:00"):
+    return {"run_id": run_id, "query": query, "synthesis": text, "timestamp": timestamp,
+            "metadata": {"user": "alice"}}
+
+def test_research_and_synthesis_share_a_run(store):
+    store.save_research(research("r1"))
+    store.save_synthesis(synthesis("r1", "Heat pumps are efficient"))
+    run = store.get_run("r1")
+    assert run["research"]["results"]["results"][0]["url"] == "https://example.com"
+    assert run["synthesis"]["synthesis"] == "Heat pumps are efficient"
+    assert store.get_run("missing") is None
+
+def test_latest_run_needs_both_stages(store):
+    store.save_research(research("r1", timestamp="2025-02-01 10:00:00"))
+    store.save_synthesis(synthesis("r1", "first"))
+    store.save_research(research("r2", query="HEAT PUMPS", timestamp="2025-02-02 10:00:00"))
+    assert store.latest_run("Heat Pumps")["run_id"] == "r1"
+    store.save_synthesis(synthesis("r2", "second", query="HEAT PUMPS"))
+    assert store.latest_run("heat pumps")["run_id"] == "r2"
+
+def test_find_runs_by_query_date_and_text(store):
+    store.save_research(research("r1", timestamp="2025-02-01 10:00:00"))
+    store.save_synthesis(synthesis("r1", "Geothermal loops are buried"))
+    store.save_research(research("r2", query="solar panels", timestamp="2025-02-03 10:00:00"))
+    assert [r["run_id"] for r in store.find_runs(query="solar")] == ["r2"]
+    assert [r["run_id"] for r in store.find_runs(until="2025-02-01")] == ["r1"]
+    assert [r["run_id"] for r in store.find_runs(since="2025-02-02")] == ["r2"]
+    assert [r["run_id"] for r in store.find_runs(text="geothermal")] == ["r1"]
+
+def test_import_legacy_results(store, tmp_path):
+    legacy = tmp_path / "results"
+    legacy.mkdir()
+    (legacy / "research_20250201_100000.json").write_text(json.dumps(
+        {"query": "heat pumps", "timestamp": "2025-02-01 10:00:00", "results": {}}))
+    (legacy / "synthesis_20250201_100500.json").write_text(json.dumps(
+        {"query": "heat pumps", "timestamp": "2025-02-01 10:05:00", "synthesis": "legacy synthesis"}))
+    (legacy / "research_20250202_100000.json").write_text("{broken")
+    # Readable but not a research payload: saving it fails
+    (legacy / "research_20250203_100000.json").write_text(json.dumps({"timestamp": "2025-02-03 10:00:00"}))
+
+    counts = store.import_legacy_results(legacy)
+    assert counts == {"research": 1, "synthesis": 1, "skipped": 0, "failed": 2}
+    run = store.get_run("legacy-20250201_100000")
+    assert run["synthesis"]["synthesis"] == "legacy synthesis"
+
+    # Imported files are skipped on a re-run; failed ones are tried again
+    counts = store.import_legacy_results(legacy)
+    assert counts == {"research": 0, "synthesis": 0, "skipped": 2, "failed": 2}
@@ -0,0 +1,95 @@
+import threading
+from utils.accounting import acting_as, today
+
+RESEARCH = {"run_id": "run-1", "query": "heat pumps", "results": {"results": [
+    {"url": f"https://example.com/{i}", "title": f"Source {i}", "content": f"Finding {i} about heat pumps"}
+    for i in range(3)
+]}}
+
+def test_stream_yields_chunks_then_stores_the_synthesis(make_synthesis_agent):
+    agent = make_synthesis_agent(responses=["Heat pumps are efficient."], llm_cache_enabled=False)
+    stream = agent.stream_results(dict(RESEARCH), "heat pumps")
+    chunks = list(stream)
+    assert len(chunks) > 1
+    assert "".join(chunks) == stream.result["synthesis"] == "Heat pumps are efficient."
+    assert agent.store.get_run("run-1")["synthesis"]["synthesis"] == "Heat pumps are efficient."
+    assert agent.inflight.stats()["in_flight"] == 0
+
+def test_closing_a_stream_early_records_usage_and_frees_the_flight(make_synthesis_agent):
+    agent = make_synthesis_agent(responses=["A long synthesis that the reader stops reading."],
+                                 llm_cache_enabled=False)
+    stream = agent.stream_results(dict(RESEARCH), "heat pumps")
+    iterator = iter(stream)
+    next(iterator)
+    iterator.close()
+    assert stream.result is None
+    assert agent.inflight.stats()["in_flight"] == 0
+    assert agent.store.usage_totals(agent.settings.current_user, today())["tokens"] > 0
+    # The next request leads a fresh synthesis
+    assert "".join(agent.stream_results(dict(RESEARCH), "heat pumps"))
+
+def test_concurrent_stream_follows_the_leader(make_synthesis_agent):
+    agent = make_synthesis_agent(responses=["Shared synthesis text."], llm_cache_enabled=False)
+    agent.llm.sleep = 0.01
+    leader = agent.stream_results(dict(RESEARCH), "heat pumps")
+    leader_chunks = iter(leader)
+    first = next(leader_chunks)
+
+    followed = {}
+    follower = threading.Thread(target=lambda: followed.setdefault(
+        "text", "".join(agent.stream_results(dict(RESEARCH), "heat pumps"))))
+    follower.start()
+    while agent.inflight.stats()["coalesced"] < 1:
+        threading.Event().wait(0.01)
+    text = first + "".join(leader_chunks)
+    follower.join(5)
+    assert followed["text"] == text == "Shared synthesis text."
+    assert agent.llm.calls == 1
+
+def test_repeat_synthesis_is_served_from_the_llm_cache(make_synthesis_agent):
+    agent = make_synthesis_agent(responses=["Cached synthesis."])
+    first = agent.process_results(dict(RESEARCH, run_id="run-1"), "heat pumps")
+    second = "".join(agent.stream_results(dict(RESEARCH, run_id="run-2"), "heat pumps"))
+    assert first["synthesis"] == second == "Cached synthesis."
+    assert agent.llm.calls == 1
+    assert agent.store.get_run("run-2")["synthesis"]["metadata"]["cache_hit"]
+
+def test_sampled_syntheses_skip_the_cache_when_configured(make_synthesis_agent):
+    agent = make_synthesis_agent(responses=["First.", "Second."], llm_cache_sampled_outputs=False)
+    agent.process_results(dict(RESEARCH, run_id="run-1"), "heat pumps")
+    agent.process_results(dict(RESEARCH, run_id="run-2"), "heat pumps")
+    assert agent.llm.calls == 2
+    # A deterministic temperature is cached regardless
+    agent = make_synthesis_agent(responses=["Cached."], llm_cache_sampled_outputs=False, synthesis_temperature=0.0)
+    agent.process_results(dict(RESEARCH, run_id="run-3"), "heat pumps")
+    agent.process_results(dict(RESEARCH, run_id="run-4"), "heat pumps")
+    assert agent.llm.calls == 1
+
+def test_syntheses_are_shared_per_user_and_followers_get_copies(make_synthesis_agent):
+    agent = make_synthesis_agent(responses=["Bob's synthesis."], llm_cache_enabled=False)
+    key = agent._inflight_key(RESEARCH, "heat pumps")
+    flight, leader = agent.inflight.begin(key)
+    assert leader
+
+    # Another user's identical request doesn't wait on this user's synthesis
+    def run_as_bob():
+        with acting_as("bob"):
+            followed["bob"] = agent.process_results(dict(RESEARCH), "heat pumps")
+
+    followed = {}
+    bob = threading.Thread(target=run_as_bob, daemon=True)
+    bob.start()
+    bob.join(5)
+    assert followed["bob"]["synthesis"] == "Bob's synthesis."
+
+    follower = threading.Thread(target=lambda: followed.setdefault(
+        "result", agent.process_results(dict(RESEARCH), "heat pumps")))
+    follower.start()
+    while agent.inflight.stats()["coalesced"] < 1:
+        threading.Event().wait(0.01)
+    shared = {"synthesis": "Leader's synthesis.", "metadata": {"sources": ["a"]}}
+    agent.inflight.finish(key, result=shared)
+    follower.join(5)
+    assert followed["result"] == shared and followed["result"] is not shared
+    followed["result"]["metadata"]["sources"].clear()
+    assert shared["metadata"]["sources"] == ["a"]
@@ -0,0 +1,66 @@
+import pytest
+from utils.accounting import BudgetExceededError, RunUsage, record_usage
+from utils.dedup import canonicalize_url
+from utils.storage import get_store
+
+SOURCES = [{"url": f"https://example.com/{i}", "title": f"Source {i}",
+            "content": " ".join(f"finding{i}x{j}" for j in range(150))} for i in range(6)]
+
+@pytest.fixture
+def make_agent(make_synthesis_agent):
+    def make(**overrides):
+        return make_synthesis_agent(responses=["updated synthesis"], llm_cache_enabled=False,
+                                    daily_token_budget=5000, **overrides)
+    return make
+
+def spend_daily_budget(agent):
+    usage = RunUsage("synthesis", agent.settings.current_user)
+    usage.run_id = "earlier"
+    usage.add_llm("gemini-1.5-flash", 4000, 1000)
+    record_usage(agent.settings, agent.store, usage)
+
+def research(run_id="run-2", changes=None):
+    data = {"run_id": run_id, "query": "heat pumps", "results": {"results": SOURCES}}
+    if changes:
+        data["changes"] = changes
+    return data
+
+def store_previous(agent):
+    store = get_store(agent.settings)
+    store.save_research(dict(research("run-1"), timestamp="2025-01-01 00:00:00"))
+    store.save_synthesis({"run_id": "run-1", "query": "heat pumps", "synthesis": "previous synthesis",
+                          "timestamp": "2025-01-01 00:00:00", "metadata": {}})
+    return {"previous_run_id": "run-1", "new": [canonicalize_url(SOURCES[0]["url"])], "changed": []}
+
+def test_spent_daily_budget_rejects_synthesis_without_calling_the_llm(make_agent):
+    agent = make_agent()
+    spend_daily_budget(agent)
+    with pytest.raises(BudgetExceededError):
+        agent.process_results(research(), "heat pumps")
+    with pytest.raises(BudgetExceededError):
+        list(agent.stream_results(research("run-3"), "heat pumps"))
+    assert agent.llm.calls == 0
+
+def test_spent_daily_budget_returns_previous_synthesis_of_an_update(make_agent):
+    agent = make_agent()
+    changes = store_previous(agent)
+    spend_daily_budget(agent)
+    synthesis = agent.process_results(research(changes=changes), "heat pumps")
+    assert synthesis["synthesis"] == "previous synthesis"
+    assert synthesis["metadata"]["mode"] == "previous"
+    assert synthesis["metadata"]["incremental"]["llm_skipped"]
+    assert agent.llm.calls == 0
+
+def test_update_over_the_run_budget_is_compacted_or_rejected(make_agent):
+    agent = make_agent(run_token_budget=1200)
+    changes = store_previous(agent)
+    changes["new"] = [canonicalize_url(s["url"]) for s in SOURCES]
+    synthesis = agent.process_results(research(changes=changes), "heat pumps")
+    assert synthesis["metadata"]["mode"] == "update_compact"
+    assert synthesis["metadata"]["packing"]["sources_out"] < len(SOURCES)
+    assert agent.llm.calls == 1
+
+    agent.settings.budget_action = "reject"
+    with pytest.raises(BudgetExceededError):
+        agent.process_results(research("run-3", changes=changes), "heat pumps")
+    assert agent.llm.calls == 1
@@ -0,0 +1,76 @@
+import json
+import logging
+import threading
+import pytest
+from utils import tracing
+from utils.tracing import (JsonLogExporter, OTLPFileExporter, PrometheusExporter, Trace, propagate, span,
+                           start_trace, use_trace)
+
+@pytest.fixture
+def exporters(monkeypatch):
+    installed = []
+    monkeypatch.setattr(tracing, "_exporters", installed)
+    return installed
+
+def test_spans_nest_and_record_errors_on_the_trace(exporters):
+    with start_trace("research") as trace:
+        with span("research.search", query_tokens=3) as outer:
+            with span("research.rerank") as inner:
+                inner.set(input_bytes=10)
+        with pytest.raises(ValueError):
+            with span("research.store"):
+                raise ValueError("disk full")
+    names = [s["name"] for s in trace.summary()]
+    assert names == ["research.search", "research.rerank", "research.store"]
+    spans = {s.name: s for s in trace.spans}
+    assert spans["research.rerank"].parent_id == outer.span_id
+    assert spans["research.rerank"].trace_id == trace.trace_id
+    assert spans["research.store"].status == "error" and spans["research.store"].error == "disk full"
+    assert trace.summary()[1]["input_bytes"] == 10
+
+def test_propagate_records_worker_thread_spans_on_the_callers_trace(exporters):
+    trace = Trace("synthesis")
+    with use_trace(trace):
+        def run():
+            with span("synthesis.map"):
+                pass
+        thread = threading.Thread(target=propagate(run))
+        thread.start()
+        thread.join(5)
+    assert [s.name for s in trace.spans] == ["synthesis.map"]
+
+def test_exporters_receive_finished_spans(exporters, tmp_path, caplog):
+    prometheus = PrometheusExporter(buckets=(0.1, 1.0))
+    otlp = OTLPFileExporter(tmp_path / "traces.jsonl")
+    exporters.extend([JsonLogExporter(), prometheus, otlp])
+    with caplog.at_level(logging.INFO, logger=tracing.__name__):
+        with span("llm.invoke", prompt_tokens=100, payload_bytes=2048, cached=False):
+            pass
+        with pytest.raises(RuntimeError):
+            with span("llm.invoke"):
+                raise RuntimeError("quota")
+
+    logged = [json.loads(r.getMessage()) for r in caplog.records]
+    assert [r["status"] for r in logged] == ["ok", "error"]
+
+    metrics = prometheus.render()
+    assert 'research_span_duration_seconds_bucket{span="llm.invoke",le="+Inf"} 2' in metrics
+    assert 'research_span_duration_seconds_bucket{span="llm.invoke",le="0.1"} 2' in metrics
+    assert 'research_span_errors_total{span="llm.invoke"} 1' in metrics
+    assert 'research_span_tokens_total{span="llm.invoke"} 100' in metrics
+    assert 'research_span_bytes_total{span="llm.invoke"} 2048' in metrics
+
+    lines = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    record = lines[0]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert record["name"] == "llm.invoke"
+    assert {"key": "prompt_tokens", "value": {"intValue": "100"}} in record["attributes"]
+    assert {"key": "cached", "value": {"boolValue": False}} in record["attributes"]
+    assert lines[1]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["status"] == {"code": 2, "message": "quota"}
+
+def test_a_failing_exporter_does_not_fail_the_stage(exporters):
+    class Broken:
+        def export(self, span):
+            raise OSError("collector unreachable")
+    exporters.append(Broken())
+    with span("research.search"):
+        pass
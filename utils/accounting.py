@@ -0,0 +1,189 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator
+import logging
+import threading
+from utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tavily API credits per search at each depth
+SEARCH_CREDITS = {"basic": 1, "advanced": 2}
+
+class BudgetExceededError(Exception):
+    """A run was rejected because it would exceed a configured token, search or cost budget"""
+
+class RunUsage:
+    """Tokens, LLM calls and searches used by one research or synthesis run"""
+
+    def __init__(self, stage: str, user: str):
+        self.stage = stage
+        self.user = user
+        self.run_id: Optional[str] = None
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.estimated_calls = 0
+        self.models: Dict[str, Dict[str, int]] = {}
+        self.searches: Dict[str, int] = {}
+        self.degraded: List[str] = []
+        self._lock = threading.Lock()
+
+    def add_llm(self, model: str, input_tokens: int, output_tokens: int, estimated: bool = False) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.estimated_calls += estimated
+            per_model = self.models.setdefault(model, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+            per_model["calls"] += 1
+            per_model["input_tokens"] += input_tokens
+            per_model["output_tokens"] += output_tokens
+
+    def add_search(self, search_depth: str) -> None:
+        with self._lock:
+            self.searches[search_depth] = self.searches.get(search_depth, 0) + 1
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def search_credits(self) -> int:
+        return sum(SEARCH_CREDITS.get(depth, 1) * count for depth, count in self.searches.items())
+
+    def cost(self, settings) -> float:
+        """Estimated cost in USD at the configured prices"""
+        return (self.input_tokens * settings.llm_input_cost_per_million / 1_000_000
+                + self.output_tokens * settings.llm_output_cost_per_million / 1_000_000
+                + self.search_credits * settings.tavily_cost_per_credit)
+
+    def to_dict(self, settings) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "user": self.user,
+                "llm_calls": self.llm_calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                # Calls whose provider reported no token counts are estimated from text length
+                "estimated_calls": self.estimated_calls,
+                "models": {model: dict(counts) for model, counts in self.models.items()},
+                "searches": dict(self.searches),
+                "search_credits": self.search_credits,
+                "cost_usd": round(self.cost(settings), 6),
+                "degraded": list(self.degraded)
+            }
+
+_current_usage: ContextVar[Optional[RunUsage]] = ContextVar("current_usage", default=None)
+_current_user: ContextVar[Optional[str]] = ContextVar("current_user", default=None)
+
+def current_usage() -> Optional[RunUsage]:
+    return _current_usage.get()
+
+@contextmanager
+def use_usage(usage: RunUsage) -> Iterator[RunUsage]:
+    """Record LLM calls and searches made in this context (and contexts copied from it) on usage"""
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        try:
+            _current_usage.reset(token)
+        except ValueError:
+            pass
+
+@contextmanager
+def acting_as(user: Optional[str]) -> Iterator[None]:
+    """Attribute runs started in this context to user instead of settings.current_user"""
+    token = _current_user.set(user)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+def current_user(settings) -> str:
+    return _current_user.get() or settings.current_user
+
+_handler_class = None
+
+def usage_callbacks(usage: Optional[RunUsage] = None) -> List[Any]:
+    """LangChain callbacks recording token usage of a chain's LLM calls on usage
+
+    Defaults to the usage of the current context; empty if there is none.
+    """
+    global _handler_class
+    usage = usage or current_usage()
+    if usage is None:
+        return []
+    if _handler_class is None:
+        # Imported on first use to keep LangChain off the CLI startup path
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class UsageCallbackHandler(BaseCallbackHandler):
+            """Record provider-reported token counts, estimating them when a provider has none"""
+
+            def __init__(self, usage: RunUsage):
+                self.usage = usage
+                self._prompts: Dict[Any, Dict[str, Any]] = {}
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+                params = kwargs.get("invocation_params") or {}
+                model = (params.get("model") or params.get("model_name")
+                         or (kwargs.get("metadata") or {}).get("ls_model_name")
+                         or ((serialized or {}).get("kwargs") or {}).get("model") or "unknown")
+                text = "\n".join(str(m.content) for batch in messages for m in batch)
+                self._prompts[run_id] = {"model": str(model).replace("models/", ""),
+                                         "tokens": estimate_tokens(text)}
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                prompt = self._prompts.pop(run_id, {"model": "unknown", "tokens": 0})
+                input_tokens = output_tokens = 0
+                reported = False
+                for generations in response.generations:
+                    for generation in generations:
+                        metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                        if metadata:
+                            input_tokens += metadata.get("input_tokens", 0)
+                            output_tokens += metadata.get("output_tokens", 0)
+                            reported = True
+                if not reported:
+                    token_usage = (response.llm_output or {}).get("token_usage") or {}
+                    if token_usage:
+                        input_tokens = token_usage.get("prompt_tokens", 0)
+                        output_tokens = token_usage.get("completion_tokens", 0)
+                        reported = True
+                if not reported:
+                    input_tokens = prompt["tokens"]
+                    output_tokens = sum(estimate_tokens(g.text) for gs in response.generations for g in gs)
+                self.usage.add_llm(prompt["model"], input_tokens, output_tokens, estimated=not reported)
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                self._prompts.pop(run_id, None)
+
+        _handler_class = UsageCallbackHandler
+    return [_handler_class(usage)]
+
+def today() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+def check_period_budget(settings, store, user: str) -> Optional[str]:
+    """Why user's daily budget is spent, or None if there is budget left"""
+    if not settings.daily_token_budget and not settings.daily_cost_budget:
+        return None
+    spent = store.usage_totals(user, today())
+    if settings.daily_token_budget and spent["tokens"] >= settings.daily_token_budget:
+        return f"daily token budget of {settings.daily_token_budget} spent by {user}"
+    if settings.daily_cost_budget and spent["cost_usd"] >= settings.daily_cost_budget:
+        return f"daily cost budget of ${settings.daily_cost_budget:.2f} spent by {user}"
+    return None
+
+def record_usage(settings, store, usage: RunUsage) -> Dict[str, Any]:
+    """Store a run's usage for per-user, per-day totals; returns it as a dict"""
+    summary = usage.to_dict(settings)
+    if usage.llm_calls or usage.searches:
+        try:
+            store.record_usage(usage.run_id, usage.stage, today(), summary)
+        except Exception as e:
+            logger.error(f"Failed to record usage: {str(e)}", exc_info=True)
+    return summary
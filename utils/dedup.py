@@ -0,0 +1,105 @@
+from typing import Dict, Any, List, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import hashlib
+import re
+import numpy as np
+
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid", "spm"}
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16  # 16 bands of 4 rows: pairs above ~0.5 Jaccard almost always share a band
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(20250228)
+_PERM_A = _rng.randint(1, 1 << 31, MINHASH_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, MINHASH_PERMUTATIONS).astype(np.uint64)
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so mirrors of the same page compare equal
+
+    Drops the scheme, "www." prefix, default ports, fragments, tracking parameters and
+    trailing slashes, and sorts the remaining query parameters.
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = re.sub(r"/+", "/", parts.path).rstrip("/")
+    if path.endswith(("/index.html", "/index.htm", "/index.php")):
+        path = path.rsplit("/", 1)[0]
+    return urlunsplit(("", host, path, urlencode(query), ""))
+
+def _shingles(text: str, size: int = 3) -> List[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature over word 3-shingles, computed for all permutations at once"""
+    shingles = set(_shingles(text))
+    if not shingles:
+        return np.full(MINHASH_PERMUTATIONS, _MERSENNE_PRIME, dtype=np.uint64)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    # (a * x + b) mod p stays below 2**63 because a < 2**31 and x < 2**32
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+def deduplicate_results(results: List[Dict[str, Any]],
+                        similarity: float = 0.8) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Drop results with the same canonical URL or near-duplicate content
+
+    Content counts as a near-duplicate when its estimated Jaccard similarity to a kept
+    result is at least similarity. The highest-scoring copy of each duplicate group is
+    kept and the original order is preserved. Candidate pairs come from MinHash LSH band
+    buckets, so the pass is roughly linear in the number of results.
+    """
+    ranked = sorted(range(len(results)), key=lambda i: results[i].get("score") or 0, reverse=True)
+    rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    seen_urls = set()
+    signatures: List[np.ndarray] = []
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    kept = set()
+    url_duplicates = 0
+    near_duplicates = 0
+
+    for index in ranked:
+        result = results[index]
+        url = canonicalize_url(result.get("url") or "")
+        if url and url in seen_urls:
+            url_duplicates += 1
+            continue
+
+        content = result.get("content") or ""
+        if content.strip():
+            signature = minhash(content)
+            bands = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(MINHASH_BANDS)]
+            candidates = {other for band in bands for other in buckets.get(band, ())}
+            if any(np.mean(signatures[other] == signature) >= similarity for other in candidates):
+                near_duplicates += 1
+                continue
+            for band in bands:
+                buckets.setdefault(band, []).append(len(signatures))
+            signatures.append(signature)
+
+        if url:
+            seen_urls.add(url)
+        kept.add(index)
+
+    stats = {
+        "input": len(results),
+        "kept": len(kept),
+        "url_duplicates": url_duplicates,
+        "near_duplicates": near_duplicates
+    }
+    return [result for i, result in enumerate(results) if i in kept], stats
@@ -0,0 +1,25 @@
+from typing import Dict, Type
+from requests.adapters import HTTPAdapter
+import requests
+import threading
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+def get_http_session(name: str, pool_size: int = 20,
+                     adapter_class: Type[HTTPAdapter] = HTTPAdapter) -> requests.Session:
+    """Return a process-wide keep-alive session for one purpose
+
+    Sessions are kept separate per name because clients such as TavilyClient add
+    credentials to the session headers, which must never leak to other hosts.
+    adapter_class is used when the session is first created.
+    """
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = adapter_class(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[name] = session
+        return session
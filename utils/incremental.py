@@ -0,0 +1,39 @@
+from typing import Dict, Any, List, Iterable
+import hashlib
+from utils.dedup import canonicalize_url
+
+def _sources(research: Dict[str, Any]) -> List[Dict[str, Any]]:
+    results = research.get("results", {})
+    return list(results.get("results", [])) if isinstance(results, dict) else []
+
+def content_hash(source: Dict[str, Any]) -> str:
+    """Hash of a source's content, ignoring whitespace differences"""
+    content = " ".join((source.get("content") or "").split())
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+def fingerprints(research: Dict[str, Any]) -> Dict[str, str]:
+    """Map each source's canonical URL to its content hash"""
+    return {canonicalize_url(s.get("url") or ""): content_hash(s) for s in _sources(research) if s.get("url")}
+
+def diff_research(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Compare the sources of two research payloads by canonical URL and content hash
+
+    Returns the previous run ID, the canonical URLs of new, changed and removed
+    sources, and the number of unchanged ones.
+    """
+    before = fingerprints(previous)
+    after = fingerprints(current)
+    return {
+        "previous_run_id": previous["run_id"],
+        "new": sorted(url for url in after if url not in before),
+        "changed": sorted(url for url in after if url in before and before[url] != after[url]),
+        "removed": sorted(url for url in before if url not in after),
+        "unchanged": sum(1 for url in after if before.get(url) == after[url])
+    }
+
+def select_sources(research: Dict[str, Any], urls: Iterable[str]) -> Dict[str, Any]:
+    """Copy of a research payload keeping only the sources with the given canonical URLs"""
+    wanted = set(urls)
+    results = research.get("results", {})
+    kept = [s for s in _sources(research) if canonicalize_url(s.get("url") or "") in wanted]
+    return dict(research, results=dict(results, results=kept))
@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from utils.accounting import acting_as
+from utils.run_scheduler import PRIORITIES, normalize_priority, run_priority
+
+logger = logging.getLogger(__name__)
+
+# Share of overall job progress (start, end percent) covered by each pipeline stage
+STAGE_PROGRESS = {"research": (0, 50), "synthesis": (50, 100)}
+FINISHED_STATUSES = ("succeeded", "failed", "interrupted")
+MAX_JOBS_IN_MEMORY = 200
+# Seconds between heartbeats on a process's unfinished jobs; other processes treat jobs
+# whose heartbeat is older than JOB_STALE_AFTER as orphaned
+JOB_HEARTBEAT_INTERVAL = 30.0
+JOB_STALE_AFTER = 4 * JOB_HEARTBEAT_INTERVAL
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+def is_orphaned(owner: Optional[str], heartbeat: Optional[float]) -> bool:
+    """Whether the process that owns a queued or running job is gone
+
+    Owners are "host:pid:token". A job owned by a dead process on this host is orphaned
+    at once; any other owner must have missed heartbeats for JOB_STALE_AFTER seconds.
+    Jobs saved without an owner, by versions that didn't record one, are orphaned.
+    """
+    if not owner or heartbeat is None:
+        return True
+    if time.time() - heartbeat > JOB_STALE_AFTER:
+        return True
+    host, pid, _ = owner.rsplit(":", 2)
+    # os.kill(pid, 0) would terminate the process on Windows
+    return host == socket.gethostname() and os.name != "nt" and not _pid_alive(int(pid))
+
+class JobManager:
+    """Run research jobs in a bounded worker pool and track their status and progress
+
+    Job state lives in memory while the job runs and is persisted to the research store
+    on every phase change, so a UI can reattach to a job after a page refresh. Each
+    priority class has its own worker pool, so queued batch jobs never hold up
+    interactive ones before they reach the run scheduler.
+
+    Several processes may share the store. Each manager records itself as the owner of
+    its jobs and keeps their heartbeat fresh, and on startup interrupts only the jobs
+    whose owner is gone.
+    """
+
+    def __init__(self, research_agent, synthesis_agent, store, max_workers: int):
+        self.research_agent = research_agent
+        self.synthesis_agent = synthesis_agent
+        self.store = store
+        self._executors = {
+            priority: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"research-job-{priority}")
+            for priority in PRIORITIES
+        }
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        interrupted = store.interrupt_orphaned_jobs(is_orphaned)
+        if interrupted:
+            logger.warning(f"Marked {interrupted} unfinished jobs of stopped processes as interrupted")
+        threading.Thread(target=self._heartbeat, name="research-job-heartbeat", daemon=True).start()
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                self.store.heartbeat_jobs(self.owner)
+            except Exception as e:
+                logger.error(f"Failed to record job heartbeat: {str(e)}")
+
+    def submit(self, query: str, depth: str, user: Optional[str] = None, priority: str = "interactive") -> str:
+        """Queue a research + synthesis job in a priority class (interactive or batch) and return its ID"""
+        if not query or not isinstance(query, str):
+            raise ValueError("Query must be a non-empty string")
+        priority = normalize_priority(priority)
+        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "query": query,
+            "depth": depth,
+            "user": user,
+            "priority": priority,
+            "status": "queued",
+            "stage": None,
+            "progress": 0,
+            "message": "Waiting for a free worker...",
+            "partial_synthesis": "",
+            "run_id": None,
+            "result": None,
+            "error": None,
+            "created_at": timestamp,
+            "updated_at": timestamp
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job["job_id"]] = job
+        self.store.save_job(job, self.owner)
+        self._executors[priority].submit(self._run, job["job_id"])
+        return job["job_id"]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of a job, from memory if it ran in this process"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self.store.get_job(job_id)
+
+    def active_count(self) -> int:
+        """Number of jobs queued or running in this process"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+
+    def _prune(self) -> None:
+        """Drop finished jobs from memory once there are too many; they remain in the store"""
+        if len(self._jobs) < MAX_JOBS_IN_MEMORY:
+            return
+        for job_id in [j for j, job in self._jobs.items() if job["status"] in FINISHED_STATUSES]:
+            del self._jobs[job_id]
+
+    def list_jobs(self, user: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.store.list_jobs(user=user, limit=limit)
+
+    def _update(self, job_id: str, persist: bool = True, **fields) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
+            snapshot = dict(job)
+        if persist:
+            try:
+                self.store.save_job(snapshot, self.owner)
+            except Exception as e:
+                logger.error(f"Failed to persist job {job_id}: {str(e)}", exc_info=True)
+
+    def _progress(self, job_id: str):
+        def report(stage: str, fraction: float, message: str) -> None:
+            start, end = STAGE_PROGRESS.get(stage, (0, 100))
+            self._update(job_id, stage=stage, progress=int(start + (end - start) * fraction), message=message)
+        return report
+
+    def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        progress = self._progress(job_id)
+        self._update(job_id, status="running", message="Starting research...")
+        try:
+            with acting_as(job["user"]), run_priority(job["priority"]):
+                research_start = time.time()
+                research_results = self.research_agent.execute(job["query"], job["depth"], progress)
+                research_time = time.time() - research_start
+                self._update(job_id, run_id=research_results["run_id"])
+
+                synthesis_start = time.time()
+                stream = self.synthesis_agent.stream_results(research_results, job["query"], progress)
+                text = ""
+                for chunk in stream:
+                    text += chunk
+                    # Partial text is served from memory; it is persisted with the final result
+                    self._update(job_id, persist=False, partial_synthesis=text)
+                synthesis_time = time.time() - synthesis_start
+
+            self._update(
+                job_id,
+                status="succeeded",
+                progress=100,
+                message="Final results ready!",
+                result={
+                    "query": job["query"],
+                    "timestamp": job["created_at"],
+                    "user": job["user"],
+                    "research_time": f"{research_time:.2f}s",
+                    "synthesis_time": f"{synthesis_time:.2f}s",
+                    "depth": job["depth"],
+                    "results": stream.result,
+                    "timings": {
+                        "research": research_results.get("timings", []),
+                        "synthesis": stream.result["metadata"].get("timings", [])
+                    }
+                }
+            )
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+            self._update(job_id, status="failed", error=str(e), message="Research failed")
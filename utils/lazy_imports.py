@@ -0,0 +1,24 @@
+from typing import Tuple
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def _import_all(modules: Tuple[str, ...]) -> None:
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            # The stage that needs the module will raise a proper error when it imports it
+            logger.debug(f"Background import of {module} failed: {str(e)}")
+
+def preload(*modules: str) -> threading.Thread:
+    """Import modules in a daemon thread, e.g. while the main thread waits on the network
+
+    Python's per-module import locks make a later import in the main thread wait for a
+    preload already in progress instead of importing the module twice.
+    """
+    thread = threading.Thread(target=_import_all, args=(modules,), name="preload-imports", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,101 @@
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import logging
+from utils.outbound import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Settings field holding the model for each pipeline stage; "reduce" is the intermediate
+# collapse of map summaries, while the final reduce prompt is the "synthesis" stage
+STAGE_MODELS = {
+    "plan": "research_agent_model",
+    "follow_up": "research_agent_model",
+    "map": "map_model",
+    "reduce": "map_model",
+    "synthesis": "synthesis_agent_model"
+}
+
+FAKE_RESPONSE = (
+    "Summary of the main findings: the sources agree on the central points of the topic.\n"
+    "Key points: adoption is growing, costs are falling and open questions remain."
+)
+
+# A backend factory takes settings, a model name and generation parameters (temperature,
+# top_p, top_k, max_output_tokens) and returns a LangChain chat model
+BackendFactory = Callable[..., Any]
+_backends: Dict[str, BackendFactory] = {}
+
+def register_backend(name: str, factory: BackendFactory) -> None:
+    """Make a chat model backend available to create_llm and model specs as "name:model" """
+    _backends[name.lower()] = factory
+
+def backend_names() -> List[str]:
+    return sorted(_backends)
+
+def model_for(settings, stage: str) -> str:
+    """Model spec configured for a pipeline stage"""
+    return getattr(settings, STAGE_MODELS[stage])
+
+def scheduler_for(settings, stage: str):
+    """Outbound scheduler of the backend serving a pipeline stage; each backend has its own"""
+    backend, _ = parse_model_spec(settings, model_for(settings, stage))
+    return get_scheduler(backend, settings)
+
+def parse_model_spec(settings, spec: str) -> Tuple[str, str]:
+    """Split "backend:model" into its parts; a bare model name uses settings.llm_backend
+
+    Names whose prefix isn't a registered backend, like "llama3:8b", are model names.
+    """
+    backend, sep, model = spec.partition(":")
+    if sep and backend.lower() in _backends:
+        return backend.lower(), model
+    return settings.llm_backend.lower(), spec
+
+def create_llm(settings, spec: str, **params):
+    """Create a chat model for a model spec with the given generation parameters"""
+    backend, model = parse_model_spec(settings, spec)
+    factory = _backends.get(backend)
+    if factory is None:
+        raise ValueError(f"Unknown LLM backend '{backend}'; expected one of {', '.join(backend_names())}")
+    return factory(settings, model, **params)
+
+def _gemini(settings, model: str, **params):
+    from utils.llm_setup import create_gemini_llm
+    return create_gemini_llm(api_key=settings.google_api_key.get_secret_value(), model_name=model, **params)
+
+def _openai(settings, model: str, temperature: float = 0.7, top_p: Optional[float] = None,
+            top_k: Optional[int] = None, max_output_tokens: Optional[int] = None):
+    """Any OpenAI-compatible chat completions endpoint, e.g. a local vLLM or Ollama server"""
+    try:
+        from langchain_openai import ChatOpenAI
+    except ImportError:
+        raise ImportError("The openai LLM backend needs the langchain-openai package: pip install langchain-openai")
+    # OpenAI-compatible APIs have no top_k; local servers often accept any API key
+    return ChatOpenAI(
+        model=model,
+        base_url=settings.llm_base_url or None,
+        api_key=settings.llm_api_key.get_secret_value() or "not-needed",
+        temperature=temperature,
+        top_p=top_p,
+        max_tokens=max_output_tokens
+    )
+
+def _fake(settings, model: str, **params):
+    """Canned replies for offline runs; makes no network calls"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    return FakeListChatModel(responses=[FAKE_RESPONSE])
+
+register_backend("gemini", _gemini)
+register_backend("openai", _openai)
+register_backend("fake", _fake)
+
+def _batch_inputs(chain, max_concurrency: int):
+    def run(items: List[Dict[str, Any]]) -> List[Any]:
+        return chain.batch(items, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+    return run
+
+def run_batch(scheduler, chain, inputs: List[Dict[str, Any]], max_concurrency: int) -> List[Any]:
+    """Invoke chain on many inputs with one concurrent .batch call through scheduler
+
+    Each input takes a rate-limit token; inputs that fail are retried individually.
+    """
+    return scheduler.call_batch(_batch_inputs(chain, max_concurrency), chain.invoke, inputs)
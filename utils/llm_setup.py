@@ -1,4 +1,3 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from typing import Optional
 
 def create_gemini_llm(
@@ -12,6 +11,8 @@ def create_gemini_llm(
     """
     Create a Gemini LLM instance with specified parameters
     """
+    # Imported on first use: langchain_google_genai takes seconds to import
+    from langchain_google_genai import ChatGoogleGenerativeAI
     return ChatGoogleGenerativeAI(
         google_api_key=api_key,
         model=model_name,
@@ -21,4 +22,17 @@ def create_gemini_llm(
         max_output_tokens=max_output_tokens,
         # Remove the deprecated parameter
         convert_system_message_to_human=False
-    )
\ No newline at end of file
+    )
+
+def create_tavily_client(api_key: str, session=None):
+    """
+    Create a Tavily client, reusing a pooled HTTP session where the client supports it
+    """
+    from tavily import TavilyClient
+    if session is not None:
+        try:
+            return TavilyClient(api_key=api_key, session=session)
+        except TypeError:
+            # Older tavily-python releases manage their own connections
+            pass
+    return TavilyClient(api_key=api_key)
@@ -0,0 +1,486 @@
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import copy_context
+from typing import Dict, Any, Callable, Iterator, Optional, List, Tuple
+import logging
+import queue
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Client exceptions for throttling and outages that may not carry a status code
+RETRYABLE_ERROR_TYPES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                         "DeadlineExceeded", "RateLimitError", "APITimeoutError", "APIConnectionError",
+                         "ConnectTimeout", "ReadTimeout", "ConnectError", "RemoteProtocolError"}
+RETRYABLE_MESSAGES = ("rate limit", "quota", "resource exhausted", "resourceexhausted",
+                      "timed out", "timeout", "unavailable", "too many requests")
+
+class CircuitOpenError(Exception):
+    """Raised when a provider's circuit breaker is rejecting calls"""
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call cannot complete within its deadline"""
+
+class TokenBucket:
+    """Thread-safe token bucket that refills at rate tokens per second up to capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take one token, waiting up to timeout seconds for the bucket to refill"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """Open after consecutive failures, then allow a single trial call once reset_timeout has passed"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[str]:
+        """Return the state a call is admitted in ("closed", or "half-open" for the trial
+        call), or None if it is rejected"""
+        with self._lock:
+            if self.state == "closed":
+                return "closed"
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                return "half-open"
+            # Either open, or half-open with the trial call still in flight
+            return None
+
+    def release(self, admitted: Optional[str]) -> None:
+        """Settle a call that ended without an outcome, e.g. one that never got a rate-limit
+        token; a trial call puts the breaker back to open so a later call can try again"""
+        with self._lock:
+            if admitted == "half-open" and self.state == "half-open":
+                self.state = "open"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status of a provider error, from the attributes the common client libraries set"""
+    response = getattr(error, "response", None)
+    for status in (getattr(error, "status_code", None), getattr(error, "code", None),
+                   getattr(response, "status_code", None), getattr(response, "status", None)):
+        if isinstance(status, int):
+            return status
+        # google.api_core errors expose an enum-like code with a numeric value
+        value = getattr(status, "value", None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    return None
+
+def is_retryable(error: Exception) -> bool:
+    """Classify timeouts, connection errors, 429 and 5xx responses as retryable
+
+    Errors carrying a status code are classified by it alone; the message is only
+    checked for errors without one, and never for bare status numbers, which also
+    appear in URLs, ids and token counts.
+    """
+    if isinstance(error, (TimeoutError, FutureTimeoutError, ConnectionError)):
+        return True
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    if type(error).__name__ in RETRYABLE_ERROR_TYPES:
+        return True
+    message = str(error).lower()
+    return any(text in message for text in RETRYABLE_MESSAGES)
+
+_PENDING = object()
+
+class _Attempt:
+    """One submitted call, timed from when a worker starts running it"""
+    __slots__ = ("future", "started", "started_at")
+
+    def __init__(self):
+        self.future: Optional[Future] = None
+        self.started = threading.Event()
+        self.started_at = 0.0
+
+class OutboundScheduler:
+    """Rate-limited, retrying, circuit-broken executor for calls to one provider
+
+    Attempts run on the scheduler's own pool of max_in_flight workers. An attempt
+    that outlives attempt_timeout can't be cancelled, so the call keeps waiting for
+    it until its deadline rather than retrying alongside it; once the deadline
+    passes it is abandoned but keeps its in-flight slot until it finishes.
+    """
+
+    def __init__(self, provider: str, rate: float, burst: int, max_retries: int,
+                 attempt_timeout: float, backoff_base: float, backoff_max: float,
+                 failure_threshold: int, reset_timeout: float, max_in_flight: int = 16):
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.attempt_timeout = attempt_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_in_flight = max(1, max_in_flight)
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "rejected": 0,
+                      "slow": 0, "abandoned": 0}
+        self._stats_lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                            thread_name_prefix=f"outbound-{provider}")
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _submit(self, fn: Callable, args: tuple, kwargs: Dict[str, Any], expires: float) -> _Attempt:
+        """Start fn on a worker once one of the provider's in-flight slots is free"""
+        remaining = expires - time.monotonic()
+        if remaining <= 0 or not self._in_flight.acquire(timeout=remaining):
+            raise DeadlineExceededError(
+                f"{self.provider} has {self.max_in_flight} calls in flight; none finished in time"
+            )
+        attempt = _Attempt()
+        context = copy_context()
+
+        def run():
+            attempt.started_at = time.monotonic()
+            attempt.started.set()
+            return context.run(fn, *args, **kwargs)
+
+        try:
+            attempt.future = self._executor.submit(run)
+        except Exception:
+            self._in_flight.release()
+            raise
+        attempt.future.add_done_callback(lambda _: self._in_flight.release())
+        return attempt
+
+    def _wait(self, attempt: _Attempt, get: Callable[[float], Any], timeout: float, expires: float) -> Any:
+        """Wait for get() to produce an attempt's outcome, allowing timeout seconds from when
+        the attempt started running rather than from when it was queued
+
+        Past that the attempt is reported as slow and waited for until expires, since
+        retrying would only run a duplicate next to it. get(seconds) returns _PENDING
+        if nothing arrived in time.
+        """
+        if not attempt.started.wait(max(expires - time.monotonic(), 0)):
+            attempt.future.cancel()
+            raise DeadlineExceededError(f"{self.provider} call did not start before its deadline")
+        value = get(max(min(attempt.started_at + timeout, expires) - time.monotonic(), 0))
+        if value is _PENDING and time.monotonic() < expires:
+            self._count("slow")
+            logger.warning(f"{self.provider} call still running after {timeout:.1f}s; waiting for it instead of retrying")
+            value = get(max(expires - time.monotonic(), 0))
+        if value is _PENDING:
+            self._count("abandoned")
+            raise DeadlineExceededError(
+                f"{self.provider} call still running after {time.monotonic() - attempt.started_at:.1f}s; abandoned"
+            )
+        return value
+
+    def _result(self, attempt: _Attempt, timeout: float, expires: float) -> Any:
+        def get(seconds: float) -> Any:
+            try:
+                return attempt.future.result(timeout=seconds)
+            except FutureTimeoutError:
+                if attempt.future.done():
+                    # fn itself raised a TimeoutError
+                    raise
+                return _PENDING
+
+        return self._wait(attempt, get, timeout, expires)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps concurrent retries from synchronising into bursts
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, fn: Callable, *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        """Run fn with rate limiting, per-attempt timeouts and jittered exponential backoff
+
+        deadline is the total number of seconds the call may take including retries;
+        it defaults to attempt_timeout * (max_retries + 1).
+        """
+        self._count("calls")
+        if deadline is None:
+            deadline = self.attempt_timeout * (self.max_retries + 1)
+        expires = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            admitted = self.breaker.allow()
+            if not admitted:
+                self._count("rejected")
+                raise CircuitOpenError(f"{self.provider} circuit is open; call rejected")
+
+            remaining = expires - time.monotonic()
+            if remaining <= 0 or not self.bucket.acquire(timeout=remaining):
+                self.breaker.release(admitted)
+                self._count("failures")
+                raise DeadlineExceededError(f"{self.provider} call exceeded its {deadline:.1f}s deadline")
+
+            self._count("attempts")
+            try:
+                result = self._result(self._submit(fn, args, kwargs, expires), self.attempt_timeout, expires)
+                self.breaker.record_success()
+                return result
+            except DeadlineExceededError as e:
+                # Out of time, or the attempt is still running: either way there is nothing to retry
+                self.breaker.record_failure()
+                self._count("failures")
+                raise e
+            except Exception as e:
+                error = e
+            except BaseException:
+                # Interrupted without an outcome
+                self.breaker.release(admitted)
+                raise
+
+            retryable = is_retryable(error)
+            if retryable:
+                self.breaker.record_failure()
+            else:
+                # The provider answered, so it is healthy even though the request was rejected
+                self.breaker.record_success()
+            if not retryable or attempt >= self.max_retries:
+                self._count("failures")
+                raise error
+
+            delay = self._backoff(attempt)
+            if time.monotonic() + delay >= expires:
+                self._count("failures")
+                raise error
+            attempt += 1
+            self._count("retries")
+            logger.warning(f"{self.provider} call failed ({str(error)}); retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+
+    def _reserve(self, count: int) -> Tuple[float, str]:
+        """Take count rate-limit tokens for a batch; returns the batch's deadline, which is
+        as long as call() would wait, and the breaker state it was admitted in"""
+        admitted = self.breaker.allow()
+        if not admitted:
+            self._count("rejected")
+            raise CircuitOpenError(f"{self.provider} circuit is open; batch rejected")
+        expires = time.monotonic() + self.attempt_timeout * (self.max_retries + 1)
+        for _ in range(count):
+            remaining = expires - time.monotonic()
+            if remaining <= 0 or not self.bucket.acquire(timeout=remaining):
+                self.breaker.release(admitted)
+                self._count("failures")
+                raise DeadlineExceededError(f"{self.provider} rate limit wait exceeded for a batch of {count}")
+        self._count("calls")
+        self._count("attempts")
+        return expires, admitted
+
+    def _settle(self, results: List[Any]) -> List[int]:
+        """Record a batch outcome on the breaker; returns the indexes of failed inputs"""
+        failed = [i for i, result in enumerate(results) if isinstance(result, Exception)]
+        if any(is_retryable(results[i]) for i in failed) and len(failed) == len(results):
+            self.breaker.record_failure()
+        else:
+            # Some inputs succeeded, or the provider answered and rejected them all
+            self.breaker.record_success()
+        if failed:
+            self._count("retries")
+        return failed
+
+    def call_batch(self, batch_fn: Callable[[List[Any]], List[Any]], single_fn: Callable[[Any], Any],
+                   inputs: List[Any]) -> List[Any]:
+        """Run many calls in one batch_fn call, taking one rate-limit token per input
+
+        batch_fn must return a result or an exception per input, e.g. a Runnable's batch
+        with return_exceptions=True. Failed inputs are retried one at a time through
+        call() with single_fn, so one transient error doesn't repeat the whole batch.
+        The batch holds one in-flight slot.
+        """
+        if not inputs:
+            return []
+        expires, admitted = self._reserve(len(inputs))
+        try:
+            attempt = self._submit(batch_fn, (inputs,), {}, expires)
+            results = list(self._result(attempt, self.attempt_timeout * len(inputs), expires))
+        except DeadlineExceededError:
+            # The batch may still be running; retrying its inputs would duplicate it
+            self.breaker.record_failure()
+            self._count("failures")
+            raise
+        except Exception as e:
+            results = [e] * len(inputs)
+        except BaseException:
+            # Interrupted without an outcome
+            self.breaker.release(admitted)
+            raise
+        for i in self._settle(results):
+            results[i] = self.call(single_fn, inputs[i])
+        return results
+
+    @staticmethod
+    def _pump(fn: Callable[..., Iterator[Any]], args: tuple, kwargs: Dict[str, Any],
+              chunks: "queue.Queue", stop: threading.Event) -> None:
+        """Feed a streaming call's chunks to the consumer until it ends or the consumer stops"""
+        try:
+            iterator = fn(*args, **kwargs)
+            try:
+                for chunk in iterator:
+                    chunks.put(("chunk", chunk))
+                    if stop.is_set():
+                        break
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+            chunks.put(("done", None))
+        except Exception as e:
+            chunks.put(("error", e))
+
+    def stream(self, fn: Callable[..., Iterator[Any]], *args, deadline: Optional[float] = None,
+               **kwargs) -> Iterator[Any]:
+        """Rate-limit and retry a streaming call until its first chunk arrives
+
+        deadline bounds the wait for the first chunk including retries and defaults to
+        attempt_timeout * (max_retries + 1); after that each chunk must arrive within
+        attempt_timeout of the one before. Once chunks have been yielded a failure is
+        raised to the caller rather than retried, since the consumer has already seen
+        partial output.
+        """
+        self._count("calls")
+        if deadline is None:
+            deadline = self.attempt_timeout * (self.max_retries + 1)
+        expires = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            admitted = self.breaker.allow()
+            if not admitted:
+                self._count("rejected")
+                raise CircuitOpenError(f"{self.provider} circuit is open; call rejected")
+            remaining = expires - time.monotonic()
+            if remaining <= 0 or not self.bucket.acquire(timeout=remaining):
+                self.breaker.release(admitted)
+                self._count("failures")
+                raise DeadlineExceededError(f"{self.provider} stream exceeded its {deadline:.1f}s deadline")
+
+            self._count("attempts")
+            chunks: queue.Queue = queue.Queue()
+            stop = threading.Event()
+
+            def get(seconds: float) -> Any:
+                try:
+                    return chunks.get(timeout=seconds)
+                except queue.Empty:
+                    return _PENDING
+
+            started = settled = False
+            try:
+                pump = self._submit(self._pump, (fn, args, kwargs, chunks, stop), {}, expires)
+                kind, value = self._wait(pump, get, self.attempt_timeout, expires)
+                while kind == "chunk":
+                    if not started:
+                        # The provider is answering; settle now, as the consumer may
+                        # close the stream before it ends
+                        self.breaker.record_success()
+                        started = settled = True
+                    yield value
+                    item = get(self.attempt_timeout)
+                    if item is _PENDING:
+                        self._count("abandoned")
+                        raise DeadlineExceededError(
+                            f"{self.provider} stream sent nothing for {self.attempt_timeout:.1f}s; abandoned"
+                        )
+                    kind, value = item
+                if kind == "error":
+                    raise value
+                self.breaker.record_success()
+                settled = True
+                return
+            except DeadlineExceededError:
+                # Out of time, or the stream is still running: either way there is nothing to retry
+                self.breaker.record_failure()
+                settled = True
+                self._count("failures")
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                elif not started:
+                    self.breaker.record_success()
+                settled = True
+                if started or not retryable or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = self._backoff(attempt)
+                if time.monotonic() + delay >= expires:
+                    self._count("failures")
+                    raise
+                attempt += 1
+                self._count("retries")
+                logger.warning(f"{self.provider} stream failed ({str(e)}); retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+            finally:
+                stop.set()
+                if not settled:
+                    self.breaker.release(admitted)
+
+_schedulers: Dict[str, OutboundScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(provider: str, settings) -> OutboundScheduler:
+    """Return the process-wide scheduler for provider ("tavily" or an LLM backend name)
+
+    Providers without rate limit settings of their own, like the openai and fake LLM
+    backends, use llm_rate_limit and llm_burst.
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(provider)
+        if scheduler is None:
+            scheduler = OutboundScheduler(
+                provider=provider,
+                rate=getattr(settings, f"{provider}_rate_limit", settings.llm_rate_limit),
+                burst=getattr(settings, f"{provider}_burst", settings.llm_burst),
+                max_retries=settings.max_retries,
+                attempt_timeout=settings.request_timeout,
+                backoff_base=settings.retry_backoff_base,
+                backoff_max=settings.retry_backoff_max,
+                failure_threshold=settings.circuit_failure_threshold,
+                reset_timeout=settings.circuit_reset_timeout,
+                max_in_flight=settings.max_in_flight
+            )
+            _schedulers[provider] = scheduler
+        return scheduler
+
+def reset_schedulers() -> None:
+    """Forget process-wide schedulers so the next get_scheduler call starts fresh"""
+    with _schedulers_lock:
+        _schedulers.clear()
@@ -0,0 +1,445 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from utils.http_pool import get_http_session
+from utils.tokens import split_text
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "deep-research-assistant/1.0 (+page fetcher)"
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+READ_CHUNK_BYTES = 64 * 1024
+MAX_REDIRECTS = 5
+# Hosts whose concurrency limit and robots.txt rules are remembered; least recently used go first
+MAX_TRACKED_HOSTS = 1024
+# Seconds a site's robots.txt rules are reused, and how soon to retry one that couldn't be read
+ROBOTS_TTL = 60 * 60
+ROBOTS_RETRY = 60
+# RFC 9309 asks crawlers to parse at least the first 500 KiB of a robots.txt
+ROBOTS_MAX_BYTES = 512 * 1024
+
+# Elements whose text is never part of the main content
+SKIP_TAGS = {"script", "style", "noscript", "svg", "nav", "header", "footer", "aside", "form",
+             "iframe", "template", "button", "select"}
+# Elements that end a block of text
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5",
+              "h6", "blockquote", "pre", "table", "tr", "td", "th", "dd", "dt", "figcaption", "br", "hr"}
+# Blocks shorter than this are menus, buttons and captions rather than content
+MIN_BLOCK_CHARS = 40
+# Prefer <article>/<main> text when it has at least this much
+MIN_MAIN_CHARS = 200
+
+class _TextExtractor(HTMLParser):
+    """Collect text blocks, separately for the whole page and for <article>/<main>"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[str] = []
+        self.main_blocks: List[str] = []
+        self._parts: List[str] = []
+        self._skip = 0
+        self._main = 0
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._parts).split())
+        self._parts = []
+        if len(text) >= MIN_BLOCK_CHARS:
+            self.blocks.append(text)
+            if self._main:
+                self.main_blocks.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        if tag in ("article", "main"):
+            self._main += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        if tag in ("article", "main"):
+            self._main = max(0, self._main - 1)
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._parts.append(data)
+
+def extract_main_text(html: str) -> str:
+    """Main text of an HTML page as paragraphs separated by blank lines
+
+    Scripts, navigation, headers, footers and short fragments are dropped; text inside
+    <article> or <main> is used on its own when there is enough of it.
+    """
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    parser._flush()
+    blocks = parser.main_blocks if sum(map(len, parser.main_blocks)) >= MIN_MAIN_CHARS else parser.blocks
+    return "\n\n".join(blocks)
+
+class FetchBlockedError(Exception):
+    """A URL was not fetched because it isn't a public address or its site's robots.txt disallows it"""
+
+def _public_address(host: str, address: str) -> None:
+    """Raise FetchBlockedError unless address is a public one"""
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if not ip.is_global:
+        raise FetchBlockedError(f"{host} resolves to non-public address {ip}")
+
+class _PublicPeerMixin:
+    """Close a new connection before anything is sent on it unless its peer is public
+
+    The check runs on the address actually connected to, so a DNS answer that changes
+    between PageFetcher's own lookup and the connection (DNS rebinding) can't steer a
+    request to a private host. The Host header, SNI and certificate checks still use
+    the URL's host name.
+    """
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        try:
+            _public_address(self.host, sock.getpeername()[0])
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+class _PublicHTTPConnection(_PublicPeerMixin, HTTPConnection):
+    pass
+
+class _PublicHTTPSConnection(_PublicPeerMixin, HTTPSConnection):
+    pass
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+class PublicAddressAdapter(HTTPAdapter):
+    """Transport adapter whose connections, redirects and pooled ones included, only
+    reach public addresses"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _PublicHTTPConnectionPool,
+                                                   "https": _PublicHTTPSConnectionPool}
+
+class _Host:
+    """Concurrency limit and robots.txt rules of one host"""
+    __slots__ = ("semaphore", "users", "robots", "robots_expires", "robots_lock")
+
+    def __init__(self, per_host: int):
+        self.semaphore = threading.BoundedSemaphore(max(1, per_host))
+        self.users = 0
+        self.robots: Optional[RobotFileParser] = None
+        self.robots_expires = 0.0
+        self.robots_lock = threading.Lock()
+
+class PageCache:
+    """On-disk cache of extracted page text keyed by URL, with the validators to revalidate it"""
+
+    def __init__(self, cache_dir: Path, ttl: int, max_bytes: int):
+        self.cache_dir = Path(cache_dir) / "pages"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> "PageCache":
+        return cls(settings.cache_dir, settings.fetch_cache_ttl, settings.fetch_cache_max_mb * 1024 * 1024)
+
+    def _path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for url, fresh or stale; None if there is none"""
+        try:
+            with self._path(url).open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable page cache entry for {url}: {str(e)}")
+            self._path(url).unlink(missing_ok=True)
+            return None
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("fetched_at", 0) <= self.ttl
+
+    def set(self, url: str, entry: Dict[str, Any]) -> None:
+        file_path = self._path(url)
+        tmp_path = file_path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(dict(entry, url=url), f, ensure_ascii=False)
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            logger.error(f"Failed to write page cache entry: {str(e)}", exc_info=True)
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently written entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            for file_path in self.cache_dir.glob("*.json"):
+                try:
+                    stat = file_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, file_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                file_path.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            for file_path in self.cache_dir.glob("*.json"):
+                file_path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            files = list(self.cache_dir.glob("*.json"))
+            return {"entries": len(files), "size_bytes": sum(f.stat().st_size for f in files if f.exists())}
+
+class PageFetcher:
+    """Download pages concurrently with per-host limits and turn them into text chunks
+
+    Bodies are streamed and cut at max_bytes; each download must finish within timeout
+    seconds. Extracted text is cached by URL and revalidated with its ETag or
+    Last-Modified date once older than the cache TTL. Every request, redirects included,
+    must resolve to public addresses unless allow_private is set, and pages a site's
+    robots.txt disallows are skipped when respect_robots is set. Without allow_private
+    the session should mount PublicAddressAdapter, as from_settings does, so the
+    address is checked again on the connection itself.
+    """
+
+    def __init__(self, session: requests.Session, cache: Optional[PageCache], concurrency: int,
+                 per_host: int, timeout: float, max_bytes: int, chunk_tokens: int, max_chunks: int,
+                 allow_private: bool = False, respect_robots: bool = True):
+        self.session = session
+        self.cache = cache
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.chunk_tokens = chunk_tokens
+        self.max_chunks = max_chunks
+        self.allow_private = allow_private
+        self.respect_robots = respect_robots
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="page-fetch")
+        self._hosts: "OrderedDict[str, _Host]" = OrderedDict()
+        self._hosts_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> "PageFetcher":
+        return cls(
+            # A session of its own: the Tavily session carries the API key in its headers
+            session=get_http_session("pages-private", settings.http_pool_size) if settings.fetch_allow_private
+            else get_http_session("pages", settings.http_pool_size, PublicAddressAdapter),
+            cache=PageCache.from_settings(settings) if settings.fetch_cache_enabled else None,
+            concurrency=settings.fetch_concurrency,
+            per_host=settings.fetch_per_host,
+            timeout=settings.fetch_timeout,
+            max_bytes=settings.fetch_max_bytes,
+            chunk_tokens=settings.fetch_chunk_tokens,
+            max_chunks=settings.fetch_max_chunks,
+            allow_private=settings.fetch_allow_private,
+            respect_robots=settings.fetch_respect_robots
+        )
+
+    def _host(self, netloc: str, use: bool = False) -> _Host:
+        """The record for a host, forgetting the least recently used idle hosts beyond the cap"""
+        with self._hosts_lock:
+            host = self._hosts.get(netloc)
+            if host is None:
+                host = self._hosts[netloc] = _Host(self.per_host)
+            else:
+                self._hosts.move_to_end(netloc)
+            if use:
+                host.users += 1
+            excess = len(self._hosts) - MAX_TRACKED_HOSTS
+            if excess > 0:
+                for name in [n for n, h in self._hosts.items() if not h.users and n != netloc][:excess]:
+                    del self._hosts[name]
+            return host
+
+    @contextmanager
+    def _host_slot(self, url: str) -> Iterator[None]:
+        host = self._host(urlsplit(url).netloc.lower(), use=True)
+        try:
+            with host.semaphore:
+                yield
+        finally:
+            with self._hosts_lock:
+                host.users -= 1
+
+    def _check_address(self, url: str) -> None:
+        """Reject URLs that aren't http(s) or whose host resolves to a non-public address"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise FetchBlockedError(f"Unsupported URL {url}")
+        if self.allow_private:
+            return
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        try:
+            infos = socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+        except socket.gaierror as e:
+            raise requests.ConnectionError(f"Cannot resolve {parts.hostname}: {str(e)}")
+        for info in infos:
+            _public_address(parts.hostname, info[4][0])
+
+    def _get(self, url: str, headers: Dict[str, str], check_robots: bool) -> requests.Response:
+        """Stream a GET of url, checking the address (and robots.txt) again at every redirect"""
+        for _ in range(MAX_REDIRECTS + 1):
+            self._check_address(url)
+            if check_robots and self.respect_robots and not self._robots_allow(url):
+                raise FetchBlockedError(f"{url} is disallowed by robots.txt")
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True,
+                                        allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(url, response.headers["Location"])
+        raise requests.TooManyRedirects(f"More than {MAX_REDIRECTS} redirects")
+
+    def _robots_allow(self, url: str) -> bool:
+        parts = urlsplit(url)
+        host = self._host(parts.netloc.lower())
+        with host.robots_lock:
+            if host.robots is None or time.monotonic() >= host.robots_expires:
+                host.robots = self._fetch_robots(f"{parts.scheme}://{parts.netloc}/robots.txt")
+                host.robots_expires = time.monotonic() + (ROBOTS_RETRY if host.robots.disallow_all else ROBOTS_TTL)
+            robots = host.robots
+        return robots.can_fetch(USER_AGENT, url)
+
+    def _fetch_robots(self, robots_url: str) -> RobotFileParser:
+        """Rules of a site's robots.txt, treated like RFC 9309 and urllib.robotparser do
+
+        A missing file allows everything; one that is forbidden (401/403) or unreachable
+        (5xx, network errors) disallows everything until it is checked again.
+        """
+        robots = RobotFileParser(robots_url)
+        status = None
+        body = bytearray()
+        try:
+            with self._get(robots_url, {"User-Agent": USER_AGENT}, check_robots=False) as response:
+                status = response.status_code
+                if 200 <= status < 300:
+                    for data in response.iter_content(READ_CHUNK_BYTES):
+                        body.extend(data)
+                        if len(body) >= ROBOTS_MAX_BYTES:
+                            break
+        except FetchBlockedError:
+            raise
+        except Exception as e:
+            logger.debug(f"Fetching {robots_url} failed: {str(e)}")
+        if status is not None and 200 <= status < 300:
+            robots.parse(body[:ROBOTS_MAX_BYTES].decode("utf-8", errors="replace").splitlines())
+        elif status is not None and 400 <= status < 500 and status not in (401, 403):
+            robots.allow_all = True
+        else:
+            robots.disallow_all = True
+        return robots
+
+    def fetch_many(self, urls: List[str], wrap=None) -> List[Dict[str, Any]]:
+        """Fetch urls concurrently; results are in the same order, failures included
+
+        wrap, if given, wraps the per-URL function, e.g. to carry tracing context into
+        the fetch threads.
+        """
+        fetch = wrap(self.fetch) if wrap else self.fetch
+        return list(self._executor.map(fetch, urls))
+
+    def fetch(self, url: str) -> Dict[str, Any]:
+        """Fetch one page; returns its status, text chunks and downloaded size"""
+        page: Dict[str, Any] = {"url": url, "status": "error", "chunks": [], "bytes": 0, "truncated": False}
+        cached = self.cache.get(url) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            return dict(page, status="cached", chunks=self._chunk(cached["text"]))
+        try:
+            entry = self._download(url, cached, page)
+        except FetchBlockedError as e:
+            logger.debug(f"Not fetching {url}: {str(e)}")
+            page.update(status="blocked", error=str(e))
+            return page
+        except Exception as e:
+            logger.debug(f"Fetching {url} failed: {str(e)}")
+            page["error"] = str(e)
+            return page
+        if entry is None:
+            return page
+        if self.cache:
+            self.cache.set(url, entry)
+        page["chunks"] = self._chunk(entry["text"])
+        return page
+
+    def _download(self, url: str, cached: Optional[Dict[str, Any]],
+                  page: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Stream a page into a cache entry; updates page with status and size"""
+        headers = {"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml,text/plain;q=0.8"}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        deadline = time.monotonic() + self.timeout
+        with self._host_slot(url):
+            with self._get(url, headers, check_robots=True) as response:
+                if response.status_code == 304 and cached:
+                    page["status"] = "not_modified"
+                    return dict(cached, fetched_at=time.time())
+                response.raise_for_status()
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if content_type and content_type not in TEXT_CONTENT_TYPES:
+                    page.update(status="skipped", error=f"Unsupported content type {content_type}")
+                    return None
+
+                body = bytearray()
+                for data in response.iter_content(READ_CHUNK_BYTES):
+                    body.extend(data)
+                    if len(body) >= self.max_bytes:
+                        del body[self.max_bytes:]
+                        page["truncated"] = True
+                        break
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Download exceeded {self.timeout}s")
+                # Without a declared charset requests assumes Latin-1 for text/*; most pages are UTF-8
+                declared = "charset" in response.headers.get("Content-Type", "").lower()
+                text = body.decode(response.encoding if declared else "utf-8", errors="replace")
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+
+        page.update(status="fetched", bytes=len(body))
+        if content_type != "text/plain":
+            text = extract_main_text(text)
+        return {"etag": etag, "last_modified": last_modified, "fetched_at": time.time(), "text": text}
+
+    def _chunk(self, text: str) -> List[str]:
+        return split_text(text, self.chunk_tokens)[:self.max_chunks]
@@ -0,0 +1,16 @@
+from typing import Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Called with (stage, fraction of that stage completed from 0 to 1, human readable message)
+ProgressCallback = Callable[[str, float, str], None]
+
+def report_progress(progress: Optional[ProgressCallback], stage: str, fraction: float, message: str) -> None:
+    """Send a progress update, never letting a failing listener break the pipeline"""
+    if progress is None:
+        return
+    try:
+        progress(stage, min(max(fraction, 0.0), 1.0), message)
+    except Exception as e:
+        logger.warning(f"Progress callback failed: {str(e)}")
@@ -0,0 +1,81 @@
+from typing import Dict, Any, List, Tuple
+import json
+import re
+from utils.tokens import estimate_tokens
+
+# Fields of a Tavily result that carry information the synthesis prompt needs
+SOURCE_FIELDS = ("title", "url", "content")
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\W+", " ", text.lower()).strip()
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Cut text to max_chars, preferring a sentence or word boundary"""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("? "), cut.rfind("! "))
+    if boundary < max_chars // 2:
+        boundary = cut.rfind(" ")
+    return cut[:boundary + 1].rstrip() + " …" if boundary > 0 else cut + " …"
+
+def pack_sources(sources: List[Dict[str, Any]], max_chars_per_source: int) -> List[Dict[str, Any]]:
+    """Strip sources to title/url/content, truncate content and drop repeated snippets
+
+    Each packed source gets a stable 1-based "id" used for numbering in the prompt.
+    Sources with fetched "page_chunks" are packed as one item per chunk instead of
+    their search snippet.
+    """
+    packed = []
+    seen = set()
+    for source in sources:
+        chunks = source.get("page_chunks") or [source.get("content") or ""]
+        for part, content in enumerate(chunks, 1):
+            fingerprint = _normalize(content)
+            if fingerprint and fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            item = {field: source.get(field) or "" for field in SOURCE_FIELDS}
+            if len(chunks) > 1:
+                item["title"] = f"{item['title']} (part {part}/{len(chunks)})"
+            item["content"] = _truncate(content, max_chars_per_source)
+            item["id"] = len(packed) + 1
+            packed.append(item)
+    return packed
+
+def format_sources(packed: List[Dict[str, Any]]) -> str:
+    """Render packed sources in a compact numbered text format"""
+    return "\n\n".join(
+        f"[{item['id']}] {item['title']}\n{item['url']}\n{item['content']}" for item in packed
+    )
+
+def pack_research_data(research_data: Dict[str, Any],
+                       max_chars_per_source: int) -> Tuple[List[Dict[str, Any]], str, Dict[str, Any]]:
+    """Pack a ResearchAgent payload for the synthesis prompt
+
+    Returns the packed sources, their rendered text and before/after size statistics.
+    """
+    results = research_data.get("results", {})
+    if isinstance(results, dict):
+        sources = list(results.get("results", []))
+        answer = results.get("answer")
+    else:
+        sources = list(results) if isinstance(results, list) else []
+        answer = None
+
+    packed = pack_sources(sources, max_chars_per_source)
+    text = format_sources(packed)
+    if answer:
+        text = f"Search engine answer: {_truncate(answer, max_chars_per_source)}\n\n{text}"
+
+    original = json.dumps(research_data, indent=2, ensure_ascii=False)
+    stats = {
+        "sources_in": len(sources),
+        "sources_out": len(packed),
+        "chars_before": len(original),
+        "chars_after": len(text),
+        "tokens_before": estimate_tokens(original),
+        "tokens_after": estimate_tokens(text)
+    }
+    return packed, text, stats
@@ -0,0 +1,62 @@
+from typing import Dict, Any, List, Tuple
+from collections import Counter
+import re
+import time
+import numpy as np
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which",
+    "who", "why", "with"
+}
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """Score every document against the query with Okapi BM25 in one vectorized pass"""
+    terms = sorted(set(tokenize(query)))
+    if not terms or not documents:
+        return np.zeros(len(documents))
+
+    term_index = {term: i for i, term in enumerate(terms)}
+    tf = np.zeros((len(documents), len(terms)))
+    lengths = np.zeros(len(documents))
+    for row, document in enumerate(documents):
+        tokens = tokenize(document)
+        lengths[row] = len(tokens)
+        for token, count in Counter(tokens).items():
+            column = term_index.get(token)
+            if column is not None:
+                tf[row, column] = count
+
+    doc_freq = (tf > 0).sum(axis=0)
+    idf = np.log(1 + (len(documents) - doc_freq + 0.5) / (doc_freq + 0.5))
+    avg_length = lengths.mean() or 1.0
+    norm = k1 * (1 - b + b * lengths / avg_length)
+    return (idf * tf * (k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+def rerank_results(query: str, results: List[Dict[str, Any]],
+                   top_k: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Order results by BM25 relevance to the query and keep the top_k
+
+    Each returned result gets a "relevance_score" normalized to [0, 1]; ties fall back to
+    the search engine's own score.
+    """
+    start = time.perf_counter()
+    documents = [f"{r.get('title') or ''} {r.get('content') or ''}" for r in results]
+    scores = bm25_scores(query, documents)
+    if scores.size and scores.max() > 0:
+        scores = scores / scores.max()
+
+    ranked = sorted(
+        (dict(result, relevance_score=round(float(score), 4)) for result, score in zip(results, scores)),
+        key=lambda r: (r["relevance_score"], r.get("score") or 0),
+        reverse=True
+    )
+    stats = {
+        "input": len(results),
+        "kept": min(len(ranked), top_k),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)
+    }
+    return ranked[:top_k], stats
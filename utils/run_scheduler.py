@@ -0,0 +1,310 @@
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Callable, List, Optional, Iterator, AsyncIterator
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, highest first; waiting interactive runs are always admitted before batch runs
+PRIORITIES = ("interactive", "batch")
+# Wait times kept per priority class for the percentiles in stats()
+WAIT_SAMPLES = 1000
+
+class AdmissionError(Exception):
+    """A run was turned away because its priority class's queue is full or it waited too long"""
+
+_current_priority: ContextVar[str] = ContextVar("current_priority", default="interactive")
+_holding_slot: ContextVar[bool] = ContextVar("holding_slot", default=False)
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+@contextmanager
+def run_priority(priority: str) -> Iterator[None]:
+    """Schedule runs started in this context in priority class priority (interactive or batch)"""
+    priority = normalize_priority(priority)
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def normalize_priority(priority: str) -> str:
+    priority = (priority or "interactive").lower()
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}'; use {' or '.join(PRIORITIES)}")
+    return priority
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "alice=2,bob=0.5" into per-user fair share weights"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        user, _, weight = item.partition("=")
+        weights[user.strip()] = max(float(weight), 0.01)
+    return weights
+
+def _reset(token) -> None:
+    try:
+        _holding_slot.reset(token)
+    except ValueError:
+        # Released from another context, e.g. by a stream consumed elsewhere
+        pass
+
+class _Waiter:
+    __slots__ = ("priority", "user", "stage", "start_tag", "enqueued_at", "admitted", "cancelled", "notify")
+
+    def __init__(self, priority: str, user: str, stage: str, start_tag: float,
+                 notify: Optional[Callable[[], None]] = None):
+        self.priority = priority
+        self.user = user
+        self.stage = stage
+        self.start_tag = start_tag
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+        self.cancelled = False
+        # Called on admission for waiters that don't wait on the condition, i.e. async ones
+        self.notify = notify
+
+class RunScheduler:
+    """Admit research and synthesis runs into a fixed number of slots by priority and user
+
+    Waiting interactive runs always go first. Batch runs may fill all slots but
+    reserved_slots, which stay free for interactive runs. Within a class, users share
+    slots by start-time fair queuing: each run's tag is the later of the class's
+    virtual time and the user's previous tag, advanced by 1 / the user's weight, and the
+    lowest tag is admitted next, so a user with a long backlog can't starve the others.
+    Runs are turned away when their class's queue is full or they wait longer than its
+    max wait (0 waits indefinitely).
+
+    Slots and queues are per process: several API workers or app processes each admit
+    up to slots runs of their own.
+    """
+
+    def __init__(self, slots: int, reserved_slots: int, max_queue: Dict[str, int],
+                 max_wait: Dict[str, float], weights: Optional[Dict[str, float]] = None):
+        self.slots = max(1, slots)
+        # Batch runs always get at least one slot
+        self.batch_slots = max(1, self.slots - max(0, reserved_slots))
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.weights = weights or {}
+        self._cond = threading.Condition()
+        self._queues: Dict[str, List] = {p: [] for p in PRIORITIES}
+        self._virtual_time = {p: 0.0 for p in PRIORITIES}
+        self._user_tags: Dict[str, Dict[str, float]] = {p: {} for p in PRIORITIES}
+        self._seq = itertools.count()
+        self._active = {p: 0 for p in PRIORITIES}
+        self._counts = {p: {"admitted": 0, "rejected": 0, "timed_out": 0} for p in PRIORITIES}
+        self._waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITIES}
+
+    @classmethod
+    def from_settings(cls, settings) -> "RunScheduler":
+        return cls(
+            slots=settings.run_slots,
+            reserved_slots=settings.interactive_reserved_slots,
+            max_queue={"interactive": settings.interactive_max_queue, "batch": settings.batch_max_queue},
+            max_wait={"interactive": settings.interactive_max_wait, "batch": settings.batch_max_wait},
+            weights=parse_weights(settings.user_weights)
+        )
+
+    def _enqueue(self, priority: str, user: str, stage: str,
+                 notify: Optional[Callable[[], None]] = None) -> _Waiter:
+        with self._cond:
+            queue = self._queues[priority]
+            queued = sum(not w.cancelled for _, _, w in queue)
+            if queued >= self.max_queue[priority]:
+                self._counts[priority]["rejected"] += 1
+                raise AdmissionError(f"The {priority} queue is full ({queued} runs waiting); retry shortly")
+            start_tag = max(self._virtual_time[priority], self._user_tags[priority].get(user, 0.0))
+            self._user_tags[priority][user] = start_tag + 1 / self.weights.get(user, 1.0)
+            waiter = _Waiter(priority, user, stage, start_tag, notify)
+            heapq.heappush(queue, (start_tag, next(self._seq), waiter))
+            self._dispatch()
+            return waiter
+
+    def _dispatch(self) -> None:
+        """Admit queued runs into free slots; called with the condition held"""
+        admitted = False
+        while sum(self._active.values()) < self.slots:
+            queue = self._queues["interactive"]
+            if not queue and self._active["batch"] < self.batch_slots:
+                queue = self._queues["batch"]
+            if not queue:
+                break
+            start_tag, _, waiter = heapq.heappop(queue)
+            if waiter.cancelled:
+                continue
+            waiter.admitted = True
+            self._virtual_time[waiter.priority] = start_tag
+            self._active[waiter.priority] += 1
+            admitted = True
+            if waiter.notify is not None:
+                waiter.notify()
+        if admitted:
+            self._prune_tags()
+            self._cond.notify_all()
+
+    def _prune_tags(self) -> None:
+        """Forget users whose tags the virtual time has passed; they'd start from it anyway"""
+        for priority, tags in self._user_tags.items():
+            if len(tags) > 2 * len(self._queues[priority]) + 16:
+                now = self._virtual_time[priority]
+                for user in [u for u, tag in tags.items() if tag <= now]:
+                    del tags[user]
+
+    def _admitted(self, waiter: _Waiter) -> None:
+        wait = time.monotonic() - waiter.enqueued_at
+        with self._cond:
+            self._counts[waiter.priority]["admitted"] += 1
+            self._waits[waiter.priority].append(wait)
+        logger.debug(f"Admitted {waiter.priority} {waiter.stage} run for {waiter.user} after {wait:.3f}s")
+
+    def _expire(self, waiter: _Waiter) -> bool:
+        """Withdraw a waiter past its max wait; False if it was admitted in the meantime"""
+        with self._cond:
+            if waiter.admitted:
+                return False
+            waiter.cancelled = True
+            self._counts[waiter.priority]["timed_out"] += 1
+            return True
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Withdraw a cancelled waiter, releasing its slot if it was admitted meanwhile"""
+        with self._cond:
+            if waiter.admitted:
+                self._active[waiter.priority] -= 1
+                self._dispatch()
+            else:
+                waiter.cancelled = True
+
+    def _release(self, waiter: _Waiter) -> None:
+        with self._cond:
+            self._active[waiter.priority] -= 1
+            self._dispatch()
+
+    def _timeout_error(self, waiter: _Waiter) -> AdmissionError:
+        return AdmissionError(f"No {waiter.priority} run slot became free within "
+                              f"{self.max_wait[waiter.priority]:g}s; retry shortly")
+
+    def _queue_depth(self, priority: str) -> int:
+        with self._cond:
+            return sum(not w.cancelled for _, _, w in self._queues[priority])
+
+    @contextmanager
+    def slot(self, stage: str, user: str) -> Iterator[None]:
+        """Hold a run slot for the current priority class while the block runs
+
+        Nested calls in a context that already holds a slot run without another one.
+        """
+        if _holding_slot.get():
+            yield
+            return
+        priority = current_priority()
+        with span(f"scheduler.{priority}_wait", stage=stage, user=user,
+                  queue_depth=self._queue_depth(priority)) as current:
+            waiter = self._enqueue(priority, user, stage)
+            max_wait = self.max_wait[priority]
+            deadline = time.monotonic() + max_wait if max_wait else None
+            with self._cond:
+                while not waiter.admitted:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            if self._expire(waiter):
+                current.set(error="timeout")
+                raise self._timeout_error(waiter)
+            self._admitted(waiter)
+        token = _holding_slot.set(True)
+        try:
+            yield
+        finally:
+            _reset(token)
+            self._release(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, stage: str, user: str) -> AsyncIterator[None]:
+        """Async counterpart of slot that waits without blocking the event loop"""
+        if _holding_slot.get():
+            yield
+            return
+        priority = current_priority()
+        with span(f"scheduler.{priority}_wait", stage=stage, user=user,
+                  queue_depth=self._queue_depth(priority)) as current:
+            # Admission may happen on any thread; it wakes this task through the event loop
+            loop = asyncio.get_running_loop()
+            admitted = asyncio.Event()
+            waiter = self._enqueue(priority, user, stage, lambda: loop.call_soon_threadsafe(admitted.set))
+            max_wait = self.max_wait[priority]
+            try:
+                if not waiter.admitted:
+                    await asyncio.wait_for(admitted.wait(), max_wait or None)
+            except asyncio.TimeoutError:
+                if self._expire(waiter):
+                    current.set(error="timeout")
+                    raise self._timeout_error(waiter)
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+            self._admitted(waiter)
+        token = _holding_slot.set(True)
+        try:
+            yield
+        finally:
+            _reset(token)
+            self._release(waiter)
+
+    def stats(self) -> Dict[str, Any]:
+        """Slots in use, queue depth, admissions and wait percentiles per priority class"""
+        with self._cond:
+            stats: Dict[str, Any] = {"slots": self.slots, "batch_slots": self.batch_slots}
+            for priority in PRIORITIES:
+                waits = sorted(self._waits[priority])
+                stats[priority] = dict(
+                    self._counts[priority],
+                    active=self._active[priority],
+                    queued=sum(not w.cancelled for _, _, w in self._queues[priority]),
+                    wait_p50=round(waits[len(waits) // 2], 3) if waits else 0.0,
+                    wait_p95=round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0
+                )
+            return stats
+
+    def render_prometheus(self) -> str:
+        """Queue depth, active runs and admission counters in Prometheus text format"""
+        stats = self.stats()
+        lines = []
+        for metric, key, kind, help_text in (
+            ("research_scheduler_queued", "queued", "gauge", "Runs waiting for a slot"),
+            ("research_scheduler_active", "active", "gauge", "Runs holding a slot"),
+            ("research_scheduler_admitted_total", "admitted", "counter", "Runs admitted into a slot"),
+            ("research_scheduler_rejected_total", "rejected", "counter", "Runs turned away by a full queue"),
+            ("research_scheduler_timed_out_total", "timed_out", "counter", "Runs that waited past the max wait"),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(f'{metric}{{priority="{p}"}} {stats[p][key]}' for p in PRIORITIES)
+        return "\n".join(lines) + "\n"
+
+_scheduler: Optional[RunScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_run_scheduler(settings) -> RunScheduler:
+    """Return the process-wide run scheduler shared by research and synthesis"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RunScheduler.from_settings(settings)
+        return _scheduler
+
+def reset_run_scheduler() -> None:
+    """Forget the process-wide run scheduler so the next get_run_scheduler call starts fresh"""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
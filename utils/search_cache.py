@@ -0,0 +1,172 @@
+from typing import Dict, Any, Optional
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Writes between full directory scans, which also pick up entries written by other processes
+EVICT_SCAN_INTERVAL = 64
+
+class SearchCache:
+    """Content-addressed on-disk cache for Tavily search responses"""
+
+    def __init__(self, cache_dir: Path, ttls: Dict[str, int], max_bytes: int):
+        self.cache_dir = Path(cache_dir) / "search"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttls = ttls
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        # Running estimate of the directory size; None until the first scan
+        self._size: Optional[int] = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> "SearchCache":
+        """Create a cache under settings.cache_dir using the configured TTLs and size"""
+        return cls(
+            cache_dir=settings.cache_dir,
+            ttls={
+                "basic": settings.search_cache_ttl_basic,
+                "advanced": settings.search_cache_ttl_advanced
+            },
+            max_bytes=settings.search_cache_max_mb * 1024 * 1024
+        )
+
+    @staticmethod
+    def make_key(query: str, search_depth: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Build a stable key from the normalized query, depth and search options"""
+        normalized_query = " ".join(query.lower().split())
+        payload = json.dumps(
+            {"query": normalized_query, "search_depth": search_depth, "options": options or {}},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, query: str, search_depth: str, options: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Return a cached response, or None on a miss or an expired entry"""
+        file_path = self._path(self.make_key(query, search_depth, options))
+        try:
+            with file_path.open('r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {file_path.name}: {str(e)}")
+            file_path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        ttl = self.ttls.get(search_depth, 0)
+        if time.time() - entry.get("created_at", 0) > ttl:
+            file_path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+                self.expired += 1
+            return None
+
+        # Touch the entry so eviction treats it as recently used
+        try:
+            os.utime(file_path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry["response"]
+
+    def set(self, query: str, search_depth: str, response: Dict[str, Any],
+            options: Optional[Dict[str, Any]] = None) -> None:
+        """Store a search response and evict least recently used entries if over size"""
+        file_path = self._path(self.make_key(query, search_depth, options))
+        entry = {
+            "query": query,
+            "search_depth": search_depth,
+            "options": options or {},
+            "created_at": time.time(),
+            "response": response
+        }
+        tmp_path = file_path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with tmp_path.open('w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            written = tmp_path.stat().st_size
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            logger.error(f"Failed to write search cache entry: {str(e)}", exc_info=True)
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict(written)
+
+    def _evict(self, written: int) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes
+
+        The directory is only scanned when the running size estimate goes over
+        max_bytes or every EVICT_SCAN_INTERVAL writes, not on every write.
+        """
+        with self._lock:
+            self._writes += 1
+            if self._size is not None and self._writes < EVICT_SCAN_INTERVAL:
+                self._size += written
+                if self._size <= self.max_bytes:
+                    return
+            self._writes = 0
+            entries = []
+            total = 0
+            for file_path in self.cache_dir.glob("*.json"):
+                try:
+                    stat = file_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                self._size = total
+                return
+
+            entries.sort()
+            for _, size, file_path in entries:
+                if total <= self.max_bytes:
+                    break
+                file_path.unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+            self._size = total
+            logger.debug(f"Search cache evicted down to {total} bytes")
+
+    def clear(self) -> None:
+        """Remove all cached entries"""
+        with self._lock:
+            for file_path in self.cache_dir.glob("*.json"):
+                file_path.unlink(missing_ok=True)
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current cache size"""
+        with self._lock:
+            files = list(self.cache_dir.glob("*.json"))
+            size = sum(f.stat().st_size for f in files if f.exists())
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(files),
+                "size_bytes": size
+            }
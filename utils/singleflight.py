@@ -0,0 +1,73 @@
+from typing import Dict, Any, Callable, Tuple
+import hashlib
+import json
+import threading
+
+def make_key(*parts: Any) -> str:
+    """Build a coalescing key from JSON-serializable parts; strings are case/space-normalized"""
+    normalized = [" ".join(p.lower().split()) if isinstance(p, str) else p for p in parts]
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class Flight:
+    """One in-flight computation that followers can wait on"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result: Any = None
+        self.error: Exception = None
+
+    def wait(self) -> Any:
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one shared computation"""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key: str) -> Tuple[Flight, bool]:
+        """Join the flight for key, returning (flight, is_leader)
+
+        The leader must call finish() exactly once; followers call flight.wait().
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = Flight()
+            self._flights[key] = flight
+            self.leaders += 1
+            return flight, True
+
+    def finish(self, key: str, result: Any = None, error: Exception = None) -> None:
+        """Publish the leader's outcome to all followers and close the flight"""
+        with self._lock:
+            flight = self._flights.pop(key)
+        flight.result = result
+        flight.error = error
+        flight._done.set()
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """Run fn once for all concurrent callers with key; returns (result, shared)"""
+        flight, leader = self.begin(key)
+        if not leader:
+            return flight.wait(), True
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result=result)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._flights)}
@@ -0,0 +1,405 @@
+from typing import Dict, Any, Callable, List, Optional
+from datetime import datetime
+from pathlib import Path
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+def new_run_id() -> str:
+    """Create a sortable, collision-free identifier for a research run"""
+    return f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+class ResearchStore:
+    """SQLite store linking research results and syntheses by run ID, with full-text search"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                depth TEXT,
+                user TEXT,
+                created_at TEXT NOT NULL,
+                research_json TEXT,
+                synthesis_json TEXT,
+                synthesis_text TEXT,
+                synthesized_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_created ON runs(created_at);
+            CREATE INDEX IF NOT EXISTS idx_runs_query ON runs(query COLLATE NOCASE);
+            CREATE TABLE IF NOT EXISTS imported_files (
+                name TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                user TEXT,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                job_json TEXT NOT NULL,
+                owner TEXT,
+                heartbeat REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs(user, created_at);
+            CREATE TABLE IF NOT EXISTS research_state (
+                state_key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                run_id TEXT,
+                updated_at REAL NOT NULL,
+                state_json TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS usage (
+                run_id TEXT,
+                stage TEXT NOT NULL,
+                user TEXT,
+                day TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                llm_calls INTEGER NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                searches INTEGER NOT NULL,
+                search_credits INTEGER NOT NULL,
+                cost_usd REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_usage_user_day ON usage(user, day);
+        """)
+        # Databases created before jobs recorded their owner
+        job_columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL")):
+            if column not in job_columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5(run_id UNINDEXED, query, synthesis)"
+            )
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            logger.warning("SQLite was built without FTS5; full-text search falls back to LIKE")
+            self.fts_enabled = False
+        self._conn.commit()
+
+    def _index(self, run_id: str) -> None:
+        if not self.fts_enabled:
+            return
+        row = self._conn.execute(
+            "SELECT query, synthesis_text FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        self._conn.execute("DELETE FROM runs_fts WHERE run_id = ?", (run_id,))
+        self._conn.execute(
+            "INSERT INTO runs_fts (run_id, query, synthesis) VALUES (?, ?, ?)",
+            (run_id, row["query"], row["synthesis_text"] or "")
+        )
+
+    def save_research(self, research: Dict[str, Any]) -> int:
+        """Insert or replace the research stage of a run; returns the serialized size in bytes"""
+        payload = json.dumps(research, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO runs (run_id, query, depth, user, created_at, research_json)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(run_id) DO UPDATE SET
+                    query = excluded.query, depth = excluded.depth, user = excluded.user,
+                    created_at = excluded.created_at, research_json = excluded.research_json
+                """,
+                (research["run_id"], research["query"], research.get("depth"), research.get("user"),
+                 research["timestamp"], payload)
+            )
+            self._index(research["run_id"])
+            self._conn.commit()
+        return len(payload.encode("utf-8"))
+
+    def save_synthesis(self, synthesis: Dict[str, Any]) -> int:
+        """Attach a synthesis to its run, creating the run if research was stored elsewhere
+
+        Returns the serialized size in bytes.
+        """
+        payload = json.dumps(synthesis, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO runs (run_id, query, user, created_at, synthesis_json, synthesis_text, synthesized_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(run_id) DO UPDATE SET
+                    synthesis_json = excluded.synthesis_json,
+                    synthesis_text = excluded.synthesis_text,
+                    synthesized_at = excluded.synthesized_at
+                """,
+                (synthesis["run_id"], synthesis["query"], synthesis.get("metadata", {}).get("user"),
+                 synthesis["timestamp"], payload, synthesis["synthesis"], synthesis["timestamp"])
+            )
+            self._index(synthesis["run_id"])
+            self._conn.commit()
+        return len(payload.encode("utf-8"))
+
+    def _to_run(self, row: sqlite3.Row, include_payloads: bool) -> Dict[str, Any]:
+        run = {
+            "run_id": row["run_id"],
+            "query": row["query"],
+            "depth": row["depth"],
+            "user": row["user"],
+            "created_at": row["created_at"],
+            "synthesized_at": row["synthesized_at"]
+        }
+        if include_payloads:
+            run["research"] = json.loads(row["research_json"]) if row["research_json"] else None
+            run["synthesis"] = json.loads(row["synthesis_json"]) if row["synthesis_json"] else None
+        return run
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Return a run with its research and synthesis payloads"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return self._to_run(row, include_payloads=True) if row else None
+
+    def latest_run(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return the most recent synthesized run of exactly this query (ignoring case)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM runs WHERE query = ? COLLATE NOCASE AND research_json IS NOT NULL "
+                "AND synthesis_json IS NOT NULL ORDER BY created_at DESC, rowid DESC LIMIT 1",
+                (query,)
+            ).fetchone()
+        return self._to_run(row, include_payloads=True) if row else None
+
+    def find_runs(self, query: Optional[str] = None, since: Optional[str] = None,
+                  until: Optional[str] = None, text: Optional[str] = None,
+                  limit: int = 20) -> List[Dict[str, Any]]:
+        """Look up runs by query substring, created_at range (YYYY-MM-DD...) and full text"""
+        clauses, params = [], []
+        if query:
+            clauses.append("runs.query LIKE ? COLLATE NOCASE")
+            params.append(f"%{query}%")
+        if since:
+            clauses.append("runs.created_at >= ?")
+            params.append(since)
+        if until:
+            # Compare against the next character so a bare date includes the whole day
+            clauses.append("runs.created_at < ?")
+            params.append(until + "~")
+        source = "runs"
+        if text:
+            terms = re.findall(r"\w+", text)
+            if self.fts_enabled and terms:
+                source = "runs JOIN runs_fts ON runs_fts.run_id = runs.run_id"
+                clauses.append("runs_fts MATCH ?")
+                params.append(" ".join(f'"{term}"' for term in terms))
+            else:
+                clauses.append("(runs.query LIKE ? OR runs.synthesis_text LIKE ?)")
+                params.extend([f"%{text}%", f"%{text}%"])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT runs.* FROM {source} {where} ORDER BY runs.created_at DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [self._to_run(row, include_payloads=False) for row in rows]
+
+    def save_job(self, job: Dict[str, Any], owner: Optional[str] = None) -> None:
+        """Insert or replace the persisted state of a background job
+
+        owner identifies the process working on the job; saving counts as a heartbeat.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, user, status, created_at, job_json, owner, heartbeat) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job["job_id"], job.get("user"), job["status"], job["created_at"],
+                 json.dumps(job, ensure_ascii=False), owner, time.time() if owner else None)
+            )
+            self._conn.commit()
+
+    def heartbeat_jobs(self, owner: str) -> None:
+        """Record that owner is still working on its queued and running jobs"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                (time.time(), owner)
+            )
+            self._conn.commit()
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT job_json FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["job_json"]) if row else None
+
+    def list_jobs(self, user: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Return the most recent jobs, optionally for a single user"""
+        where, params = ("WHERE user = ?", (user,)) if user else ("", ())
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT job_json FROM jobs {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [json.loads(row["job_json"]) for row in rows]
+
+    def interrupt_orphaned_jobs(self, is_orphaned: Callable[[Optional[str], Optional[float]], bool]) -> int:
+        """Mark queued or running jobs as interrupted if is_orphaned(owner, last heartbeat) says
+        the process working on them is gone; returns how many were marked"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_json, owner, heartbeat FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+        orphaned = [row for row in rows if is_orphaned(row["owner"], row["heartbeat"])]
+        for row in orphaned:
+            job = json.loads(row["job_json"])
+            job.update(status="interrupted", message="Interrupted: the process running the job stopped")
+            self.save_job(job)
+        return len(orphaned)
+
+    def save_research_state(self, state_key: str, query: str, run_id: Optional[str],
+                            state: Dict[str, Any]) -> None:
+        """Insert or replace the intermediate rounds of iterative research for a query"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO research_state (state_key, query, run_id, updated_at, state_json) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (state_key, query, run_id, time.time(), json.dumps(state, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def get_research_state(self, state_key: str, max_age: float) -> Optional[Dict[str, Any]]:
+        """Return research rounds saved for a query within the last max_age seconds"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state_json FROM research_state WHERE state_key = ? AND updated_at >= ?",
+                (state_key, time.time() - max_age)
+            ).fetchone()
+        return json.loads(row["state_json"]) if row else None
+
+    def record_usage(self, run_id: Optional[str], stage: str, day: str, usage: Dict[str, Any]) -> None:
+        """Add the tokens, searches and cost of one research or synthesis run"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO usage (run_id, stage, user, day, created_at, llm_calls, input_tokens, "
+                "output_tokens, searches, search_credits, cost_usd) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, stage, usage["user"], day, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                 usage["llm_calls"], usage["input_tokens"], usage["output_tokens"],
+                 sum(usage["searches"].values()), usage["search_credits"], usage["cost_usd"])
+            )
+            self._conn.commit()
+
+    def usage_totals(self, user: str, day: str) -> Dict[str, Any]:
+        """Tokens and cost recorded for a user on a day (YYYY-MM-DD)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(input_tokens + output_tokens), 0) AS tokens, "
+                "COALESCE(SUM(search_credits), 0) AS search_credits, COALESCE(SUM(cost_usd), 0) AS cost_usd "
+                "FROM usage WHERE user = ? AND day = ?", (user, day)
+            ).fetchone()
+        return dict(row)
+
+    def usage_by_day(self, user: Optional[str] = None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Usage summed per user and day, most recent first"""
+        clauses, params = [], []
+        if user:
+            clauses.append("user = ?")
+            params.append(user)
+        if since:
+            clauses.append("day >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, user, COUNT(DISTINCT run_id) AS runs, SUM(llm_calls) AS llm_calls, "
+                "SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens, "
+                "SUM(searches) AS searches, SUM(search_credits) AS search_credits, SUM(cost_usd) AS cost_usd "
+                f"FROM usage {where} GROUP BY day, user ORDER BY day DESC, user", params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def import_legacy_results(self, results_dir: Path) -> Dict[str, int]:
+        """Import research_*.json and synthesis_*.json files written by earlier versions
+
+        Each research file becomes a run; each synthesis file is linked to the latest
+        earlier research run for the same query that has no synthesis yet. Files already
+        imported are skipped, so the migration can be re-run safely.
+        """
+        counts = {"research": 0, "synthesis": 0, "skipped": 0, "failed": 0}
+
+        def load(path: Path) -> Optional[Dict[str, Any]]:
+            with self._lock:
+                seen = self._conn.execute(
+                    "SELECT 1 FROM imported_files WHERE name = ?", (path.name,)
+                ).fetchone()
+            if seen:
+                counts["skipped"] += 1
+                return None
+            try:
+                with path.open(encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to read {path.name}: {str(e)}")
+                counts["failed"] += 1
+                return None
+
+        def fail(path: Path, error: Exception) -> None:
+            # Leave the file unmarked so a re-run tries it again
+            with self._lock:
+                self._conn.rollback()
+            logger.error(f"Failed to import {path.name}: {str(error)}")
+            counts["failed"] += 1
+
+        def mark(path: Path) -> None:
+            with self._lock:
+                self._conn.execute("INSERT OR IGNORE INTO imported_files (name) VALUES (?)", (path.name,))
+                self._conn.commit()
+
+        for path in sorted(Path(results_dir).glob("research_*.json")):
+            research = load(path)
+            if research is None:
+                continue
+            try:
+                research.setdefault("run_id", "legacy-" + re.sub(r"\W+", "-", path.stem[len("research_"):]).strip("-"))
+                self.save_research(research)
+            except Exception as e:
+                fail(path, e)
+                continue
+            mark(path)
+            counts["research"] += 1
+
+        for path in sorted(Path(results_dir).glob("synthesis_*.json")):
+            synthesis = load(path)
+            if synthesis is None:
+                continue
+            try:
+                with self._lock:
+                    row = self._conn.execute(
+                        "SELECT run_id FROM runs WHERE query = ? AND created_at <= ? AND synthesis_json IS NULL "
+                        "ORDER BY created_at DESC LIMIT 1",
+                        (synthesis["query"], synthesis["timestamp"])
+                    ).fetchone()
+                synthesis.setdefault(
+                    "run_id", row["run_id"] if row else f"legacy-{path.stem[len('synthesis_'):]}-synthesis"
+                )
+                self.save_synthesis(synthesis)
+            except Exception as e:
+                fail(path, e)
+                continue
+            mark(path)
+            counts["synthesis"] += 1
+
+        return counts
+
+_stores: Dict[str, ResearchStore] = {}
+_stores_lock = threading.Lock()
+
+def get_store(settings) -> ResearchStore:
+    """Return the process-wide store under settings.results_dir"""
+    db_path = str(Path(settings.results_dir) / "research.sqlite3")
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = ResearchStore(Path(db_path))
+            _stores[db_path] = store
+        return store
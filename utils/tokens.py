@@ -0,0 +1,55 @@
+from typing import List, Dict, Any
+import json
+
+# Rough average for English text with Gemini/SentencePiece-style tokenizers
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting prompts"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def chunk_by_tokens(items: List[Dict[str, Any]], budget: int) -> List[List[Dict[str, Any]]]:
+    """Greedily pack items into chunks whose serialized size stays within budget tokens
+
+    Items larger than the budget on their own are placed in a chunk by themselves.
+    """
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for item in items:
+        size = estimate_tokens(json.dumps(item, ensure_ascii=False))
+        if current and used + size > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+def split_text(text: str, budget: int) -> List[str]:
+    """Split text into chunks of at most budget tokens, breaking between paragraphs
+
+    Paragraphs larger than the budget are split between words.
+    """
+    max_chars = budget * CHARS_PER_TOKEN
+    pieces: List[str] = []
+    for paragraph in (p.strip() for p in text.split("\n\n")):
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            pieces.append(paragraph[:cut].rstrip())
+            paragraph = paragraph[cut:].lstrip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 2 + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,270 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Tuple, Callable
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the Prometheus duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+EXPORTER_NAMES = ("json", "prometheus", "otlp")
+
+class Span:
+    """One timed pipeline stage with size and token attributes"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time", "duration_ms",
+                 "attributes", "status", "error", "_start")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self.duration_ms = 0.0
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._start = time.perf_counter()
+
+    def set(self, **attributes) -> None:
+        """Add attributes, e.g. payload sizes known only once the stage has run"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+class Trace:
+    """Collects the spans of one research or synthesis run"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Finished spans in start order, in the compact form stored with run payloads"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_time)
+        return [
+            {"name": s.name, "duration_ms": s.duration_ms, "status": s.status, **s.attributes}
+            for s in spans
+        ]
+
+class JsonLogExporter:
+    """Log every finished span as one JSON line"""
+
+    def __init__(self, log: logging.Logger = logger):
+        self.log = log
+
+    def export(self, span: Span) -> None:
+        self.log.info(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+
+class PrometheusExporter:
+    """Aggregate spans into duration histograms and size/token counters per span name"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series: Dict[str, Dict[str, Any]] = {}
+
+    def export(self, span: Span) -> None:
+        seconds = span.duration_ms / 1000
+        with self._lock:
+            series = self._series.get(span.name)
+            if series is None:
+                series = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0,
+                          "errors": 0, "bytes": 0, "tokens": 0}
+                self._series[span.name] = series
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["buckets"][i] += 1
+            series["count"] += 1
+            series["sum"] += seconds
+            series["errors"] += span.status == "error"
+            for key, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    if key.endswith("_bytes"):
+                        series["bytes"] += value
+                    elif key.endswith("_tokens"):
+                        series["tokens"] += value
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        with self._lock:
+            series = {name: dict(s, buckets=list(s["buckets"])) for name, s in sorted(self._series.items())}
+        lines = [
+            "# HELP research_span_duration_seconds Duration of pipeline stages",
+            "# TYPE research_span_duration_seconds histogram"
+        ]
+        for name, s in series.items():
+            for bound, count in zip(self.buckets, s["buckets"]):
+                lines.append(f'research_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'research_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {s["count"]}')
+            lines.append(f'research_span_duration_seconds_sum{{span="{name}"}} {s["sum"]:.6f}')
+            lines.append(f'research_span_duration_seconds_count{{span="{name}"}} {s["count"]}')
+        for metric, key, help_text in (
+            ("research_span_errors_total", "errors", "Pipeline stages that raised"),
+            ("research_span_bytes_total", "bytes", "Payload bytes handled by pipeline stages"),
+            ("research_span_tokens_total", "tokens", "Estimated tokens handled by pipeline stages"),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f'{metric}{{span="{name}"}} {s[key]}' for name, s in series.items())
+        return "\n".join(lines) + "\n"
+
+class OTLPFileExporter:
+    """Append spans to a file as OTLP/JSON ExportTraceServiceRequest lines
+
+    Each line can be replayed to an OpenTelemetry collector's OTLP/HTTP JSON endpoint
+    or read by tools that understand the OTLP JSON encoding.
+    """
+
+    def __init__(self, path: Path, service_name: str = "deep-research-assistant"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def export(self, span: Span) -> None:
+        start = int(span.start_time * 1e9)
+        record = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + int(span.duration_ms * 1e6)),
+            "attributes": [{"key": k, "value": self._value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1}
+        }
+        if span.parent_id:
+            record["parentSpanId"] = span.parent_id
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [record]}]
+        }]})
+        with self._lock:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_exporters: List[Any] = []
+_prometheus: Optional[PrometheusExporter] = None
+_configured = False
+_configure_lock = threading.Lock()
+
+def configure_tracing(settings) -> None:
+    """Install the exporters named in settings.tracing_exporters (once per process)"""
+    global _configured, _prometheus
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        if not settings.tracing_enabled:
+            return
+        names = [name.strip().lower() for name in settings.tracing_exporters.split(",") if name.strip()]
+        for name in names:
+            if name == "json":
+                _exporters.append(JsonLogExporter())
+            elif name == "prometheus":
+                _prometheus = PrometheusExporter()
+                _exporters.append(_prometheus)
+            elif name == "otlp":
+                _exporters.append(OTLPFileExporter(Path(settings.results_dir) / "traces.otlp.jsonl"))
+            else:
+                logger.warning(f"Unknown tracing exporter '{name}'; expected one of {', '.join(EXPORTER_NAMES)}")
+
+def prometheus_metrics() -> Optional[str]:
+    """Current span metrics in Prometheus text format, if that exporter is enabled"""
+    return _prometheus.render() if _prometheus else None
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def use_trace(trace: Trace) -> Iterator[Trace]:
+    """Collect spans opened in this context (and contexts copied from it) into trace"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _reset(_current_trace, token)
+
+def start_trace(name: str):
+    """Start a new trace for this context; use as a context manager"""
+    return use_trace(Trace(name))
+
+def propagate(fn: Callable) -> Callable:
+    """Wrap fn so calls from worker threads record spans on the caller's trace"""
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+def _reset(var: ContextVar, token) -> None:
+    try:
+        var.reset(token)
+    except ValueError:
+        # A generator holding the span was resumed from another context; leave it set
+        pass
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time a pipeline stage, recording it on the current trace and in the exporters"""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    current = Span(name, trace.trace_id if trace else os.urandom(16).hex(),
+                   parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = str(e)
+        raise
+    finally:
+        _reset(_current_span, token)
+        current.duration_ms = round((time.perf_counter() - current._start) * 1000, 2)
+        if trace:
+            trace.add(current)
+        for exporter in _exporters:
+            try:
+                exporter.export(current)
+            except Exception as e:
+                logger.debug(f"Span exporter {type(exporter).__name__} failed: {str(e)}")